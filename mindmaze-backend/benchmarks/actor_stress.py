@@ -0,0 +1,161 @@
+"""Stress test for the per-game actors in main.py.
+
+Starts many games through ``handle_matchmaking`` and fires conflicting events
+at each one concurrently: both players answering correctly, a correct answer
+racing a disconnect or the game timeout, double disconnects, and wrong
+answers in between. Storage latency is injected so a score update is in
+flight while the other events arrive. Afterwards it checks that
+
+* every game has exactly one history record,
+* each winner was credited exactly once,
+* each player still connected got exactly one game_end/opponent_disconnected,
+* no game is left registered and no handler logged an error.
+
+    python -m benchmarks.actor_stress --games 10000
+
+Exits with status 1 if any check fails.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+from collections import Counter
+from typing import Dict, List
+
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+SCENARIOS = ("double_correct", "correct_vs_disconnect", "correct_vs_timeout", "double_disconnect", "wrong_then_correct")
+TERMINAL_TYPES = {"game_end", "opponent_disconnected"}
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.frames: List[Dict] = []
+
+    async def send_text(self, data: str):
+        self.frames.append(json.loads(data))
+
+
+class ErrorCounter(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+async def answer(username: str, text: str, delay: float):
+    await asyncio.sleep(delay)
+    websocket = main.connected_players.get(username)
+    if websocket is not None:
+        await main.handle_ws_text(username, websocket, json.dumps({"type": "submit_answer", "answer": text}))
+
+
+async def disconnect(username: str, websocket, delay: float):
+    await asyncio.sleep(delay)
+    # As websocket_endpoint does when the socket closes
+    if main.connected_players.get(username) is websocket:
+        await main.cleanup_player(username)
+
+
+async def run(args) -> int:
+    rng = random.Random(args.seed)
+    errors = ErrorCounter()
+    logging.getLogger("main").addHandler(errors)
+    main.history_writer.start()
+    await main.puzzle_catalog.load()
+
+    categories = list(main.CATEGORY_PUZZLES)
+    sockets: Dict[str, RecordingWebSocket] = {}
+    games = []
+    for i in range(args.games):
+        category = categories[i % len(categories)]
+        a, b = f"stress{i}a", f"stress{i}b"
+        for username in (a, b):
+            sockets[username] = main.connected_players[username] = RecordingWebSocket()
+            await main.user_store.insert_user({"username": username, "score": 0})
+        await main.handle_matchmaking(a, sockets[a], category)
+        await main.handle_matchmaking(b, sockets[b], category)
+        actor = main.active_games[main.player_games[a]]
+        games.append((actor, a, b, rng.choice(SCENARIOS)))
+
+    # Let the actors start and arm their timeouts, then slow the store down
+    await asyncio.sleep(0)
+    main.storage_faults.latency_ms = args.latency_ms
+    main.storage_faults.jitter_ms = args.jitter_ms
+    started = time.perf_counter()
+    events = []
+    for actor, a, b, scenario in games:
+        correct = actor.session.current_puzzle["answer"]
+        spread = args.spread
+        if scenario == "double_correct":
+            events += [answer(a, correct, rng.uniform(0, spread)), answer(b, f" {correct.upper()} ", rng.uniform(0, spread))]
+        elif scenario == "correct_vs_disconnect":
+            events += [answer(a, correct, rng.uniform(0, spread)), disconnect(b, sockets[b], rng.uniform(0, spread))]
+        elif scenario == "correct_vs_timeout":
+            events.append(answer(a, correct, actor.timeout + rng.uniform(-spread, spread)))
+        elif scenario == "double_disconnect":
+            events += [disconnect(a, sockets[a], rng.uniform(0, spread)), disconnect(b, sockets[b], rng.uniform(0, spread))]
+        else:
+            events += [answer(a, "definitely wrong", 0), answer(b, "also wrong", 0),
+                       answer(a, correct, rng.uniform(0, spread)), answer(b, correct, rng.uniform(0, spread))]
+    await asyncio.gather(*events)
+    await asyncio.gather(*(actor.task for actor, *_ in games))
+    elapsed = time.perf_counter() - started
+    await main.history_writer.stop()
+
+    failures = []
+    records = Counter(game["game_id"] for game in main.game_store.games)
+    outcomes = Counter(actor.outcome for actor, *_ in games)
+    for actor, a, b, scenario in games:
+        if records[actor.game_id] != 1:
+            failures.append(f"{actor.game_id} ({scenario}): {records[actor.game_id]} history records")
+        points = main.get_points_for_category(actor.session.category)
+        for username in (a, b):
+            expected = points if actor.outcome == "won" and actor.session.winner == username else 0
+            score = main.user_store.users[username]["score"]
+            if score != expected:
+                failures.append(f"{username} ({scenario}): score {score}, expected {expected}")
+            terminal = sum(1 for frame in sockets[username].frames if frame["type"] in TERMINAL_TYPES)
+            # A player who disconnected may or may not have seen the end first
+            still_connected = main.connected_players.get(username) is sockets[username]
+            if terminal > 1 or (still_connected and terminal != 1):
+                failures.append(f"{username} ({scenario}): {terminal} terminal frames")
+    if main.active_games or main.player_games:
+        failures.append(f"{len(main.active_games)} games still registered")
+    if errors.count:
+        failures.append(f"{errors.count} errors logged")
+
+    print(f"{len(games)} games, {len(events)} events in {elapsed:.2f}s "
+          f"(timeout {games[0][0].timeout:.2f}s, storage latency {args.latency_ms}+{args.jitter_ms} ms)")
+    print("outcomes: " + ", ".join(f"{outcome}={count}" for outcome, count in sorted(outcomes.items())))
+    for failure in failures[:20]:
+        print(f"FAIL {failure}")
+    print(f"{len(failures)} failures" if failures else "OK: every game ended exactly once")
+    return 1 if failures else 0
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=10_000)
+    parser.add_argument("--spread", type=float, default=1.0, help="Events land within this many seconds")
+    parser.add_argument("--timeout", type=float, default=3.0, help="Game timeout in seconds")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Injected storage latency")
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    main.GAME_TIMEOUT_SECONDS = args.timeout
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,143 @@
+"""Matches/sec scaling of cluster mode with worker count.
+
+For each worker count the server is started with ``cluster.py``, several
+load generator processes (``benchmarks.ws_load``) drive it concurrently so
+the client is not the bottleneck, and the combined matches/sec, latency and
+server CPU (summed over the whole process tree, read from /proc) are
+reported together with the scaling efficiency relative to one worker.
+
+    python -m benchmarks.cluster_scaling --workers 1 2 4 --players 2000 --clients 4
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def tree_cpu_seconds(root_pid: int) -> float:
+    """User + system CPU of ``root_pid`` and all its descendants (Linux only)"""
+    parents: Dict[int, int] = {}
+    cpu: Dict[int, float] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        pid = int(entry)
+        parents[pid] = int(fields[1])
+        cpu[pid] = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    total, stack = 0.0, [root_pid]
+    while stack:
+        pid = stack.pop()
+        total += cpu.get(pid, 0.0)
+        stack.extend(child for child, parent in parents.items() if parent == pid)
+    return total
+
+
+def wait_ready(base_url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    consecutive = 0
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/health/ready", timeout=2) as response:
+                consecutive = consecutive + 1 if response.status == 200 else 0
+        except (urllib.error.URLError, OSError):
+            consecutive = 0
+        # Several in a row so every worker behind the shared socket is likely up
+        if consecutive >= 10:
+            return
+        time.sleep(0.2)
+    raise RuntimeError(f"{base_url} did not become ready")
+
+
+def run_point(args, workers: int) -> Dict:
+    base_url = f"http://127.0.0.1:{args.port}"
+    env = {**os.environ, "STORAGE_BACKEND": os.getenv("STORAGE_BACKEND", "memory")}
+    server = subprocess.Popen(
+        [sys.executable, "cluster.py", "--workers", str(workers), "--port", str(args.port)],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    try:
+        wait_ready(base_url)
+        cpu_before = tree_cpu_seconds(server.pid)
+        started = time.monotonic()
+        outputs, clients = [], []
+        for k in range(args.clients):
+            output = os.path.join(tempfile.gettempdir(), f"mindmaze-scaling-{workers}-{k}.json")
+            outputs.append(output)
+            clients.append(subprocess.Popen(
+                [sys.executable, "-m", "benchmarks.ws_load", "--url", base_url,
+                 "--players", str(args.players // args.clients), "--duration", str(args.duration),
+                 "--ramp", str(args.ramp), "--prefix", f"scale{workers}c{k}_", "--seed", str(k + 1),
+                 "--categories", args.categories, "--output", output],
+                cwd=BACKEND_DIR, stdout=subprocess.DEVNULL,
+            ))
+        for client in clients:
+            client.wait()
+        elapsed = time.monotonic() - started
+        cpu = tree_cpu_seconds(server.pid) - cpu_before
+    finally:
+        os.killpg(server.pid, signal.SIGINT)
+        server.wait(timeout=30)
+
+    results: List[Dict] = []
+    for output in outputs:
+        with open(output) as f:
+            results.extend(json.load(f))
+    latency = [r["latency"]["submit_answer_to_game_end"] for r in results]
+    return {
+        "workers": workers,
+        "players": args.players,
+        "matches": sum(r["matches"] for r in results),
+        "matches_per_sec": sum(r["matches_per_sec"] for r in results),
+        "game_end_p50_ms": max((l.get("p50_ms", 0) for l in latency), default=0),
+        "game_end_p99_ms": max((l.get("p99_ms", 0) for l in latency), default=0),
+        "server_cpu_seconds": cpu,
+        "server_cores_used": cpu / elapsed if elapsed else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--players", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=4, help="Load generator processes")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--ramp", type=float, default=10)
+    parser.add_argument("--categories", default="general_knowledge:1,riddles:1,science:1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    points = []
+    for workers in args.workers:
+        point = run_point(args, workers)
+        points.append(point)
+        baseline = points[0]["matches_per_sec"] / points[0]["workers"]
+        point["scaling_efficiency"] = point["matches_per_sec"] / (baseline * workers) if baseline else 0
+        print(
+            f"workers={workers:<3} {point['matches_per_sec']:8.1f} matches/s  "
+            f"efficiency {point['scaling_efficiency']:.2f}  "
+            f"game_end p99 {point['game_end_p99_ms']:.1f} ms  cores {point['server_cores_used']:.2f}"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(points, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Near-duplicate scan over a puzzle bank scaled up to ``--puzzles``.
+
+Uses the synthetic bank from ``benchmarks.puzzle_search``: copies of real
+puzzles with two words swapped, so most puzzles have paraphrase-like
+near-duplicates sharing their answer. That is the worst case for the scan.
+Every answer group is large and every LSH bucket has candidates to verify.
+Reported: wall time, puzzles per second and how much was flagged.
+
+    python -m benchmarks.duplicate_scan --puzzles 1000000 --workers 4
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.puzzle_search import synthetic_catalog  # noqa: E402
+from duplicates import catalog_puzzles, find_duplicates  # noqa: E402
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--puzzles", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    puzzles = catalog_puzzles(synthetic_catalog(args.puzzles, args.seed))
+    started = time.perf_counter()
+    clusters = find_duplicates(puzzles, threshold=args.threshold, workers=args.workers)
+    elapsed = time.perf_counter() - started
+    flagged = sum(len(cluster) for cluster in clusters)
+    print(
+        f"{len(puzzles)} puzzles, {args.workers} workers: {elapsed:.1f} s "
+        f"({len(puzzles) / elapsed:,.0f} puzzles/s); {len(clusters)} clusters covering {flagged} puzzles"
+    )
+
+
+if __name__ == "__main__":
+    main_cli()
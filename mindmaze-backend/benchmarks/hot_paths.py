@@ -0,0 +1,414 @@
+"""Microbenchmarks for the per-message hot paths in main.py.
+
+Each benchmark is timed (best-of-N median of ns/op) and allocation-profiled
+with tracemalloc (peak bytes allocated by a single call). Results are written
+as JSON so two runs can be compared:
+
+    python -m benchmarks.hot_paths run --output before.json
+    python -m benchmarks.hot_paths run --output after.json
+    python -m benchmarks.hot_paths compare before.json after.json --threshold 10
+
+``compare`` exits with status 1 when any benchmark regressed by more than the
+threshold percentage. The app is imported with the in-memory store and INFO
+logging disabled, so the numbers reflect handler cost only.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+# Lobbies are filled outside the event loop, so no fill timers
+os.environ.setdefault("ROOM_FILL_TIMEOUT_SECONDS", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+from bson import ObjectId  # noqa: E402
+from encoding import encode_json  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+logging.disable(logging.INFO)
+
+POOL_SIZES = (10, 1_000, 10_000)
+
+
+class FakeWebSocket:
+    """Stands in for a Starlette WebSocket; frames are encoded but discarded"""
+
+    async def send_text(self, data: str):
+        pass
+
+
+def legacy_serialize_mongo_doc(doc):
+    """The recursive serializer main.py used before encoding.MongoJSONResponse"""
+    if doc is None:
+        return None
+    if isinstance(doc, list):
+        return [legacy_serialize_mongo_doc(item) for item in doc]
+    if isinstance(doc, dict):
+        serialized = {}
+        for key, value in doc.items():
+            if isinstance(value, ObjectId):
+                serialized[key] = str(value)
+            elif isinstance(value, dict):
+                serialized[key] = legacy_serialize_mongo_doc(value)
+            elif isinstance(value, list):
+                serialized[key] = [legacy_serialize_mongo_doc(item) for item in value]
+            else:
+                serialized[key] = value
+        return serialized
+    return doc
+
+
+def legacy_render(doc) -> bytes:
+    """serialize_mongo_doc, then jsonable_encoder and JSONResponse.render as FastAPI did"""
+    content = jsonable_encoder(legacy_serialize_mongo_doc(doc))
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def user_document(index: int) -> Dict:
+    return {
+        "_id": ObjectId(),
+        "username": f"player_{index}",
+        "score": index * 5,
+        "created_at": datetime(2025, 1, 1, 12, 0, 0),
+        "last_login": datetime(2025, 6, 1, 18, 30, 0),
+    }
+
+
+def reset_state():
+    main.waiting_players.clear()
+    main.lobbies.clear()
+    drop_games()
+    main.connected_players.clear()
+
+
+def drop_games():
+    for actor in main.active_games.values():
+        if actor.task is not None:
+            actor.task.cancel()
+    main.active_games.clear()
+    main.player_games.clear()
+
+
+def register_game(game_id: str, session) -> None:
+    """Register a game's actor without starting its task; events are handled by ``answer_and_process``"""
+    main.active_games[game_id] = main.GameActor(game_id, session)
+    for player in session.players:
+        main.player_games[player] = game_id
+
+
+async def answer_and_process(username: str, answer: str, ws) -> None:
+    """handle_answer posts to the game's mailbox; handle the event inline as its actor would"""
+    actor = main.active_games[main.player_games[username]]
+    await main.handle_answer(username, answer, ws)
+    await actor.handle(actor.mailbox.get_nowait())
+
+
+def fill_waiting(size: int, exclude: str):
+    """``size`` waiting players in part-filled room lobbies, none of them in ``exclude``"""
+    keys = (
+        (category, room_size, scoring)
+        for category in main.CATEGORY_PUZZLES if category != exclude
+        for room_size in range(3, main.MAX_ROOM_SIZE + 1)
+        for scoring in main.SCORING_MODES
+    )
+    i = 0
+    for category, room_size, scoring in keys:
+        for _ in range(room_size - 1):
+            if i == size:
+                return
+            username = f"waiting_{i}"
+            main.connected_players[username] = FakeWebSocket()
+            main.join_lobby(username, main.connected_players[username], category, room_size, scoring)
+            i += 1
+
+
+def fill_games(size: int):
+    categories = list(main.CATEGORY_PUZZLES)
+    for i in range(size):
+        category = categories[i % len(categories)]
+        players = [f"p{i}a", f"p{i}b"]
+        for player in players:
+            main.connected_players[player] = FakeWebSocket()
+        register_game(f"game_{i}", main.GameSession(
+            players=players, category=category, current_puzzle=main.CATEGORY_PUZZLES[category][0]
+        ))
+
+
+class Benchmark:
+    def __init__(self, name: str, setup: Optional[Callable] = None):
+        self.name = name
+        self.setup = setup
+
+    def run_once(self) -> None:
+        raise NotImplementedError
+
+    def time_loop(self, iterations: int) -> float:
+        raise NotImplementedError
+
+
+class SyncBenchmark(Benchmark):
+    def __init__(self, name, fn, setup=None):
+        super().__init__(name, setup)
+        self.fn = fn
+
+    def run_once(self):
+        self.fn()
+
+    def time_loop(self, iterations):
+        fn = self.fn
+        started = time.perf_counter_ns()
+        for _ in range(iterations):
+            fn()
+        return (time.perf_counter_ns() - started) / iterations
+
+
+class AsyncBenchmark(Benchmark):
+    """Awaits ``fn()`` repeatedly inside one running loop; ``after`` undoes side effects"""
+
+    def __init__(self, name, fn, setup=None, after=None):
+        super().__init__(name, setup)
+        self.fn = fn
+        self.after = after
+        self.loop = asyncio.new_event_loop()
+
+    def run_once(self):
+        self.loop.run_until_complete(self._loop(1))
+
+    async def _loop(self, iterations):
+        fn, after = self.fn, self.after
+        elapsed = 0
+        for _ in range(iterations):
+            started = time.perf_counter_ns()
+            await fn()
+            elapsed += time.perf_counter_ns() - started
+            if after is not None:
+                after()
+        return elapsed
+
+    def time_loop(self, iterations):
+        return self.loop.run_until_complete(self._loop(iterations)) / iterations
+
+
+def build_benchmarks() -> List[Benchmark]:
+    benchmarks: List[Benchmark] = []
+    ws = FakeWebSocket()
+
+    # Full documents through the old path versus projected documents through the new one
+    user = user_document(1)
+    leaderboard = [user_document(i) for i in range(10)]
+    projected_user = {"username": user["username"], "score": user["score"]}
+    projected_leaderboard = [{"username": u["username"], "score": u["score"]} for u in leaderboard]
+    benchmarks.append(SyncBenchmark("render/user/legacy", lambda: legacy_render(user)))
+    benchmarks.append(SyncBenchmark("render/user/encode_json", lambda: encode_json(user)))
+    benchmarks.append(SyncBenchmark("render/user/projected", lambda: encode_json(projected_user)))
+    benchmarks.append(SyncBenchmark("render/leaderboard_10/legacy", lambda: legacy_render(leaderboard)))
+    benchmarks.append(SyncBenchmark("render/leaderboard_10/encode_json", lambda: encode_json(leaderboard)))
+    benchmarks.append(SyncBenchmark(
+        "render/leaderboard_10/projected", lambda: encode_json(projected_leaderboard)
+    ))
+
+    for size in POOL_SIZES:
+        def setup(size=size):
+            reset_state()
+            fill_waiting(size, "riddles")
+            main.connected_players["newcomer"] = ws
+
+        def leave():
+            main.leave_lobby("newcomer")
+
+        benchmarks.append(AsyncBenchmark(
+            f"handle_matchmaking/no_match/waiting_{size}",
+            lambda: main.handle_matchmaking("newcomer", ws, "riddles"),
+            setup=setup, after=leave,
+        ))
+
+        def setup_match(size=size):
+            reset_state()
+            fill_waiting(size - 1, "riddles")
+            main.connected_players["newcomer"] = ws
+
+        def requeue():
+            # Put the matched opponent back at the end of the queue and drop the game
+            drop_games()
+            main.connected_players["opponent"] = ws
+            main.join_lobby("opponent", ws, "riddles", 2, "first_correct")
+
+        benchmarks.append(AsyncBenchmark(
+            f"handle_matchmaking/match/waiting_{size}",
+            lambda: main.handle_matchmaking("newcomer", ws, "riddles"),
+            setup=lambda setup_match=setup_match: (setup_match(), requeue()), after=requeue,
+        ))
+
+        def setup_games(size=size):
+            reset_state()
+            fill_games(size)
+
+        last_player = f"p{size - 1}b"
+        benchmarks.append(AsyncBenchmark(
+            f"handle_answer/wrong/games_{size}",
+            lambda last_player=last_player: answer_and_process(last_player, "not it", ws),
+            setup=setup_games,
+        ))
+
+        def replay_game(size=size):
+            game_id = f"game_{size - 1}"
+            register_game(game_id, main.GameSession(
+                players=[f"p{size - 1}a", f"p{size - 1}b"], category="riddles",
+                current_puzzle={"question": "q", "answer": "Echo"},
+            ))
+
+        benchmarks.append(AsyncBenchmark(
+            f"handle_answer/correct/games_{size}",
+            lambda last_player=last_player: answer_and_process(last_player, " echo ", ws),
+            setup=lambda setup_games=setup_games, replay_game=replay_game: (setup_games(), replay_game()),
+            after=replay_game,
+        ))
+
+    benchmarks.append(SyncBenchmark("puzzle_selection", lambda: main.puzzle_catalog.pick("riddles")))
+
+    correct_answer = "Bristlecone Pine"
+    benchmarks.append(SyncBenchmark(
+        "answer_normalization", lambda: "  bristlecone pine ".lower().strip() == correct_answer.lower()
+    ))
+
+    benchmarks.append(SyncBenchmark(
+        "get_points_for_category", lambda: main.get_points_for_category("riddles")
+    ))
+
+    game_start = {
+        "type": "game_start",
+        "game_id": "game_1_alice_bob",
+        "category": "riddles",
+        "puzzle": main.CATEGORY_PUZZLES["riddles"][0]["question"],
+        "opponent": "bob",
+    }
+    benchmarks.append(SyncBenchmark("json_frame/game_start", lambda: json.dumps(game_start)))
+    return benchmarks
+
+
+def measure(benchmark: Benchmark, repeat: int, min_time: float) -> Dict:
+    if benchmark.setup:
+        benchmark.setup()
+
+    # Calibrate the iteration count so one timing loop takes at least min_time
+    iterations = 1
+    while True:
+        elapsed = benchmark.time_loop(iterations) * iterations / 1e9
+        if elapsed >= min_time or iterations >= 10_000_000:
+            break
+        iterations *= 10 if elapsed < min_time / 10 else 2
+
+    timings = [benchmark.time_loop(iterations) for _ in range(repeat)]
+
+    tracemalloc.start()
+    benchmark.run_once()
+    baseline, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    benchmark.run_once()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "ns_per_op": statistics.median(timings),
+        "min_ns_per_op": min(timings),
+        "stdev_ns": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        "iterations": iterations,
+        "peak_alloc_bytes": peak - baseline,
+        "retained_bytes": current - baseline,
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> int:
+    results = {}
+    # Matchmaking reads the catalog's cache; every category fits, so later loops never hit the store
+    asyncio.run(main.puzzle_catalog.load())
+    for benchmark in build_benchmarks():
+        if args.filter and args.filter not in benchmark.name:
+            continue
+        result = measure(benchmark, args.repeat, args.min_time)
+        results[benchmark.name] = result
+        print(f"{benchmark.name:<45} {result['ns_per_op']:>12.0f} ns/op {result['peak_alloc_bytes']:>10} B peak")
+    reset_state()
+
+    report = {
+        "meta": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "git_revision": git_revision(),
+            "timestamp": datetime.utcnow().isoformat(),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+def compare(args) -> int:
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    with open(args.candidate) as f:
+        candidate = json.load(f)["results"]
+
+    regressions = 0
+    print(f"{'benchmark':<45} {'base ns':>10} {'new ns':>10} {'change':>8} {'alloc B':>16}")
+    for name in sorted(set(baseline) | set(candidate)):
+        if name not in baseline or name not in candidate:
+            print(f"{name:<45} {'(only in one run)':>30}")
+            continue
+        before, after = baseline[name], candidate[name]
+        change = (after["ns_per_op"] - before["ns_per_op"]) / before["ns_per_op"] * 100
+        alloc = f"{before['peak_alloc_bytes']}->{after['peak_alloc_bytes']}"
+        flag = ""
+        if change > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif change < -args.threshold:
+            flag = "  improved"
+        print(f"{name:<45} {before['ns_per_op']:>10.0f} {after['ns_per_op']:>10.0f} {change:>+7.1f}% {alloc:>16}{flag}")
+    return 1 if regressions else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks")
+    run_parser.add_argument("--output", help="Write results as JSON to this file")
+    run_parser.add_argument("--filter", help="Only run benchmarks whose name contains this")
+    run_parser.add_argument("--repeat", type=int, default=5, help="Timing loops per benchmark")
+    run_parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per timing loop")
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=10.0, help="Regression threshold in percent")
+    compare_parser.set_defaults(handler=compare)
+    return parser
+
+
+if __name__ == "__main__":
+    cli_args = build_parser().parse_args()
+    sys.exit(cli_args.handler(cli_args))
@@ -0,0 +1,91 @@
+"""Search latency over a puzzle bank scaled up to ``--puzzles``.
+
+Synthetic puzzles are made from the real catalog: each one is a real
+question with a few words swapped for vocabulary words picked with a
+Zipf-like skew, so the token distribution resembles a large bank of the
+same content. Reported: build time and size, then query latency per query
+shape (rare token, common token, prefix, multi-term, category filter).
+It fails if a shape's p99 is over ``--budget-ms``.
+
+    python -m benchmarks.puzzle_search --puzzles 1000000
+"""
+import argparse
+import gc
+import itertools
+import os
+import random
+import statistics
+import sys
+import time
+
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import CATEGORY_PUZZLES  # noqa: E402
+from search import PuzzleSearchIndex, tokenize  # noqa: E402
+
+QUERIES = {
+    "rare token": ["canberra", "towel", "capcom", "nocturnal"],
+    "common token": ["what", "is", "the"],
+    "prefix": ["ca*", "wat*", "pro*", "rh*"],
+    "multi-term": ["what is capital", "head tail coin", "largest ocean", "what does stand"],
+    "category filter": [("what", "riddles"), ("capital", "social_science"), ("co*", "programming")],
+}
+
+
+def synthetic_catalog(size: int, seed: int):
+    rng = random.Random(seed)
+    originals = [(category, puzzle) for category, puzzles in CATEGORY_PUZZLES.items() for puzzle in puzzles]
+    vocabulary = sorted({token for _, p in originals for token in tokenize(p["question"] + " " + p["answer"])})
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    catalog = {category: [] for category in CATEGORY_PUZZLES}
+    for _ in range(size):
+        category, puzzle = rng.choice(originals)
+        words = puzzle["question"].split()
+        for _ in range(2):
+            words[rng.randrange(len(words))] = rng.choices(vocabulary, cum_weights=cum_weights)[0]
+        catalog[category].append({"question": " ".join(words), "answer": puzzle["answer"]})
+    return catalog
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--puzzles", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    catalog = synthetic_catalog(args.puzzles, args.seed)
+    started = time.perf_counter()
+    index = PuzzleSearchIndex.build(catalog)
+    del catalog
+    gc.freeze()  # As load_puzzle_catalog does
+    posting_lists = sum(len(category_index.postings) for category_index in index.categories.values())
+    print(
+        f"built {len(index)} puzzles, {posting_lists} posting lists "
+        f"in {time.perf_counter() - started:.1f} s"
+    )
+
+    failed = False
+    for shape, queries in QUERIES.items():
+        timings = []
+        for _ in range(args.repeat):
+            for query in queries:
+                q, category = query if isinstance(query, tuple) else (query, None)
+                started = time.perf_counter()
+                index.search(q, category=category, limit=args.limit)
+                timings.append(time.perf_counter() - started)
+        timings.sort()
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000
+        print(f"{shape:<16} p50 {statistics.median(timings) * 1000:.3f} ms  p99 {p99:.3f} ms")
+        failed |= p99 > args.budget_ms
+    if failed:
+        print(f"FAIL p99 over {args.budget_ms} ms")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
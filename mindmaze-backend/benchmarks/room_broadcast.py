@@ -0,0 +1,111 @@
+"""Round-end broadcast latency for a full room.
+
+Plays rounds in a room of ``--players`` (default 50): one player answers
+correctly and the time until the last member has received ``game_end`` is
+recorded. Each simulated socket takes ``--send-delay-ms`` (plus jitter) to
+accept a frame, like a real socket waiting on drain. The game actor's
+concurrent fan-out is compared with sending one member at a time, and the
+number of distinct frames encoded per round is reported.
+
+    python -m benchmarks.room_broadcast --players 50 --rounds 200 --send-delay-ms 1
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+
+class SlowWebSocket:
+    def __init__(self, rng: random.Random, delay: float, jitter: float):
+        self.rng = rng
+        self.delay = delay
+        self.jitter = jitter
+        self.frames: List[str] = []
+        self.received_at = 0.0
+
+    async def send_text(self, data: str):
+        delay = self.delay + self.rng.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self.frames.append(data)
+        self.received_at = time.perf_counter()
+
+
+class SequentialGameActor(main.GameActor):
+    """Baseline: the same actor, sending to one member after another"""
+
+    async def fan_out(self, sends):
+        for websocket, text in sends:
+            await self.send(websocket, text)
+
+
+async def play_round(actor_class, players: int, scoring: str, rng, delay: float, jitter: float) -> Dict:
+    names = [f"room_player_{i}" for i in range(players)]
+    sockets = {}
+    for name in names:
+        sockets[name] = main.connected_players[name] = SlowWebSocket(rng, delay, jitter)
+    actor = actor_class("room_bench", main.GameSession(
+        players=names, category="riddles", current_puzzle={"question": "q", "answer": "Echo"}, scoring=scoring
+    ))
+    started = time.perf_counter()
+    if scoring == "ranked":
+        for name in names:
+            await actor.handle(("answer", name, "echo", sockets[name]))
+    else:
+        await actor.handle(("answer", names[0], "echo", sockets[names[0]]))
+    last = max(socket.received_at for socket in sockets.values())
+    frames = {id(socket.frames[-1]) for socket in sockets.values()}
+    for name in names:
+        main.connected_players.pop(name, None)
+    return {"latency": last - started, "frames_encoded": len(frames)}
+
+
+def summarize(latencies: List[float]) -> Dict:
+    ordered = sorted(latencies)
+    return {
+        "p50_ms": statistics.median(ordered) * 1000,
+        "p99_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+async def run(args):
+    delay, jitter = args.send_delay_ms / 1000, args.jitter_ms / 1000
+    for label, actor_class in (("concurrent", main.GameActor), ("sequential", SequentialGameActor)):
+        rng = random.Random(args.seed)
+        results = [
+            await play_round(actor_class, args.players, args.scoring, rng, delay, jitter)
+            for _ in range(args.rounds)
+        ]
+        stats = summarize([result["latency"] for result in results])
+        print(
+            f"{label:<10} {args.players} players, {args.scoring}: round end p50 {stats['p50_ms']:.2f} ms  "
+            f"p99 {stats['p99_ms']:.2f} ms  max {stats['max_ms']:.2f} ms  "
+            f"frames encoded per round {max(result['frames_encoded'] for result in results)}"
+        )
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--players", type=int, default=main.MAX_ROOM_SIZE)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--scoring", choices=main.SCORING_MODES, default="first_correct")
+    parser.add_argument("--send-delay-ms", type=float, default=1.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,132 @@
+"""Compare server configurations on the MindMaze WebSocket workload.
+
+Each configuration is a set of ``launcher.py`` flags. For every
+configuration and worker count, the server is started with the launcher and
+driven by several ``benchmarks.ws_load`` processes. The report gives the
+combined matches/sec, game_end latency and the server CPU, summed over the
+whole process tree, per match. A configuration whose implementation is not
+installed (uvloop, wsproto) is skipped.
+
+    python -m benchmarks.server_matrix --workers 1 2 --players 1000 --clients 4
+    python -m benchmarks.server_matrix --configs uvicorn-defaults tuned --output matrix.json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from benchmarks.cluster_scaling import BACKEND_DIR, tree_cpu_seconds, wait_ready
+
+# Name -> (launcher flags, modules it needs)
+CONFIGS = {
+    # What uvicorn.run() gives without options
+    "uvicorn-defaults": (["--ws-max-size", str(16 * 2**20), "--ws-per-message-deflate"], ()),
+    "tuned": ([], ()),
+    "tuned-deflate": (["--ws-per-message-deflate"], ()),
+    "h11-wsproto": (["--http", "h11", "--ws", "wsproto"], ("wsproto",)),
+    "httptools-websockets": (["--http", "httptools", "--ws", "websockets"], ("httptools", "websockets")),
+    "uvloop": (["--loop", "uvloop"], ("uvloop",)),
+    "no-ping": (["--ws-ping-interval", "0"], ()),
+}
+
+
+def run_point(args, name: str, workers: int) -> Optional[Dict]:
+    flags, modules = CONFIGS[name]
+    missing = [module for module in modules if importlib.util.find_spec(module) is None]
+    if missing:
+        print(f"{name:<22} skipped: {', '.join(missing)} not installed")
+        return None
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    env = {**os.environ, "STORAGE_BACKEND": os.getenv("STORAGE_BACKEND", "memory")}
+    server = subprocess.Popen(
+        [sys.executable, "launcher.py", "--workers", str(workers), "--port", str(args.port),
+         "--no-access-log", *flags],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    try:
+        wait_ready(base_url)
+        cpu_before = tree_cpu_seconds(server.pid)
+        started = time.monotonic()
+        outputs, clients = [], []
+        for k in range(args.clients):
+            output = os.path.join(tempfile.gettempdir(), f"mindmaze-matrix-{name}-{workers}-{k}.json")
+            outputs.append(output)
+            clients.append(subprocess.Popen(
+                [sys.executable, "-m", "benchmarks.ws_load", "--url", base_url,
+                 "--players", str(args.players // args.clients), "--duration", str(args.duration),
+                 "--ramp", str(args.ramp), "--prefix", f"matrix_{name}_{workers}_{k}_", "--seed", str(k + 1),
+                 "--categories", args.categories, "--output", output],
+                cwd=BACKEND_DIR, stdout=subprocess.DEVNULL,
+            ))
+        for client in clients:
+            client.wait()
+        elapsed = time.monotonic() - started
+        cpu = tree_cpu_seconds(server.pid) - cpu_before
+    finally:
+        os.killpg(server.pid, signal.SIGINT)
+        server.wait(timeout=60)
+
+    results: List[Dict] = []
+    for output in outputs:
+        with open(output) as f:
+            results.extend(json.load(f))
+    matches = sum(r["matches"] for r in results)
+    latency = [r["latency"]["submit_answer_to_game_end"] for r in results]
+    connect = [r["latency"]["connect"] for r in results]
+    return {
+        "config": name,
+        "flags": flags,
+        "workers": workers,
+        "players": args.players,
+        "matches": matches,
+        "matches_per_sec": sum(r["matches_per_sec"] for r in results),
+        "connect_p99_ms": max((l.get("p99_ms", 0) for l in connect), default=0),
+        "game_end_p50_ms": max((l.get("p50_ms", 0) for l in latency), default=0),
+        "game_end_p99_ms": max((l.get("p99_ms", 0) for l in latency), default=0),
+        "errors": sum(sum(r["errors"].values()) for r in results),
+        "server_cpu_seconds": cpu,
+        "server_cpu_ms_per_match": cpu * 1000 / matches if matches else 0,
+        "server_cores_used": cpu / elapsed if elapsed else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--configs", nargs="+", choices=sorted(CONFIGS), default=list(CONFIGS))
+    parser.add_argument("--workers", type=int, nargs="+", default=[1])
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--clients", type=int, default=4, help="Load generator processes")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--ramp", type=float, default=10)
+    parser.add_argument("--categories", default="general_knowledge:1,riddles:1,science:1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    points = []
+    for workers in args.workers:
+        for name in args.configs:
+            point = run_point(args, name, workers)
+            if point is None:
+                continue
+            points.append(point)
+            print(
+                f"{name:<22} workers={workers:<3} {point['matches_per_sec']:8.1f} matches/s  "
+                f"game_end p50 {point['game_end_p50_ms']:.1f} ms p99 {point['game_end_p99_ms']:.1f} ms  "
+                f"cpu {point['server_cpu_ms_per_match']:.2f} ms/match  errors {point['errors']}"
+            )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(points, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
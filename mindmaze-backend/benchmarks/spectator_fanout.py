@@ -0,0 +1,102 @@
+"""Fan-out of one game's events to thousands of spectators.
+
+Subscribes ``--viewers`` spectators to a topic through the same ``PubSub``
+the spectate endpoint uses. Each viewer's socket has a send delay, and
+``--lagging`` of them are much slower. ``--events`` attempt frames are
+published at ``--rate`` per second, then the final ``game_end``. Reported:
+
+* publish cost per event (one shared frame, no awaits),
+* time until every viewer has received ``game_end``,
+* frames skipped by lagging viewers, and the largest queue seen.
+
+It fails if any viewer misses ``game_end``.
+
+    python -m benchmarks.spectator_fanout --viewers 5000 --lagging 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pubsub import FRAMES_DROPPED, PubSub  # noqa: E402
+
+
+async def viewer(subscription, delay: float, received: list, peak: list):
+    """The spectate endpoint's send loop, against a socket that takes ``delay`` per frame"""
+    last = None
+    while True:
+        peak[0] = max(peak[0], len(subscription.frames))
+        frames = await subscription.next_frames()
+        if not frames:
+            break
+        for frame in frames:
+            if delay:
+                await asyncio.sleep(delay)
+            last = frame
+    received.append((time.perf_counter(), last))
+
+
+async def run(args) -> int:
+    rng = random.Random(args.seed)
+    pubsub = PubSub(queue_size=args.queue_size)
+    received: list = []
+    peak = [0]
+    tasks = []
+    for _ in range(args.viewers):
+        lagging = rng.random() < args.lagging
+        delay = args.lag_delay_ms / 1000 if lagging else args.send_delay_ms / 1000
+        tasks.append(asyncio.create_task(viewer(pubsub.subscribe("game"), delay, received, peak)))
+    await asyncio.sleep(0)
+
+    publish_ns = []
+    wrong_attempts = {"alice": 0, "bob": 0}
+    for i in range(args.events):
+        player = "alice" if i % 2 else "bob"
+        wrong_attempts[player] += 1
+        started = time.perf_counter_ns()
+        pubsub.publish("game", json.dumps({"type": "attempts", "username": player, "wrong_attempts": wrong_attempts}))
+        publish_ns.append(time.perf_counter_ns() - started)
+        await asyncio.sleep(1 / args.rate)
+
+    ended = time.perf_counter()
+    pubsub.close("game", json.dumps({"type": "game_end", "outcome": "won", "winner": "alice"}))
+    await asyncio.gather(*tasks)
+
+    dropped = FRAMES_DROPPED.labels().value
+    missing = sum(1 for _, last in received if last is None or json.loads(last)["type"] != "game_end")
+    last_delivery = max(at for at, _ in received) - ended
+    print(
+        f"{args.viewers} viewers ({args.lagging:.0%} lagging), {args.events} events: "
+        f"publish p50 {statistics.median(publish_ns) / 1000:.1f} us  max {max(publish_ns) / 1000:.1f} us"
+    )
+    print(
+        f"game_end reached every viewer in {last_delivery * 1000:.1f} ms; "
+        f"{dropped:.0f} frames skipped by lagging viewers; largest queue {peak[0]} (limit {args.queue_size})"
+    )
+    if missing:
+        print(f"FAIL {missing} viewers did not receive game_end")
+        return 1
+    return 0
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--viewers", type=int, default=5000)
+    parser.add_argument("--lagging", type=float, default=0.05, help="Fraction of slow viewers")
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=100, help="Events per second")
+    parser.add_argument("--queue-size", type=int, default=16)
+    parser.add_argument("--send-delay-ms", type=float, default=0.0)
+    parser.add_argument("--lag-delay-ms", type=float, default=50.0)
+    parser.add_argument("--seed", type=int, default=1)
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main_cli()
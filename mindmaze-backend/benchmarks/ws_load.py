@@ -0,0 +1,336 @@
+"""WebSocket load generator and benchmark suite for the MindMaze game protocol.
+
+Simulates players that sign up, connect to ``/ws/{username}``, look for
+matches, submit wrong and right answers with configurable think times and
+occasionally disconnect. Server CPU and RSS are read from ``/metrics``.
+
+Examples (run from mindmaze-backend/ against a running server):
+
+    python -m benchmarks.ws_load --players 500 --duration 30
+    python -m benchmarks.ws_load --categories riddles:3,movies:1 --wrong-rate 0.5
+    python -m benchmarks.ws_load --suite standard --output results.json
+
+Thousands of players need a raised open-files limit (``ulimit -n``) on both
+the client and the server.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import websockets
+
+# Repeatable scenarios for --suite; every run uses a fixed seed
+SUITES = {
+    "smoke": [
+        {"name": "smoke-50", "players": 50, "duration": 15},
+    ],
+    "standard": [
+        {"name": "players-100", "players": 100, "duration": 30},
+        {"name": "players-500", "players": 500, "duration": 30},
+        {"name": "players-1000", "players": 1000, "duration": 45},
+        {"name": "players-2000-churn", "players": 2000, "duration": 45, "disconnect_rate": 0.1},
+    ],
+    "stress": [
+        {"name": "players-5000", "players": 5000, "duration": 60, "ramp": 20},
+        {"name": "players-10000", "players": 10000, "duration": 90, "ramp": 40},
+    ],
+}
+
+_http_pool = ThreadPoolExecutor(max_workers=32)
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {
+        "count": len(ordered),
+        "p50_ms": pick(0.50),
+        "p90_ms": pick(0.90),
+        "p99_ms": pick(0.99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def _http(method: str, url: str, body: Optional[Dict] = None, timeout: float = 10.0):
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+async def http(method: str, url: str, body: Optional[Dict] = None):
+    return await asyncio.get_running_loop().run_in_executor(_http_pool, _http, method, url, body)
+
+
+async def scrape_process_metrics(base_url: str) -> Dict[str, float]:
+    """Read process CPU seconds and RSS from the server's /metrics endpoint"""
+    try:
+        status, body = await http("GET", f"{base_url}/metrics")
+    except OSError:
+        return {}
+    if status != 200:
+        return {}
+    values = {}
+    for line in body.decode().splitlines():
+        if line.startswith(("process_cpu_seconds_total ", "process_resident_memory_bytes ")):
+            name, value = line.split()
+            values[name] = float(value)
+    return values
+
+
+class Stats:
+    def __init__(self):
+        self.match_latency: List[float] = []
+        self.answer_latency: List[float] = []
+        self.connect_latency: List[float] = []
+        self.matches = 0
+        self.wrong_answers = 0
+        self.opponent_disconnects = 0
+        self.match_timeouts = 0
+        self.late_answers = 0
+        self.disconnects = 0
+        self.errors: Dict[str, int] = {}
+
+    def error(self, kind: str):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+
+LATE_ANSWER_ERROR = "No active game found"
+
+
+async def expect(ws, types, timeout: float, stats: Optional[Stats] = None) -> Dict:
+    """Read frames until one of ``types`` arrives
+
+    With ``stats``, the error an answer gets when it raced the opponent's win
+    arrives late, after the next find_match went out. It is counted as a late
+    answer and skipped, so the wait goes on for the reply that was asked for.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise asyncio.TimeoutError
+        message = json.loads(await asyncio.wait_for(ws.recv(), remaining))
+        if stats is not None and message.get("type") == "error" and message.get("message") == LATE_ANSWER_ERROR:
+            stats.late_answers += 1
+            continue
+        if message.get("type") in types:
+            return message
+
+
+async def play_session(config, username: str, answers: Dict[str, str], stats: Stats,
+                       rng: random.Random, deadline: float) -> bool:
+    """One WebSocket connection; returns True if the player should reconnect"""
+    categories, weights = zip(*config.category_mix.items())
+    started = time.perf_counter()
+    async with websockets.connect(f"{config.ws_url}/ws/{username}", open_timeout=30, max_size=None) as ws:
+        await expect(ws, {"connected"}, 30)
+        stats.connect_latency.append(time.perf_counter() - started)
+
+        while time.monotonic() < deadline:
+            category = rng.choices(categories, weights)[0]
+            sent = time.perf_counter()
+            await ws.send(json.dumps({"type": "find_match", "category": category}))
+            try:
+                start = await expect(ws, {"game_start", "error"}, config.match_timeout, stats)
+            except asyncio.TimeoutError:
+                stats.match_timeouts += 1
+                await ws.send(json.dumps({"type": "cancel_search"}))
+                continue
+            if start["type"] == "error":
+                stats.error(start.get("message", "error"))
+                continue
+            stats.match_latency.append(time.perf_counter() - sent)
+
+            ended = None
+            await asyncio.sleep(rng.uniform(*config.think_time))
+            if rng.random() < config.wrong_rate:
+                await ws.send(json.dumps({"type": "submit_answer", "answer": "definitely wrong"}))
+                reply = await expect(ws, {"wrong_answer", "game_end", "opponent_disconnected"}, 30)
+                if reply["type"] == "wrong_answer":
+                    stats.wrong_answers += 1
+                    await asyncio.sleep(rng.uniform(*config.think_time))
+                else:
+                    ended = reply
+
+            if ended is None:
+                answer = answers.get(start["puzzle"])
+                if answer is None:
+                    stats.error("unknown_puzzle")  # The game only ends on the server's timeout
+                    answer = "unknown"
+                sent = time.perf_counter()
+                await ws.send(json.dumps({"type": "submit_answer", "answer": answer}))
+                ended = await expect(ws, {"game_end", "opponent_disconnected"}, 30)
+                stats.answer_latency.append(time.perf_counter() - sent)
+
+            if ended["type"] == "opponent_disconnected":
+                stats.opponent_disconnects += 1
+            elif ended.get("is_winner"):
+                # Count each match once, from the winner's side
+                stats.matches += 1
+
+            if rng.random() < config.disconnect_rate:
+                stats.disconnects += 1
+                return True
+    return False
+
+
+async def run_player(config, index: int, answers: Dict[str, str], stats: Stats, deadline: float):
+    rng = random.Random(config.seed * 1_000_003 + index)
+    username = f"{config.prefix}{index}"
+    await asyncio.sleep(config.ramp * index / max(config.players, 1))
+    status, _ = await http("POST", f"{config.base_url}/api/signup", {"username": username})
+    if status not in (200, 400):  # 400: already registered by a previous run
+        stats.error(f"signup_{status}")
+        return
+    while time.monotonic() < deadline:
+        try:
+            if not await play_session(config, username, answers, stats, rng, deadline):
+                return
+        except asyncio.TimeoutError:
+            stats.error("timeout")
+        except (OSError, websockets.exceptions.WebSocketException) as e:
+            stats.error(type(e).__name__)
+            await asyncio.sleep(1)
+
+
+async def run_scenario(config) -> Dict:
+    status, body = await http("GET", f"{config.base_url}/api/puzzles")
+    if status != 200:
+        raise SystemExit(f"Could not load puzzles from {config.base_url} (HTTP {status})")
+    answers = {p["question"]: p["answer"] for p in json.loads(body)["puzzles"]}
+
+    stats = Stats()
+    rss_samples: List[float] = []
+    before = await scrape_process_metrics(config.base_url)
+    started = time.monotonic()
+    deadline = started + config.ramp + config.duration
+
+    async def sample_rss():
+        while True:
+            values = await scrape_process_metrics(config.base_url)
+            if "process_resident_memory_bytes" in values:
+                rss_samples.append(values["process_resident_memory_bytes"])
+            await asyncio.sleep(1)
+
+    sampler = asyncio.create_task(sample_rss())
+    await asyncio.gather(*(run_player(config, i, answers, stats, deadline) for i in range(config.players)))
+    elapsed = time.monotonic() - started
+    sampler.cancel()
+    after = await scrape_process_metrics(config.base_url)
+
+    server = {}
+    if "process_cpu_seconds_total" in before and "process_cpu_seconds_total" in after:
+        cpu = after["process_cpu_seconds_total"] - before["process_cpu_seconds_total"]
+        server["cpu_seconds"] = cpu
+        server["cpu_utilization"] = cpu / elapsed
+    if rss_samples:
+        server["rss_start_mb"] = rss_samples[0] / 2**20
+        server["rss_end_mb"] = rss_samples[-1] / 2**20
+        server["rss_peak_mb"] = max(rss_samples) / 2**20
+
+    return {
+        "name": config.name,
+        "players": config.players,
+        "elapsed_seconds": elapsed,
+        "matches": stats.matches,
+        "matches_per_sec": stats.matches / elapsed if elapsed else 0.0,
+        "wrong_answers": stats.wrong_answers,
+        "match_timeouts": stats.match_timeouts,
+        "late_answers": stats.late_answers,
+        "disconnects": stats.disconnects,
+        "opponent_disconnects": stats.opponent_disconnects,
+        "errors": stats.errors,
+        "latency": {
+            "connect": percentiles(stats.connect_latency),
+            "find_match_to_game_start": percentiles(stats.match_latency),
+            "submit_answer_to_game_end": percentiles(stats.answer_latency),
+        },
+        "server": server,
+    }
+
+
+def parse_category_mix(raw: str) -> Dict[str, float]:
+    mix = {}
+    for item in raw.split(","):
+        name, _, weight = item.partition(":")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000", help="Server base URL")
+    parser.add_argument("--players", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of play after ramp-up")
+    parser.add_argument("--ramp", type=float, default=5, help="Seconds over which players connect")
+    parser.add_argument("--categories", default="general_knowledge:1,riddles:1,science:1",
+                        help="Comma-separated category[:weight] mix. Generated math puzzles are not in "
+                             "/api/puzzles, so very_basic_math and Oral_math are only answerable against "
+                             "a server run with GENERATED_PUZZLE_POOL_SIZE=0")
+    parser.add_argument("--think-min", type=float, default=0.2, help="Minimum think time (s)")
+    parser.add_argument("--think-max", type=float, default=1.5, help="Maximum think time (s)")
+    parser.add_argument("--wrong-rate", type=float, default=0.3, help="Chance of a wrong answer first")
+    parser.add_argument("--disconnect-rate", type=float, default=0.02, help="Chance to reconnect after a game")
+    parser.add_argument("--match-timeout", type=float, default=10, help="Seconds to wait for an opponent")
+    parser.add_argument("--prefix", default="loadbot_", help="Username prefix")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--suite", choices=sorted(SUITES), help="Run a predefined scenario list")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    return parser
+
+
+def scenario_config(args, overrides: Dict) -> argparse.Namespace:
+    config = argparse.Namespace(**vars(args))
+    config.name = "custom"
+    for key, value in overrides.items():
+        setattr(config, key, value)
+    config.base_url = config.url.rstrip("/")
+    config.ws_url = "ws" + config.base_url[len("http"):]
+    config.category_mix = parse_category_mix(config.categories)
+    config.think_time = (config.think_min, config.think_max)
+    return config
+
+
+async def main(args) -> List[Dict]:
+    scenarios = SUITES[args.suite] if args.suite else [{}]
+    results = []
+    for overrides in scenarios:
+        config = scenario_config(args, overrides)
+        print(f"▶ {config.name}: {config.players} players for {config.duration}s")
+        result = await run_scenario(config)
+        latency = result["latency"]
+        print(
+            f"  {result['matches_per_sec']:.1f} matches/s, "
+            f"game_start p50/p99 {latency['find_match_to_game_start'].get('p50_ms', 0):.1f}/"
+            f"{latency['find_match_to_game_start'].get('p99_ms', 0):.1f} ms, "
+            f"game_end p50/p99 {latency['submit_answer_to_game_end'].get('p50_ms', 0):.1f}/"
+            f"{latency['submit_answer_to_game_end'].get('p99_ms', 0):.1f} ms, "
+            f"server {result['server']}"
+        )
+        results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    cli_args = build_parser().parse_args()
+    output = asyncio.run(main(cli_args))
+    if cli_args.output:
+        with open(cli_args.output, "w") as f:
+            json.dump(output, f, indent=2)
+    else:
+        print(json.dumps(output, indent=2))
@@ -0,0 +1,307 @@
+"""The live puzzle catalog, backed by a ``PuzzleStore``.
+
+Only the version pointers (category -> version and count) are always in
+memory. Per-category puzzle arrays are loaded on demand into a bounded LRU
+cache. Each cache entry is a ``(version, puzzles)`` pair that is replaced
+whole and never mutated, so readers holding an array keep a consistent
+one while a new version swaps in. Concurrent misses on one category share
+a single load.
+
+Pointers are re-read every ``poll_interval`` seconds. New content therefore
+reaches every worker and the coordinator without a restart, and games that
+are running keep the puzzle they started with.
+
+An import streams NDJSON lines into a fresh version of each category, in
+``insert_many`` batches, and publishes the versions only once the whole
+stream has been validated and written. A failed import deletes what it
+wrote, so players never see partial content. The previous version is kept
+one round longer for workers that have not polled yet.
+"""
+import asyncio
+import json
+import logging
+import random
+import re
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from metrics import REGISTRY
+from storage import DuplicatePuzzleError, PuzzleStore
+
+logger = logging.getLogger(__name__)
+
+CATEGORY_PATTERN = re.compile(r"^\w{1,64}$")
+IMPORT_MODES = ("replace", "append")
+MAX_LINE_BYTES = 64 * 1024
+
+CACHE_LOOKUPS = REGISTRY.counter(
+    "mindmaze_puzzle_cache_lookups_total", "Category lookups in the puzzle cache.", ("result",)
+)
+
+
+class CatalogImportError(ValueError):
+    """Raised for a malformed import; nothing from it has been published"""
+
+
+class PuzzleCatalog:
+    def __init__(self, store: PuzzleStore, seed: Mapping[str, Sequence[Mapping]], cache_size: int = 50000,
+                 poll_interval: float = 5.0, batch_size: int = 500):
+        self.store = store
+        self.seed = seed
+        self.cache_size = cache_size  # Puzzles, not categories
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.versions: Dict[str, Dict] = {}
+        self.loaded = False
+        self.cache: "OrderedDict[str, Tuple[int, List[Dict]]]" = OrderedDict()
+        self.cached_puzzles = 0
+        self.loading: Dict[Tuple[str, int], asyncio.Future] = {}
+        self.listeners: List[Callable[[List[str]], Awaitable[None]]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def __contains__(self, category: str) -> bool:
+        return category in self.versions
+
+    def counts(self) -> Dict[str, int]:
+        return {category: pointer["count"] for category, pointer in self.versions.items()}
+
+    def total_puzzles(self) -> int:
+        return sum(pointer["count"] for pointer in self.versions.values())
+
+    def on_change(self, listener: Callable[[List[str]], Awaitable[None]]) -> None:
+        """Call ``listener(categories)`` after pointers for those categories changed"""
+        self.listeners.append(listener)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def load(self) -> None:
+        """Seed any category missing from the store, then read the pointers"""
+        versions = await self.store.get_versions()
+        for category, puzzles in self.seed.items():
+            if category in versions:
+                continue
+            try:
+                await self.store.insert_puzzles([
+                    {"category": category, "version": 1, "position": position,
+                     "question": puzzle["question"], "answer": puzzle["answer"]}
+                    for position, puzzle in enumerate(puzzles)
+                ])
+            except DuplicatePuzzleError:
+                pass  # Another process is seeding the same category
+            await self.store.publish_version(category, 1, len(puzzles))
+        await self.refresh()
+        self.loaded = True
+
+    async def refresh(self) -> List[str]:
+        """Re-read the version pointers; returns the categories that changed"""
+        versions = await self.store.get_versions()
+        changed = [
+            category for category in versions.keys() | self.versions.keys()
+            if versions.get(category) != self.versions.get(category)
+        ]
+        if changed:
+            self.versions = versions
+            for category in changed:
+                self._evict(category)
+            for listener in self.listeners:
+                try:
+                    await listener(changed)
+                except Exception as e:
+                    logger.error("Catalog change listener failed: %s", e)
+        return changed
+
+    async def _run(self):
+        delay = 0.5
+        while not self.loaded:
+            try:
+                await self.load()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Puzzle catalog load failed: %s; retrying in %.1fs", e, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                changed = await self.refresh()
+                if changed:
+                    logger.info("Puzzle catalog updated: %s", ", ".join(sorted(changed)))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Puzzle catalog refresh failed: %s", e)
+
+    def cached(self, category: str) -> Optional[List[Dict]]:
+        """The live puzzles of ``category`` if they are cached, without loading"""
+        pointer = self.versions.get(category)
+        entry = self.cache.get(category)
+        if pointer is None or entry is None or entry[0] != pointer["version"]:
+            return None
+        self.cache.move_to_end(category)
+        return entry[1]
+
+    async def get(self, category: str) -> List[Dict]:
+        """The live puzzles of ``category``; raises KeyError for an unknown category"""
+        puzzles = self.cached(category)
+        if puzzles is not None:
+            CACHE_LOOKUPS.labels("hit").inc()
+            return puzzles
+        CACHE_LOOKUPS.labels("miss").inc()
+        version = self.versions[category]["version"]
+        key = (category, version)
+        future = self.loading.get(key)
+        if future is None:
+            future = self.loading[key] = asyncio.ensure_future(self._load_category(category, version))
+            future.add_done_callback(lambda _: self.loading.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def get_positions(self, category: str, version: int, positions: Sequence[int]) -> Dict[int, Dict]:
+        """Puzzles at ``positions`` of one version, by position
+
+        Served from the cache when it holds that version, otherwise read from
+        the store without loading the whole category into the cache.
+        """
+        entry = self.cache.get(category)
+        if entry is not None and entry[0] == version:
+            CACHE_LOOKUPS.labels("hit").inc()
+            puzzles = entry[1]
+            return {position: puzzles[position] for position in positions if position < len(puzzles)}
+        return await self.store.load_positions(category, version, positions)
+
+    async def _load_category(self, category: str, version: int) -> List[Dict]:
+        puzzles = await self.store.load_category(category, version)
+        pointer = self.versions.get(category)
+        if pointer is not None and pointer["version"] == version:
+            self._evict(category)
+            self.cache[category] = (version, puzzles)
+            self.cached_puzzles += len(puzzles)
+            while self.cached_puzzles > self.cache_size and len(self.cache) > 1:
+                self._evict(next(iter(self.cache)))
+        return puzzles
+
+    def _evict(self, category: str) -> None:
+        entry = self.cache.pop(category, None)
+        if entry is not None:
+            self.cached_puzzles -= len(entry[1])
+
+    def pick(self, category: str) -> Optional[Tuple[str, Dict]]:
+        """A random cached puzzle and its id, or None if the category is not cached"""
+        puzzles = self.cached(category)
+        if not puzzles:
+            return None
+        index = random.randrange(len(puzzles))
+        return f"{category}:{self.versions[category]['version']}:{index}", puzzles[index]
+
+    async def random_puzzle(self, category: str) -> Tuple[str, Dict]:
+        puzzles = await self.get(category)
+        if not puzzles:
+            raise LookupError(f"Category {category} has no puzzles")
+        index = random.randrange(len(puzzles))
+        return f"{category}:{self.versions[category]['version']}:{index}", puzzles[index]
+
+    async def import_lines(self, lines: AsyncIterator[bytes], mode: str = "replace") -> Dict[str, Dict]:
+        """Write NDJSON puzzles to new versions and publish them; returns category -> pointer"""
+        if mode not in IMPORT_MODES:
+            raise CatalogImportError(f"mode must be one of {', '.join(IMPORT_MODES)}")
+        started: Dict[str, Dict] = {}  # category -> {"version", "count"} being written
+        batch: List[Dict] = []
+        line_number = 0
+        try:
+            async for line in lines:
+                line_number += 1
+                if not line.strip():
+                    continue
+                category, question, answer = self._parse_line(line, line_number)
+                target = started.get(category)
+                if target is None:
+                    target = started[category] = self._new_version(category)
+                    if mode == "append":
+                        await self._copy_live(category, target)
+                batch.append({
+                    "category": category, "version": target["version"], "position": target["count"],
+                    "question": question, "answer": answer
+                })
+                target["count"] += 1
+                if len(batch) >= self.batch_size:
+                    await self.store.insert_puzzles(batch)
+                    batch = []
+            if batch:
+                await self.store.insert_puzzles(batch)
+            if not started:
+                raise CatalogImportError("No puzzles in the request body")
+        except BaseException:
+            for category, target in started.items():
+                await self.store.delete_versions(category, version=target["version"])
+            raise
+
+        for category, target in started.items():
+            previous = self.versions.get(category)
+            if await self.store.publish_version(category, target["version"], target["count"]):
+                if previous is not None:
+                    await self.store.delete_versions(category, before=previous["version"])
+            else:
+                # A newer import won the race; this one is superseded
+                await self.store.delete_versions(category, version=target["version"])
+        await self.refresh()
+        return {category: dict(target) for category, target in started.items()}
+
+    def _parse_line(self, line: bytes, line_number: int) -> Tuple[str, str, str]:
+        if len(line) > MAX_LINE_BYTES:
+            raise CatalogImportError(f"Line {line_number}: longer than {MAX_LINE_BYTES} bytes")
+        try:
+            row = json.loads(line)
+        except ValueError:
+            raise CatalogImportError(f"Line {line_number}: invalid JSON")
+        if not isinstance(row, dict):
+            raise CatalogImportError(f"Line {line_number}: expected an object")
+        values = [row.get(field) for field in ("category", "question", "answer")]
+        if not all(isinstance(value, str) and value.strip() for value in values):
+            raise CatalogImportError(f"Line {line_number}: category, question and answer must be non-empty strings")
+        category, question, answer = (value.strip() for value in values)
+        if not CATEGORY_PATTERN.match(category):
+            raise CatalogImportError(f"Line {line_number}: invalid category name")
+        return category, question, answer
+
+    def _new_version(self, category: str) -> Dict:
+        current = self.versions.get(category)
+        version = int(time.time() * 1000)
+        if current is not None:
+            version = max(version, current["version"] + 1)
+        return {"version": version, "count": 0}
+
+    async def _copy_live(self, category: str, target: Dict) -> None:
+        """Start an appending version with the live puzzles of ``category``"""
+        current = self.versions.get(category)
+        if current is None:
+            return
+        existing = await self.store.load_category(category, current["version"])
+        for start in range(0, len(existing), self.batch_size):
+            await self.store.insert_puzzles([
+                {"category": category, "version": target["version"], "position": start + offset,
+                 "question": puzzle["question"], "answer": puzzle["answer"]}
+                for offset, puzzle in enumerate(existing[start:start + self.batch_size])
+            ])
+        target["count"] = len(existing)
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_line: int = MAX_LINE_BYTES) -> AsyncIterator[bytes]:
+    """Split a byte stream into lines without buffering more than one line"""
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+        if len(pending) > max_line:
+            raise CatalogImportError(f"A line is longer than {max_line} bytes")
+    if pending:
+        yield pending
@@ -0,0 +1,312 @@
+"""Cluster mode: N uvicorn workers terminate WebSockets, one coordinator
+process owns the matchmaking queues and the game registry.
+
+Workers forward every inbound game frame to the coordinator over a local
+Unix socket; the coordinator runs the regular handlers from ``main`` against
+``RemotePlayer`` proxies, whose ``send_text`` routes the outbound frame back
+to whichever worker holds that player's socket. ``game_start``, ``game_end``
+and ``opponent_disconnected`` therefore reach players on any worker.
+
+Framing is a 5-byte header (``!IB``: payload length, frame kind) followed by
+the payload. Player frames carry ``username\\0text`` so the WebSocket text is
+relayed as-is without being decoded or re-encoded on the worker.
+
+Usage (from mindmaze-backend/):
+
+    python cluster.py --workers 4 --port 8000
+
+It takes every server option of ``launcher.py``, which also starts the
+coordinator on its own whenever it runs more than one worker.
+
+With ``STORAGE_BACKEND=memory`` every process has its own store, so scores
+credited by the coordinator are not visible to the workers' HTTP routes.
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import struct
+import sys
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct("!IB")
+
+# Worker -> coordinator
+HELLO = 1
+CONNECT = 2
+DISCONNECT = 3
+MESSAGE = 4
+# Coordinator -> worker
+SEND = 5
+STATS = 6
+
+STATS_INTERVAL = 1.0
+
+
+def encode_frame(kind: int, payload: bytes) -> bytes:
+    return HEADER.pack(len(payload), kind) + payload
+
+
+def encode_player_frame(kind: int, username: str, text: str) -> bytes:
+    return encode_frame(kind, username.encode() + b"\0" + text.encode())
+
+
+def decode_player_payload(payload: bytes):
+    username, _, text = payload.partition(b"\0")
+    return username.decode(), text.decode()
+
+
+async def read_frame(reader: asyncio.StreamReader):
+    length, kind = HEADER.unpack(await reader.readexactly(HEADER.size))
+    return kind, await reader.readexactly(length)
+
+
+class RemotePlayer:
+    """Coordinator-side stand-in for a WebSocket held by a worker.
+
+    Each player's frames are handled in order by its own task, like the
+    per-connection receive loop in single-process mode, so a slow handler
+    (e.g. a score update) never holds up other players on the same worker.
+    """
+
+    __slots__ = ("username", "worker", "inbox", "task")
+
+    def __init__(self, username: str, worker: "WorkerConnection", main):
+        self.username = username
+        self.worker = worker
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._run(main))
+
+    async def send_text(self, data: str):
+        await self.worker.send(encode_player_frame(SEND, self.username, data))
+
+    async def _run(self, main):
+        while True:
+            text = await self.inbox.get()
+            if text is None:
+                break
+            await main.handle_ws_text(self.username, self, text)
+        # Disconnected; only clean up if a newer connection has not replaced us
+        if main.connected_players.get(self.username) is self:
+            await main.cleanup_player(self.username)
+
+    def close(self):
+        self.inbox.put_nowait(None)
+
+
+class WorkerConnection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.worker_id = "?"
+
+    async def send(self, frame: bytes):
+        self.writer.write(frame)
+        await self.writer.drain()
+
+
+class Coordinator:
+    def __init__(self, socket_path: str):
+        import main  # Imported here so workers do not import themselves twice
+
+        self.main = main
+        self.socket_path = socket_path
+        self.workers: Dict[WorkerConnection, None] = {}
+
+    async def serve(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.main.loop_monitor.start()
+        self.main.start_game_services()
+        # Matchmaking checks categories against the catalog, so load it before taking players
+        await self.main.retry_with_backoff("puzzle_catalog", self.main.readiness, self.main.puzzle_catalog.load)
+        self.main.puzzle_catalog.start()
+        server = await asyncio.start_unix_server(self.handle_worker, path=self.socket_path)
+        logger.info("✅ Coordinator listening on %s", self.socket_path)
+        stats_task = asyncio.create_task(self.publish_stats())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            stats_task.cancel()
+
+    async def handle_worker(self, reader, writer):
+        worker = WorkerConnection(reader, writer)
+        self.workers[worker] = None
+        main = self.main
+        connected_players = main.connected_players
+        try:
+            while True:
+                kind, payload = await read_frame(reader)
+                if kind == MESSAGE:
+                    username, text = decode_player_payload(payload)
+                    player = connected_players.get(username)
+                    if isinstance(player, RemotePlayer) and player.worker is worker:
+                        player.inbox.put_nowait(text)
+                elif kind == CONNECT:
+                    username = payload.decode()
+                    previous = connected_players.get(username)
+                    if isinstance(previous, RemotePlayer):
+                        previous.close()
+                    connected_players[username] = RemotePlayer(username, worker, main)
+                elif kind == DISCONNECT:
+                    username = payload.decode()
+                    player = connected_players.get(username)
+                    if isinstance(player, RemotePlayer) and player.worker is worker:
+                        player.close()
+                elif kind == HELLO:
+                    worker.worker_id = json.loads(payload)["worker_id"]
+                    logger.info("Worker %s joined", worker.worker_id)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            logger.warning("Worker %s disconnected", worker.worker_id)
+        finally:
+            del self.workers[worker]
+            for player in list(connected_players.values()):
+                if isinstance(player, RemotePlayer) and player.worker is worker:
+                    player.close()
+            writer.close()
+
+    async def publish_stats(self):
+        main = self.main
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            frame = encode_frame(STATS, json.dumps({
+                "active_games": len(main.active_games),
+                "waiting_players": len(main.waiting_players),
+                "connected_players": len(main.connected_players),
+            }).encode())
+            for worker in list(self.workers):
+                try:
+                    await worker.send(frame)
+                except ConnectionError:
+                    pass
+
+
+class ClusterClient:
+    """Worker-side connection to the coordinator
+
+    Frames for a player are delivered in order by a task of their own, which
+    ends once that player's outbox is empty, so one slow socket never holds
+    up the others. ``deliver`` raises ConnectionError for a player whose
+    socket has gone. ``on_lost`` is called once if the coordinator connection
+    drops.
+    """
+
+    def __init__(self, socket_path: str, deliver: Callable[[str, str], Awaitable[None]],
+                 on_lost: Optional[Callable[[], None]] = None):
+        self.socket_path = socket_path
+        self.deliver = deliver
+        self.on_lost = on_lost
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.stats: Dict[str, int] = {"active_games": 0, "waiting_players": 0, "connected_players": 0}
+        self.outboxes: Dict[str, Deque[str]] = {}
+        self._delivery_tasks: Set[asyncio.Task] = set()
+        self._reader_task: Optional[asyncio.Task] = None
+
+    @property
+    def connected(self) -> bool:
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def connect(self):
+        reader, self.writer = await asyncio.open_unix_connection(self.socket_path)
+        await self._send(encode_frame(HELLO, json.dumps({"worker_id": os.getpid()}).encode()))
+        self._reader_task = asyncio.create_task(self._read_loop(reader))
+
+    async def _read_loop(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                kind, payload = await read_frame(reader)
+                if kind == SEND:
+                    self._enqueue(*decode_player_payload(payload))
+                elif kind == STATS:
+                    self.stats = json.loads(payload)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            logger.error("❌ Lost connection to coordinator")
+            self.writer = None
+            if self.on_lost is not None:
+                self.on_lost()
+
+    def _enqueue(self, username: str, text: str):
+        outbox = self.outboxes.get(username)
+        if outbox is None:
+            outbox = self.outboxes[username] = deque()
+            task = asyncio.create_task(self._deliver_outbox(username, outbox))
+            self._delivery_tasks.add(task)
+            task.add_done_callback(self._delivery_tasks.discard)
+        outbox.append(text)
+
+    async def _deliver_outbox(self, username: str, outbox: Deque[str]):
+        try:
+            while outbox:
+                text = outbox.popleft()
+                try:
+                    await self.deliver(username, text)
+                except ConnectionError as e:
+                    logger.debug("Dropping frames for disconnected %s: %s", username, e)
+                    outbox.clear()
+                except Exception as e:
+                    logger.error("Error delivering to %s: %s", username, e)
+        finally:
+            del self.outboxes[username]
+
+    async def _send(self, frame: bytes):
+        if not self.connected:
+            raise ConnectionError("Not connected to coordinator")
+        self.writer.write(frame)
+        await self.writer.drain()
+
+    async def connect_player(self, username: str):
+        await self._send(encode_frame(CONNECT, username.encode()))
+
+    async def disconnect_player(self, username: str):
+        await self._send(encode_frame(DISCONNECT, username.encode()))
+
+    async def forward(self, username: str, text: str):
+        await self._send(encode_player_frame(MESSAGE, username, text))
+
+    def close(self):
+        self.on_lost = None  # Closing on purpose
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        for task in list(self._delivery_tasks):
+            task.cancel()
+        if self.writer is not None:
+            self.writer.close()
+
+
+def run_coordinator(socket_path: str):
+    from log_pipeline import setup_logging
+
+    setup_logging()
+    asyncio.run(Coordinator(socket_path).serve())
+
+
+def wait_for_socket(path: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path):
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Coordinator did not create {path}")
+        time.sleep(0.05)
+
+
+def start_coordinator(socket_path: str) -> multiprocessing.Process:
+    """Start the coordinator process and wait until it accepts workers"""
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    coordinator = multiprocessing.Process(target=run_coordinator, args=(socket_path,), name="mindmaze-coordinator")
+    coordinator.start()
+    wait_for_socket(socket_path)
+    os.environ["MINDMAZE_COORDINATOR"] = socket_path
+    return coordinator
+
+
+if __name__ == "__main__":
+    from launcher import main as launch
+
+    # Same server options as launcher.py; the coordinator always runs
+    launch(["--cluster", *sys.argv[1:]])
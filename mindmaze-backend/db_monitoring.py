@@ -0,0 +1,161 @@
+"""MongoDB connection pool configuration and driver-level monitoring.
+
+Pool size, timeouts and wire compression are read from the environment.
+The pymongo listeners below record per-command latency, connection checkout
+wait time and pool exhaustion so they can be inspected while the server runs.
+"""
+import os
+import time
+from typing import Dict
+
+from pymongo import monitoring
+
+from metrics import REGISTRY
+
+# Environment variable -> (MongoClient keyword, parser)
+POOL_SETTINGS = {
+    "MONGODB_MAX_POOL_SIZE": ("maxPoolSize", int),
+    "MONGODB_MIN_POOL_SIZE": ("minPoolSize", int),
+    "MONGODB_MAX_CONNECTING": ("maxConnecting", int),
+    "MONGODB_MAX_IDLE_TIME_MS": ("maxIdleTimeMS", int),
+    "MONGODB_WAIT_QUEUE_TIMEOUT_MS": ("waitQueueTimeoutMS", int),
+    "MONGODB_CONNECT_TIMEOUT_MS": ("connectTimeoutMS", int),
+    "MONGODB_SOCKET_TIMEOUT_MS": ("socketTimeoutMS", int),
+    "MONGODB_SERVER_SELECTION_TIMEOUT_MS": ("serverSelectionTimeoutMS", int),
+    "MONGODB_COMPRESSORS": ("compressors", str),
+    "MONGODB_ZLIB_LEVEL": ("zlibCompressionLevel", int),
+}
+
+
+def mongo_client_options() -> Dict:
+    """Build AsyncIOMotorClient keyword arguments from the environment.
+
+    Unset variables are left out so the driver default applies.
+    """
+    options = {}
+    for env_name, (option, parse) in POOL_SETTINGS.items():
+        raw = os.getenv(env_name)
+        if raw is None or raw == "":
+            continue
+        try:
+            options[option] = parse(raw)
+        except ValueError:
+            raise ValueError(f"{env_name} must be an integer, got {raw!r}")
+    return options
+
+
+DB_COMMAND_LATENCY = REGISTRY.histogram(
+    "mindmaze_db_command_duration_seconds", "MongoDB command latency by command name.", ("command",)
+)
+DB_COMMAND_FAILURES = REGISTRY.counter(
+    "mindmaze_db_command_failures_total", "Failed MongoDB commands by command name.", ("command",)
+)
+DB_CHECKOUT_WAIT = REGISTRY.histogram(
+    "mindmaze_db_pool_checkout_wait_seconds", "Time spent waiting to check out a pooled connection."
+)
+DB_POOL_EXHAUSTED = REGISTRY.counter(
+    "mindmaze_db_pool_exhausted_total", "Connection checkouts that timed out on a full pool."
+)
+
+
+class CommandLatencyListener(monitoring.CommandListener):
+    """Records a latency histogram and failure count per command name"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        DB_COMMAND_LATENCY.labels(event.command_name).observe(event.duration_micros / 1_000_000)
+
+    def failed(self, event):
+        DB_COMMAND_LATENCY.labels(event.command_name).observe(event.duration_micros / 1_000_000)
+        DB_COMMAND_FAILURES.labels(event.command_name).inc()
+
+    def snapshot(self) -> Dict:
+        snapshot = {}
+        for (name,), histogram in list(DB_COMMAND_LATENCY.children.items()):
+            failures = DB_COMMAND_FAILURES.children.get((name,))
+            snapshot[name] = {**histogram.snapshot(), "failures": failures.value if failures else 0}
+        return snapshot
+
+
+class PoolListener(monitoring.ConnectionPoolListener):
+    """Tracks checkout wait time, connections in use and pool exhaustion"""
+
+    def __init__(self):
+        self.checkout_wait = DB_CHECKOUT_WAIT.labels()
+        self.exhausted = DB_POOL_EXHAUSTED.labels()
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.open_connections = 0
+        self.checkout_failures: Dict[str, int] = {}
+        self.clear_count = 0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self.clear_count += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self.open_connections += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self.open_connections -= 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self.checkout_wait.observe(event.duration)
+        self.checkout_failures[event.reason] = self.checkout_failures.get(event.reason, 0) + 1
+        if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+            self.exhausted.inc()
+
+    def connection_checked_out(self, event):
+        self.checkout_wait.observe(event.duration)
+        self.checked_out += 1
+        if self.checked_out > self.max_checked_out:
+            self.max_checked_out = self.checked_out
+
+    def connection_checked_in(self, event):
+        self.checked_out -= 1
+
+    def snapshot(self) -> Dict:
+        return {
+            "checkout_wait_seconds": self.checkout_wait.snapshot(),
+            "checked_out": self.checked_out,
+            "max_checked_out": self.max_checked_out,
+            "open_connections": self.open_connections,
+            "pool_exhausted": self.exhausted.value,
+            "checkout_failures": dict(self.checkout_failures),
+            "pool_cleared": self.clear_count,
+        }
+
+
+command_listener = CommandLatencyListener()
+pool_listener = PoolListener()
+
+REGISTRY.gauge("mindmaze_db_pool_checked_out", "Pooled connections currently checked out.",
+               lambda: pool_listener.checked_out)
+REGISTRY.gauge("mindmaze_db_pool_open_connections", "Open pooled connections.",
+               lambda: pool_listener.open_connections)
+
+
+def monitoring_snapshot(options: Dict) -> Dict:
+    """Current pool configuration plus everything the listeners recorded"""
+    return {
+        "config": options,
+        "pool": pool_listener.snapshot(),
+        "commands": command_listener.snapshot(),
+        "timestamp": time.time(),
+    }
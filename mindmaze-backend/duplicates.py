@@ -0,0 +1,289 @@
+"""Offline near-duplicate detection for the puzzle bank.
+
+Puzzles count as duplicates when their answers normalize to the same text
+and their question shingle sets have a Jaccard similarity of at least
+``--threshold``. Puzzles are first grouped by answer, so a candidate is
+only ever compared within its own group and groups of one cost nothing.
+Each remaining group is handled by a worker process:
+
+* questions become sets of word shingles; filler words and punctuation are
+  dropped, math operators are kept;
+* a MinHash signature of ``bands * rows`` values is computed per question.
+  Each distinct shingle is hashed under every permutation once per worker,
+  so a signature is an element-wise ``min`` over cached vectors;
+* LSH banding buckets questions that agree on every row of a band. Within a
+  bucket, each question is verified against a few representatives with the
+  exact Jaccard similarity, and matches are merged with union-find.
+
+Usage (from mindmaze-backend/):
+
+    python duplicates.py --category riddles
+    python duplicates.py --pack puzzles.ndjson --threshold 0.6 --format json
+
+Without ``--pack`` it scans the live catalog: the published version of each
+category, read from the store configured like the server (``STORAGE_BACKEND``
+and ``MONGODB_URL``), and the seed for any category not stored yet. A pack
+is NDJSON with one ``{"category", "question", "answer"}`` object per line,
+or the JSON returned by ``GET /api/puzzles``.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import re
+import sys
+import time
+import zlib
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+SHINGLE_PATTERN = re.compile(r"\w+|[+\-*/×÷=%^<>]")
+FILLER_WORDS = frozenset(
+    "a an the is are am was were be i im you it its what which who whom this that of to in on at by for "
+    "and or do does did my your me".split()
+)
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_REPRESENTATIVES = 8
+
+Puzzle = Tuple[str, int, str, str]  # (category, position, question, answer)
+
+
+def normalize_answer(answer: str) -> str:
+    return " ".join(SHINGLE_PATTERN.findall(answer.casefold()))
+
+
+def shingles(question: str, size: int = 1) -> frozenset:
+    words = [word for word in SHINGLE_PATTERN.findall(question.casefold()) if word not in FILLER_WORDS]
+    if size <= 1 or len(words) <= size:
+        return frozenset([" ".join(words)] if size > 1 else words)
+    return frozenset(" ".join(words[i:i + size]) for i in range(len(words) - size + 1))
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    def __init__(self, permutations: int, seed: int = 1):
+        rng = random.Random(seed)
+        self.coefficients = [
+            (rng.randrange(1, MERSENNE_PRIME), rng.randrange(MERSENNE_PRIME)) for _ in range(permutations)
+        ]
+        self.empty = (MERSENNE_PRIME,) * permutations
+        self.vectors: Dict[str, Tuple[int, ...]] = {}
+
+    def vector(self, shingle: str) -> Tuple[int, ...]:
+        vector = self.vectors.get(shingle)
+        if vector is None:
+            x = zlib.crc32(shingle.encode())
+            vector = self.vectors[shingle] = tuple((a * x + b) % MERSENNE_PRIME for a, b in self.coefficients)
+        return vector
+
+    def signature(self, shingle_set: Iterable[str]) -> Tuple[int, ...]:
+        vectors = [self.vector(shingle) for shingle in shingle_set]
+        if not vectors:
+            return self.empty
+        if len(vectors) == 1:
+            return vectors[0]
+        return tuple(map(min, *vectors))
+
+
+class UnionFind:
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a: int, b: int) -> None:
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            self.parent[max(a, b)] = min(a, b)
+
+
+_hasher: Optional[MinHasher] = None
+
+
+def _init_worker(permutations: int, seed: int) -> None:
+    global _hasher
+    _hasher = MinHasher(permutations, seed)
+
+
+def cluster_group(task: Tuple[Sequence[Tuple[int, str]], int, int, int, float]) -> List[List[int]]:
+    """Near-duplicate clusters among questions that share an answer, as lists of ids"""
+    members, bands, rows, shingle_size, threshold = task
+    sets = [shingles(question, shingle_size) for _, question in members]
+    union_find = UnionFind(len(members))
+
+    # Identical shingle sets are duplicates outright; only one of each goes through LSH
+    first_seen: Dict[frozenset, int] = {}
+    distinct = []
+    for i, shingle_set in enumerate(sets):
+        if shingle_set in first_seen:
+            union_find.union(first_seen[shingle_set], i)
+        else:
+            first_seen[shingle_set] = i
+            distinct.append(i)
+
+    if len(distinct) > 1:
+        signatures = {i: _hasher.signature(sets[i]) for i in distinct}
+        for band in range(bands):
+            start = band * rows
+            buckets: Dict[Tuple[int, ...], List[int]] = {}
+            for i in distinct:
+                buckets.setdefault(signatures[i][start:start + rows], []).append(i)
+            for bucket in buckets.values():
+                if len(bucket) < 2:
+                    continue
+                representatives = [bucket[0]]
+                for i in bucket[1:]:
+                    for representative in representatives:
+                        if union_find.find(i) == union_find.find(representative):
+                            break
+                        if jaccard(sets[i], sets[representative]) >= threshold:
+                            union_find.union(i, representative)
+                            break
+                    else:
+                        if len(representatives) < MAX_REPRESENTATIVES:
+                            representatives.append(i)
+
+    clusters: Dict[int, List[int]] = {}
+    for i, (puzzle_id, _) in enumerate(members):
+        clusters.setdefault(union_find.find(i), []).append(puzzle_id)
+    return [cluster for cluster in clusters.values() if len(cluster) > 1]
+
+
+def find_duplicates(puzzles: Sequence[Puzzle], threshold: float = 0.5, bands: int = 20, rows: int = 3,
+                    shingle_size: int = 1, workers: Optional[int] = None, seed: int = 1,
+                    batch_size: int = 5000) -> List[List[int]]:
+    """Clusters of near-duplicate puzzles as lists of indexes into ``puzzles``, largest first"""
+    groups: Dict[str, List[Tuple[int, str]]] = {}
+    for puzzle_id, (_, _, question, answer) in enumerate(puzzles):
+        groups.setdefault(normalize_answer(answer), []).append((puzzle_id, question))
+
+    # Pack small groups into batches so each task is worth sending to a worker
+    tasks = []
+    batch: List[List[Tuple[int, str]]] = []
+    batched = 0
+    for members in sorted((g for g in groups.values() if len(g) > 1), key=len, reverse=True):
+        batch.append(members)
+        batched += len(members)
+        if batched >= batch_size:
+            tasks.append(batch)
+            batch, batched = [], 0
+    if batch:
+        tasks.append(batch)
+
+    workers = workers or os.cpu_count() or 1
+    clusters: List[List[int]] = []
+    jobs = ([(members, bands, rows, shingle_size, threshold) for members in batch] for batch in tasks)
+    if workers == 1:
+        _init_worker(bands * rows, seed)
+        for job in jobs:
+            clusters.extend(_cluster_batch(job))
+    else:
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(bands * rows, seed)) as pool:
+            for found in pool.imap_unordered(_cluster_batch, jobs):
+                clusters.extend(found)
+    clusters.sort(key=lambda cluster: (-len(cluster), min(cluster)))
+    return [sorted(cluster) for cluster in clusters]
+
+
+def _cluster_batch(batch) -> List[List[int]]:
+    return [cluster for task in batch for cluster in cluster_group(task)]
+
+
+def catalog_puzzles(catalog: Mapping[str, Sequence[Mapping]]) -> List[Puzzle]:
+    return [
+        (category, position, puzzle["question"], puzzle["answer"])
+        for category, puzzles in catalog.items()
+        for position, puzzle in enumerate(puzzles)
+    ]
+
+
+async def load_live_catalog(store, seed: Mapping[str, Sequence[Mapping]]) -> Dict[str, List[Dict]]:
+    """The published puzzles of every category, as the server would serve them"""
+    versions = await store.get_versions()
+    catalog = {category: list(puzzles) for category, puzzles in seed.items() if category not in versions}
+    for category, pointer in versions.items():
+        catalog[category] = await store.load_category(category, pointer["version"])
+    return catalog
+
+
+def load_pack(path: str) -> List[Puzzle]:
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".ndjson") or path.endswith(".jsonl"):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = json.load(f)["puzzles"]
+    positions: Dict[str, int] = {}
+    puzzles = []
+    for row in rows:
+        position = positions.get(row["category"], 0)
+        positions[row["category"]] = position + 1
+        puzzles.append((row["category"], position, row["question"], row["answer"]))
+    return puzzles
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Report clusters of near-duplicate puzzles")
+    parser.add_argument("--pack", help="NDJSON or /api/puzzles JSON export; defaults to the live catalog in the store")
+    parser.add_argument("--category", help="Only scan this category")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Minimum Jaccard similarity of questions")
+    parser.add_argument("--bands", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=3)
+    parser.add_argument("--shingle-size", type=int, default=1, help="Words per shingle")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--format", choices=("text", "json"), default="text")
+    return parser
+
+
+def main_cli():
+    args = build_parser().parse_args()
+    if args.pack:
+        puzzles = load_pack(args.pack)
+    else:
+        os.environ.setdefault("LOG_LEVEL", "WARNING")
+        from main import CATEGORY_PUZZLES, puzzle_store
+        try:
+            puzzles = catalog_puzzles(asyncio.run(load_live_catalog(puzzle_store, CATEGORY_PUZZLES)))
+        except Exception as e:
+            raise SystemExit(f"Could not read the catalog from the store ({e}); pass --pack to scan an export")
+    if args.category:
+        puzzles = [puzzle for puzzle in puzzles if puzzle[0] == args.category]
+
+    started = time.perf_counter()
+    clusters = find_duplicates(
+        puzzles, threshold=args.threshold, bands=args.bands, rows=args.rows,
+        shingle_size=args.shingle_size, workers=args.workers
+    )
+    elapsed = time.perf_counter() - started
+
+    for cluster in clusters:
+        entries = [
+            {"category": category, "index": position, "question": question}
+            for category, position, question, _ in (puzzles[i] for i in cluster)
+        ]
+        answer = puzzles[cluster[0]][3]
+        if args.format == "json":
+            print(json.dumps({"answer": answer, "puzzles": entries}, ensure_ascii=False))
+        else:
+            print(f"answer: {answer} ({len(entries)} puzzles)")
+            for entry in entries:
+                print(f"  [{entry['category']} #{entry['index']}] {entry['question']}")
+    duplicates = sum(len(cluster) - 1 for cluster in clusters)
+    print(
+        f"{len(clusters)} clusters, {duplicates} redundant puzzles out of {len(puzzles)} ({elapsed:.1f} s)",
+        file=sys.stderr
+    )
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,40 @@
+"""Single-pass JSON encoding for MongoDB documents.
+
+``MongoJSONResponse`` serializes route results straight to bytes with a
+``default`` hook for BSON types, so documents are walked once by the C JSON
+encoder instead of being copied by a Python serializer and then again by
+FastAPI's ``jsonable_encoder``.
+"""
+import json
+from datetime import date, datetime
+from typing import Any
+
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from fastapi.responses import Response
+
+
+def bson_default(value: Any):
+    """Encode the BSON types that the stdlib JSON encoder does not know"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal128):
+        # As a string so no precision is lost on the client
+        return str(value.to_decimal())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=bson_default)
+
+
+def encode_json(content: Any) -> bytes:
+    return _encoder.encode(content).encode("utf-8")
+
+
+class MongoJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return encode_json(content)
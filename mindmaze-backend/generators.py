@@ -0,0 +1,237 @@
+"""Procedurally generated math puzzles.
+
+Every template draws operands for a difficulty from 1 (easy) to 3 (hard),
+and computes the answer with ``Fraction``, never with floats. The answer is
+rendered as an integer, or as an exact terminating decimal ("118.8"), and
+operands are chosen so that the result always terminates. Answers are
+compared as text, so rendering is canonical: no trailing zeros and no
+exponent.
+
+``PuzzlePool`` keeps a queue of ready puzzles for each generated category.
+``take`` never generates; it only signals the background task when a queue
+runs low, so starting a game never waits on generation. When a queue is
+empty, the caller falls back to the hardcoded catalog.
+"""
+import asyncio
+import logging
+import random
+from collections import deque
+from fractions import Fraction
+from typing import Callable, Deque, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+GENERATED_PUZZLES = REGISTRY.counter(
+    "mindmaze_generated_puzzles_total", "Math puzzles generated, by template.", ("template",)
+)
+POOL_MISSES = REGISTRY.counter(
+    "mindmaze_puzzle_pool_misses_total", "Games that fell back to the hardcoded catalog.", ("category",)
+)
+
+SUPERSCRIPTS = str.maketrans("0123456789-", "⁰¹²³⁴⁵⁶⁷⁸⁹⁻")
+
+
+def format_number(value: Fraction) -> str:
+    """Exact decimal rendering; raises ValueError for a non-terminating value"""
+    value = Fraction(value)
+    if value.denominator == 1:
+        return str(value.numerator)
+    denominator, places = value.denominator, 0
+    for factor in (2, 5):
+        count = 0
+        while denominator % factor == 0:
+            denominator //= factor
+            count += 1
+        places = max(places, count)
+    if denominator != 1:
+        raise ValueError(f"{value} has no terminating decimal form")
+    scaled = abs(value.numerator) * 10 ** places // value.denominator
+    whole, fraction = divmod(scaled, 10 ** places)
+    sign = "-" if value < 0 else ""
+    return f"{sign}{whole}.{str(fraction).rjust(places, '0').rstrip('0')}"
+
+
+def format_polynomial(coefficients: Sequence[int]) -> str:
+    """[2, -5, 3] -> '2x² - 5x + 3'"""
+    degree = len(coefficients) - 1
+    parts: List[str] = []
+    for power, coefficient in zip(range(degree, -1, -1), coefficients):
+        if coefficient == 0:
+            continue
+        magnitude = abs(coefficient)
+        variable = "" if power == 0 else "x" if power == 1 else "x" + str(power).translate(SUPERSCRIPTS)
+        term = f"{'' if magnitude == 1 and variable else magnitude}{variable}"
+        if not parts:
+            parts.append(f"-{term}" if coefficient < 0 else term)
+        else:
+            parts.append(f"{'-' if coefficient < 0 else '+'} {term}")
+    return " ".join(parts) or "0"
+
+
+def power(base: int, exponent: int) -> str:
+    return f"{base}{str(exponent).translate(SUPERSCRIPTS)}"
+
+
+def arithmetic(rng: random.Random, difficulty: int) -> Tuple[str, Fraction]:
+    limit = (20, 100, 1000)[difficulty - 1]
+    factor_limit = (10, 15, 30)[difficulty - 1]
+    op = rng.choice("+-x÷")
+    if op == "+":
+        a, b = rng.randint(1, limit), rng.randint(1, limit)
+        expression, value = f"{a} + {b}", Fraction(a + b)
+    elif op == "-":
+        a, b = rng.randint(1, limit), rng.randint(1, limit)
+        if difficulty == 1:
+            a, b = max(a, b), min(a, b)
+        expression, value = f"{a} - {b}", Fraction(a - b)
+    elif op == "x":
+        a, b = rng.randint(2, factor_limit), rng.randint(2, factor_limit)
+        expression, value = f"{a} x {b}", Fraction(a * b)
+    else:
+        divisor, quotient = rng.randint(2, factor_limit), rng.randint(1, factor_limit)
+        expression, value = f"{divisor * quotient} ÷ {divisor}", Fraction(quotient)
+    if difficulty == 3:
+        # Precedence matters: "a + b x c"
+        c, d = rng.randint(2, 12), rng.randint(2, 12)
+        expression, value = f"{expression} + {c} x {d}", value + c * d
+    return f"What is {expression}?", value
+
+
+def percentage(rng: random.Random, difficulty: int) -> Tuple[str, Fraction]:
+    if difficulty == 1:
+        percent, amount = rng.choice((10, 20, 25, 50, 75)), rng.randint(1, 40) * 20
+    elif difficulty == 2:
+        percent, amount = rng.randint(1, 19) * 5, rng.randint(2, 60) * 10
+    else:
+        percent, amount = rng.randint(1, 150), rng.randint(20, 999)
+    return f"What is {percent}% of {amount}?", Fraction(percent * amount, 100)
+
+
+def powers(rng: random.Random, difficulty: int) -> Tuple[str, Fraction]:
+    if difficulty == 1:
+        base = rng.randint(2, 15)
+        return f"What is the square of {base}?", Fraction(base ** 2)
+    bases, exponents = ((2, 6), (2, 4)) if difficulty == 2 else ((2, 9), (2, 5))
+    a, b = rng.randint(*bases), rng.randint(*exponents)
+    c, d = rng.randint(*bases), rng.randint(*exponents)
+    if rng.random() < 0.5:
+        return f"What is the value of {power(a, b)} + {power(c, d)}?", Fraction(a ** b + c ** d)
+    if a ** b < c ** d:
+        a, b, c, d = c, d, a, b
+    return f"What is the value of {power(a, b)} - {power(c, d)}?", Fraction(a ** b - c ** d)
+
+
+def roots(rng: random.Random, difficulty: int) -> Tuple[str, Fraction]:
+    limit = (12, 30, 99)[difficulty - 1]
+    if difficulty > 1 and rng.random() < 0.5:
+        root = rng.randint(2, limit // 2)
+        return f"What is the cube root of {root ** 3}?", Fraction(root)
+    root = rng.randint(2, limit)
+    return f"What is the square root of {root ** 2}?", Fraction(root)
+
+
+def remainder(rng: random.Random, difficulty: int) -> Tuple[str, Fraction]:
+    divisor = rng.randint(3, (9, 19, 49)[difficulty - 1])
+    dividend = rng.randint(divisor + 1, (100, 500, 5000)[difficulty - 1])
+    return f"What is the remainder when {dividend} is divided by {divisor}?", Fraction(dividend % divisor)
+
+
+def quadratic(rng: random.Random, difficulty: int) -> Tuple[str, Fraction]:
+    span = (5, 9, 15)[difficulty - 1]
+    if rng.random() < 0.5:
+        # Evaluate at a point
+        a = 1 if difficulty == 1 else rng.randint(1, 4)
+        b, c = rng.randint(-span, span), rng.randint(-span, span)
+        x = rng.randint(1, span)
+        value = a * x * x + b * x + c
+        return f"If x = {x}, what is the value of {format_polynomial([a, b, c])}?", Fraction(value)
+    # Integer roots by construction: a(x - r1)(x - r2)
+    r1, r2 = rng.sample(range(-span, span + 1), 2)
+    a = 1 if difficulty < 3 else rng.randint(1, 3)
+    polynomial = format_polynomial([a, -a * (r1 + r2), a * r1 * r2])
+    return f"What is the larger root of {polynomial} = 0?", Fraction(max(r1, r2))
+
+
+TEMPLATES: Dict[str, Callable[[random.Random, int], Tuple[str, Fraction]]] = {
+    "arithmetic": arithmetic,
+    "percentage": percentage,
+    "power": powers,
+    "root": roots,
+    "remainder": remainder,
+    "quadratic": quadratic,
+}
+
+# Category -> (template, difficulty) choices
+MATH_RECIPES: Dict[str, Sequence[Tuple[str, int]]] = {
+    "very_basic_math": (("arithmetic", 1),),
+    "Oral_math": (
+        ("arithmetic", 3), ("percentage", 2), ("power", 2),
+        ("root", 2), ("remainder", 2), ("quadratic", 2),
+    ),
+}
+
+
+def generate(template: str, difficulty: int, rng: random.Random) -> Dict:
+    if not 1 <= difficulty <= 3:
+        raise ValueError("difficulty must be 1-3")
+    question, value = TEMPLATES[template](rng, difficulty)
+    GENERATED_PUZZLES.labels(template).inc()
+    return {"question": question, "answer": format_number(value), "template": template}
+
+
+class PuzzlePool:
+    def __init__(self, recipes: Mapping[str, Sequence[Tuple[str, int]]] = MATH_RECIPES, size: int = 200,
+                 seed: Optional[int] = None):
+        self.recipes = recipes
+        self.size = size
+        self.low_water = max(1, size // 2)
+        self.rng = random.Random(seed)
+        self.queues: Dict[str, Deque[Dict]] = {category: deque() for category in recipes}
+        self.wanted = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None and self.size > 0:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def depth(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    def take(self, category: str) -> Optional[Dict]:
+        """A ready puzzle for ``category``, or None if it is not generated or its queue is empty"""
+        queue = self.queues.get(category)
+        if queue is None:
+            return None
+        if len(queue) <= self.low_water:
+            self.wanted.set()
+        if not queue:
+            POOL_MISSES.labels(category).inc()
+            return None
+        return queue.popleft()
+
+    def fill(self, category: str, count: int) -> None:
+        queue = self.queues[category]
+        recipe = self.recipes[category]
+        for _ in range(count):
+            template, difficulty = self.rng.choice(recipe)
+            queue.append(generate(template, difficulty, self.rng))
+
+    async def _run(self):
+        while True:
+            self.wanted.clear()
+            for category, queue in self.queues.items():
+                while len(queue) < self.size:
+                    try:
+                        self.fill(category, min(50, self.size - len(queue)))
+                    except Exception as e:
+                        logger.error("Puzzle generation failed for %s: %s", category, e)
+                        break
+                    await asyncio.sleep(0)  # Generate in slices between other work
+            await self.wanted.wait()
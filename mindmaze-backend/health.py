@@ -0,0 +1,126 @@
+"""Readiness tracking for components initialised in the background.
+
+The server starts accepting connections immediately; a startup task brings
+up the database, caches and puzzle catalog and marks each one ready here.
+``/health/live`` only says the process is up, ``/health/ready`` reports
+whether every component is ready. A ``ReadinessProbe`` keeps re-checking a
+component after it first came up, so readiness follows it going away and
+coming back.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+from metrics import PROCESS_START_TIME
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    def __init__(self, components: Iterable[str]):
+        self.components: Dict[str, Dict] = {
+            name: {"ready": False, "attempts": 0, "error": None, "ready_at": None}
+            for name in components
+        }
+        self.ready_at: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return all(component["ready"] for component in self.components.values())
+
+    def is_ready(self, name: str) -> bool:
+        return self.components[name]["ready"]
+
+    def mark_ready(self, name: str) -> None:
+        component = self.components[name]
+        component["ready"] = True
+        component["error"] = None
+        component["ready_at"] = time.time()
+        if self.ready and self.ready_at is None:
+            self.ready_at = time.time()
+            logger.info("✅ Ready %.2fs after process start", self.cold_start_seconds)
+
+    def mark_lost(self, name: str, error: Exception) -> None:
+        """A ready component went away; it is not ready until marked again"""
+        component = self.components[name]
+        component["ready"] = False
+        component["error"] = str(error)
+
+    def mark_failed(self, name: str, error: Exception) -> None:
+        component = self.components[name]
+        component["attempts"] += 1
+        component["error"] = str(error)
+
+    @property
+    def cold_start_seconds(self) -> Optional[float]:
+        return self.ready_at - PROCESS_START_TIME if self.ready_at else None
+
+    def snapshot(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "cold_start_seconds": self.cold_start_seconds,
+            "uptime_seconds": time.time() - PROCESS_START_TIME,
+            "components": self.components,
+        }
+
+
+async def retry_with_backoff(name: str, readiness: Readiness, step: Callable[[], Awaitable[None]],
+                             initial_delay: float = 0.5, max_delay: float = 30.0) -> None:
+    """Run ``step`` until it succeeds, backing off exponentially with jitter"""
+    delay = initial_delay
+    while True:
+        try:
+            await step()
+            readiness.mark_ready(name)
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            readiness.mark_failed(name, e)
+            attempts = readiness.components[name]["attempts"]
+            logger.warning("%s not ready (attempt %d): %s; retrying in %.1fs", name, attempts, e, delay)
+            await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+            delay = min(delay * 2, max_delay)
+
+
+class ReadinessProbe:
+    """Runs ``check`` every ``interval`` seconds once ``name`` has been ready"""
+
+    def __init__(self, name: str, readiness: Readiness, check: Callable[[], Awaitable[None]],
+                 interval: float = 5.0, timeout: float = 2.0):
+        self.name = name
+        self.readiness = readiness
+        self.check = check
+        self.interval = interval
+        self.timeout = timeout
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        component = self.readiness.components[self.name]
+        while True:
+            await asyncio.sleep(self.interval)
+            if component["ready_at"] is None:
+                continue  # Still coming up through retry_with_backoff
+            try:
+                await asyncio.wait_for(self.check(), self.timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if component["ready"]:
+                    logger.error("❌ %s lost: %s", self.name, e)
+                self.readiness.mark_lost(self.name, e)
+                continue
+            if not component["ready"]:
+                logger.info("✅ %s is back", self.name)
+                self.readiness.mark_ready(self.name)
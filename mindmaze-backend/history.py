@@ -0,0 +1,156 @@
+"""Asynchronous, batched game-history logging.
+
+Finished games are put on a bounded in-process queue and written to the
+``games`` collection by a background task in ``insert_many`` batches, so
+recording a result never waits on the database. When the queue is full the
+``drop`` policy discards the record (and counts it) while ``block`` makes the
+caller wait for space.
+"""
+import asyncio
+import base64
+import json
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo.errors import BulkWriteError
+
+from metrics import REGISTRY
+from storage import GameStore
+
+logger = logging.getLogger(__name__)
+
+HISTORY_POLICIES = ("drop", "block")
+MAX_WRITE_ATTEMPTS = 3
+
+HISTORY_EVENTS = REGISTRY.counter(
+    "mindmaze_game_history_records_total", "Game history records by outcome.", ("result",)
+)
+HISTORY_BATCH_SIZE = REGISTRY.histogram(
+    "mindmaze_game_history_batch_size", "Documents per game history insert_many.",
+    buckets=(1, 5, 10, 50, 100, 250, 500, 1000)
+)
+
+
+class GameHistoryWriter:
+    def __init__(self, store: GameStore, max_queue: int = 10_000, batch_size: int = 500,
+                 flush_interval: float = 1.0, policy: str = "drop"):
+        if policy not in HISTORY_POLICIES:
+            raise ValueError(f"policy must be one of {HISTORY_POLICIES}")
+        self.store = store
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self._task: Optional[asyncio.Task] = None
+        self._enqueued = HISTORY_EVENTS.labels("enqueued")
+        self._dropped = HISTORY_EVENTS.labels("dropped")
+        self._written = HISTORY_EVENTS.labels("written")
+        self._failed = HISTORY_EVENTS.labels("failed")
+
+    async def record(self, game: Dict) -> None:
+        """Queue a finished game; returns immediately unless the policy is block"""
+        if self.policy == "block":
+            await self.queue.put(game)
+        else:
+            try:
+                self.queue.put_nowait(game)
+            except asyncio.QueueFull:
+                self._dropped.inc()
+                return
+        self._enqueued.inc()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Flush whatever is still queued, then stop the writer"""
+        if self._task is None:
+            return
+        await self.queue.put(None)
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            game = await self.queue.get()
+            if game is None:
+                return
+            batch = [game]
+            # Linger briefly so a burst of game ends shares one insert_many
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if self.queue.empty() and remaining <= 0:
+                    break
+                if not self.queue.empty():
+                    game = self.queue.get_nowait()
+                else:
+                    try:
+                        game = await asyncio.wait_for(self.queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if game is None:
+                    stopping = True
+                    break
+                batch.append(game)
+            await self._write(batch)
+
+    async def _write(self, batch: List[Dict]) -> None:
+        pending = batch
+        for attempt in range(1, MAX_WRITE_ATTEMPTS + 1):
+            try:
+                await self.store.insert_many(pending)
+                self._written.inc(len(pending))
+                HISTORY_BATCH_SIZE.labels().observe(len(pending))
+                return
+            except asyncio.CancelledError:
+                raise
+            except BulkWriteError as e:
+                # The insert is unordered, so only the documents in writeErrors are missing.
+                # A duplicate key means an earlier attempt did write it before failing.
+                retry = [pending[error["index"]] for error in e.details.get("writeErrors", [])
+                         if error.get("code") != 11000]
+                self._written.inc(len(pending) - len(retry))
+                pending = retry
+                if not pending:
+                    return
+                logger.warning("Game history write failed for %d records (attempt %d): %s",
+                               len(pending), attempt, e)
+            except Exception as e:
+                logger.warning("Game history write failed (attempt %d): %s", attempt, e)
+            await asyncio.sleep(0.5 * attempt)
+        self._failed.inc(len(pending))
+        logger.error("❌ Dropped %d game history records after %d attempts", len(pending), MAX_WRITE_ATTEMPTS)
+
+    def stats(self) -> Dict:
+        return {
+            "policy": self.policy,
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "enqueued": self._enqueued.value,
+            "written": self._written.value,
+            "dropped": self._dropped.value,
+            "failed": self._failed.value,
+        }
+
+
+def encode_cursor(game: Dict) -> str:
+    """Opaque pagination cursor for the position just after ``game``"""
+    raw = json.dumps({"t": game["finished_at"].isoformat(), "id": str(game["_id"])}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Inverse of encode_cursor; raises ValueError for anything malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(raw["t"]), ObjectId(raw["id"])
+    except (ValueError, KeyError, TypeError, InvalidId) as e:
+        raise ValueError("Invalid cursor") from e
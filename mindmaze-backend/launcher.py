@@ -0,0 +1,151 @@
+"""Production entry point: uvicorn with the server options tuned for MindMaze.
+
+Every option is a flag, with its default read from the environment, so the
+same launcher works from a shell, a container or a process manager:
+
+    python launcher.py --workers 4 --http httptools --ws websockets
+    WEB_CONCURRENCY=4 WS_PING_INTERVAL=10 python launcher.py
+
+Defaults that differ from uvicorn's, and why:
+
+* ``--ws-max-size`` 64 KiB instead of 16 MiB. Client frames are small JSON
+  commands, so a larger frame is a bug or abuse, and the limit bounds what
+  one socket can make the server buffer.
+* ``--no-ws-per-message-deflate``. Compressing small frames costs more CPU
+  than the bytes it saves, and every socket would carry a compression
+  context of its own.
+* ``--timeout-graceful-shutdown`` 30 s, so a deploy closes the sockets still
+  open and lets the shutdown hooks flush the game history, instead of
+  waiting forever.
+
+Game state lives in one process. With more than one worker, or with
+``--cluster``, the cluster coordinator from ``cluster.py`` is started first
+and the workers relay game frames to it. Uvicorn's own logs go through the
+JSON log pipeline like every other logger.
+"""
+import argparse
+import importlib.util
+import os
+import tempfile
+from typing import List, Optional
+
+# Modules each implementation choice needs; "auto" falls back to what is installed
+IMPLEMENTATION_MODULES = {
+    ("loop", "uvloop"): "uvloop",
+    ("http", "httptools"): "httptools",
+    ("ws", "websockets"): "websockets",
+    ("ws", "wsproto"): "wsproto",
+}
+
+
+def env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def env_float(name: str, default: Optional[float]) -> Optional[float]:
+    """Unset uses ``default``; an empty value or 0 disables the option"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return float(value) if value.strip() and float(value) > 0 else None
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("SERVER_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVER_PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "0")) or None,
+                        help="Worker processes [WEB_CONCURRENCY]; defaults to 1, or one per core with --cluster")
+    parser.add_argument("--cluster", action="store_true", default=env_flag("CLUSTER_MODE", False),
+                        help="Run the cluster coordinator even with one worker [CLUSTER_MODE]")
+    parser.add_argument("--socket", default=os.path.join(tempfile.gettempdir(), f"mindmaze-{os.getpid()}.sock"),
+                        help="Unix socket path for worker/coordinator IPC")
+    parser.add_argument("--loop", choices=("auto", "asyncio", "uvloop"), default=os.getenv("SERVER_LOOP", "auto"),
+                        help="[SERVER_LOOP]")
+    parser.add_argument("--http", choices=("auto", "h11", "httptools"), default=os.getenv("SERVER_HTTP", "auto"),
+                        help="HTTP parser [SERVER_HTTP]; auto prefers httptools")
+    parser.add_argument("--ws", choices=("auto", "websockets", "wsproto"), default=os.getenv("SERVER_WS", "auto"),
+                        help="WebSocket implementation [SERVER_WS]; auto prefers websockets")
+    parser.add_argument("--ws-max-size", type=int, default=int(os.getenv("WS_MAX_SIZE", str(64 * 1024))),
+                        help="Largest accepted WebSocket message in bytes [WS_MAX_SIZE]")
+    parser.add_argument("--ws-ping-interval", type=float, default=env_float("WS_PING_INTERVAL", 20.0),
+                        help="Seconds between server pings; 0 disables [WS_PING_INTERVAL]")
+    parser.add_argument("--ws-ping-timeout", type=float, default=env_float("WS_PING_TIMEOUT", 20.0),
+                        help="Seconds to wait for a pong before closing; 0 disables [WS_PING_TIMEOUT]")
+    parser.add_argument("--ws-per-message-deflate", action=argparse.BooleanOptionalAction,
+                        default=env_flag("WS_PER_MESSAGE_DEFLATE", False), help="[WS_PER_MESSAGE_DEFLATE]")
+    parser.add_argument("--backlog", type=int, default=int(os.getenv("SERVER_BACKLOG", "2048")),
+                        help="Pending connections the listening socket queues [SERVER_BACKLOG]")
+    parser.add_argument("--timeout-keep-alive", type=int, default=int(os.getenv("SERVER_KEEP_ALIVE", "5")),
+                        help="Seconds an idle HTTP keep-alive connection stays open [SERVER_KEEP_ALIVE]")
+    parser.add_argument("--timeout-graceful-shutdown", type=int,
+                        default=int(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30")) or None,
+                        help="Seconds to wait for open connections on shutdown; 0 waits forever "
+                             "[SERVER_GRACEFUL_TIMEOUT]")
+    parser.add_argument("--access-log", action=argparse.BooleanOptionalAction,
+                        default=env_flag("SERVER_ACCESS_LOG", True), help="[SERVER_ACCESS_LOG]")
+    return parser
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    for (option, choice), module in IMPLEMENTATION_MODULES.items():
+        if getattr(args, option) == choice and importlib.util.find_spec(module) is None:
+            parser.error(f"--{option} {choice} needs the {module} package, which is not installed")
+    if args.workers is None:
+        args.workers = (os.cpu_count() or 1) if args.cluster else 1
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.ws_ping_interval is not None and args.ws_ping_interval <= 0:
+        args.ws_ping_interval = None
+    if args.ws_ping_timeout is not None and args.ws_ping_timeout <= 0:
+        args.ws_ping_timeout = None
+    if not args.timeout_graceful_shutdown or args.timeout_graceful_shutdown < 0:
+        args.timeout_graceful_shutdown = None
+    return args
+
+
+def main(argv: Optional[List[str]] = None):
+    import uvicorn
+
+    from log_pipeline import setup_logging
+
+    args = parse_args(argv)
+    setup_logging()
+    coordinator_process = None
+    if args.cluster or args.workers > 1:
+        from cluster import start_coordinator
+
+        coordinator_process = start_coordinator(args.socket)
+    try:
+        uvicorn.run(
+            "main:app",
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            loop=args.loop,
+            http=args.http,
+            ws=args.ws,
+            ws_max_size=args.ws_max_size,
+            ws_ping_interval=args.ws_ping_interval,
+            ws_ping_timeout=args.ws_ping_timeout,
+            ws_per_message_deflate=args.ws_per_message_deflate,
+            backlog=args.backlog,
+            timeout_keep_alive=args.timeout_keep_alive,
+            timeout_graceful_shutdown=args.timeout_graceful_shutdown,
+            access_log=args.access_log,
+            log_config=None,  # The app's log pipeline formats uvicorn's records too
+            app_dir=os.path.dirname(os.path.abspath(__file__)),
+        )
+    finally:
+        if coordinator_process is not None:
+            coordinator_process.terminate()
+            coordinator_process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Live top-N leaderboard pushed over the game WebSocket.
+
+The top N is loaded from the user store once and then kept current from
+the new totals returned by ``increment_score``. Scores only increase, so
+that is exact without re-sorting the collection. Score changes only mark
+the board dirty. A background task compares it with what subscribers last
+saw at most once per interval, and sends the rows whose rank changed as a
+single ``leaderboard_delta`` frame, encoded once for every subscriber. A
+new subscriber first gets the whole board as a ``leaderboard`` frame.
+"""
+import asyncio
+import heapq
+import json
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from metrics import REGISTRY
+from storage import UserStore
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_FRAMES = REGISTRY.counter(
+    "mindmaze_leaderboard_frames_total", "Leaderboard frames sent to subscribers.", ("type",)
+)
+
+
+class LiveLeaderboard:
+    def __init__(self, store: UserStore, size: int = 10, interval: float = 1.0):
+        self.store = store
+        self.size = size
+        self.interval = interval
+        self.scores: Dict[str, int] = {}  # The top N plus any newcomers since the last flush
+        self.published: List[Tuple[str, int]] = []
+        self.version = 0
+        self.dirty = False
+        self.loaded = False
+        self.subscribers: Dict[str, object] = {}  # username -> websocket
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def load(self) -> None:
+        for user in await self.store.top_users(self.size):
+            self.scores.setdefault(user["username"], user.get("score", 0))
+        self.published = self.ranked()
+        self.loaded = True
+
+    def update(self, username: str, score: int) -> None:
+        """Record a player's new total; cheap enough to call on every score change"""
+        scores = self.scores
+        if username in scores or len(scores) < self.size or score > min(scores.values()):
+            scores[username] = score
+            self.dirty = True
+
+    def ranked(self) -> List[Tuple[str, int]]:
+        return heapq.nsmallest(self.size, self.scores.items(), key=lambda entry: (-entry[1], entry[0]))
+
+    def snapshot_frame(self) -> str:
+        return json.dumps({
+            "type": "leaderboard",
+            "version": self.version,
+            "rows": [
+                {"rank": rank + 1, "username": username, "score": score}
+                for rank, (username, score) in enumerate(self.published)
+            ]
+        })
+
+    async def subscribe(self, username: str, websocket) -> None:
+        self.subscribers[username] = websocket
+        LEADERBOARD_FRAMES.labels("snapshot").inc()
+        await websocket.send_text(self.snapshot_frame())
+
+    def unsubscribe(self, username: str, websocket=None) -> None:
+        if websocket is None or self.subscribers.get(username) is websocket:
+            self.subscribers.pop(username, None)
+
+    async def _run(self):
+        delay = 0.5
+        while not self.loaded:
+            try:
+                await self.load()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Leaderboard load failed: %s; retrying in %.1fs", e, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+        while True:
+            await asyncio.sleep(self.interval)
+            if self.dirty:
+                await self.flush()
+
+    async def flush(self) -> None:
+        self.dirty = False
+        rows = self.ranked()
+        self.scores = dict(rows)
+        previous = self.published
+        changed = [
+            {"rank": rank + 1, "username": username, "score": score}
+            for rank, (username, score) in enumerate(rows)
+            if rank >= len(previous) or previous[rank] != (username, score)
+        ]
+        if not changed and len(rows) == len(previous):
+            return
+        self.version += 1
+        self.published = rows
+        if not self.subscribers:
+            return
+        frame = json.dumps({"type": "leaderboard_delta", "version": self.version, "size": len(rows), "rows": changed})
+        subscribers = list(self.subscribers.items())
+        results = await asyncio.gather(
+            *(websocket.send_text(frame) for _, websocket in subscribers), return_exceptions=True
+        )
+        LEADERBOARD_FRAMES.labels("delta").inc(len(subscribers))
+        for (username, websocket), result in zip(subscribers, results):
+            if isinstance(result, Exception):
+                self.unsubscribe(username, websocket)
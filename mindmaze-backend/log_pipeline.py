@@ -0,0 +1,211 @@
+"""Non-blocking, sampled logging.
+
+Every handler on the root logger is replaced by a single ``QueueHandler``:
+the calling thread (usually the event loop) only creates the record and puts
+it on a bounded queue, while a ``QueueListener`` thread formats and writes it
+to stderr. Messages are formatted lazily on the listener thread, so callers
+should log with ``%`` arguments rather than f-strings. A full queue drops the
+record instead of blocking.
+
+Records carry an ``event`` name (``extra={"event": "game_started"}``,
+defaulting to the logger name) and per-event rules can sample them or cap
+them with a token bucket. Rules only apply below WARNING, so errors are never
+sampled away. Configure with environment variables:
+
+* ``LOG_LEVEL`` - root level (default INFO)
+* ``LOG_FORMAT`` - ``json`` (default) or ``text``
+* ``LOG_QUEUE_SIZE`` - records buffered before dropping (default 10000)
+* ``LOG_SAMPLING`` - JSON rules, e.g.
+  ``{"ws_connected": {"sample_rate": 0.1}, "game_ended": {"rate_per_second": 50}}``
+
+Rules and level can also be changed at runtime through ``configure``.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from metrics import REGISTRY
+
+LOG_FORMATS = ("json", "text")
+TEXT_FORMAT = "%(levelname)s:%(name)s:%(message)s"
+
+LOG_RECORDS_DROPPED = REGISTRY.counter(
+    "mindmaze_log_records_dropped_total", "Log records discarded before output.", ("event", "reason")
+)
+
+# Attributes every LogRecord has; anything else came from ``extra`` (uvicorn's
+# color_message duplicates the message with terminal escapes)
+_RECORD_ATTRIBUTES = set(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {
+    "message", "asctime", "event", "color_message"
+}
+
+
+def record_event(record: logging.LogRecord) -> str:
+    return getattr(record, "event", None) or record.name
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line with the event name and any ``extra`` fields"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record_event(record),
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class EventRule:
+    """Keep a random ``sample_rate`` fraction, then at most ``rate_per_second``
+    (token bucket holding up to ``burst`` records)"""
+
+    def __init__(self, sample_rate: float = 1.0, rate_per_second: Optional[float] = None,
+                 burst: Optional[float] = None):
+        if not 0.0 <= sample_rate <= 1.0:
+            raise ValueError("sample_rate must be between 0 and 1")
+        if rate_per_second is not None and rate_per_second < 0:
+            raise ValueError("rate_per_second must not be negative")
+        self.sample_rate = sample_rate
+        self.rate_per_second = rate_per_second
+        self.burst = burst if burst is not None else max(rate_per_second or 0.0, 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def admit(self) -> Optional[str]:
+        """None to keep the record, otherwise the reason it is dropped"""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return "sampled"
+        if self.rate_per_second is not None:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate_per_second)
+            self.updated = now
+            if self.tokens < 1.0:
+                return "rate_limited"
+            self.tokens -= 1.0
+        return None
+
+    def settings(self) -> Dict:
+        return {"sample_rate": self.sample_rate, "rate_per_second": self.rate_per_second, "burst": self.burst}
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rules: Optional[Dict[str, EventRule]] = None):
+        super().__init__()
+        self.rules: Dict[str, EventRule] = rules or {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rules:
+            return True
+        event = record_event(record)
+        rule = self.rules.get(event)
+        if rule is None:
+            return True
+        with self._lock:
+            reason = rule.admit()
+        if reason is None:
+            return True
+        LOG_RECORDS_DROPPED.labels(event, reason).inc()
+        return False
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # The listener formats the record, so the caller never pays for it
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.labels(record_event(record), "queue_full").inc()
+
+
+def parse_rules(raw: Dict[str, Dict]) -> Dict[str, EventRule]:
+    return {event: EventRule(**options) for event, options in raw.items()}
+
+
+class LoggingPipeline:
+    def __init__(self, level: str = "INFO", log_format: str = "json", queue_size: int = 10_000,
+                 rules: Optional[Dict[str, EventRule]] = None):
+        if log_format not in LOG_FORMATS:
+            raise ValueError(f"log_format must be one of {LOG_FORMATS}")
+        self.log_format = log_format
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.sampling = SamplingFilter(rules)
+        self.handler = NonBlockingQueueHandler(self.queue)
+        self.handler.addFilter(self.sampling)
+
+        output = logging.StreamHandler(sys.stderr)
+        output.setFormatter(JSONFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT))
+        self.listener = QueueListener(self.queue, output)
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+            handler.close()
+        root.addHandler(self.handler)
+        root.setLevel(level.upper())
+        # Send uvicorn's error and access logs through the same queue
+        for name in ("uvicorn", "uvicorn.access"):
+            uvicorn_logger = logging.getLogger(name)
+            uvicorn_logger.handlers.clear()
+            uvicorn_logger.propagate = True
+
+        self.listener.start()
+        atexit.register(self.stop)
+
+    def configure(self, level: Optional[str] = None, rules: Optional[Dict[str, EventRule]] = None):
+        if level is not None:
+            logging.getLogger().setLevel(level.upper())
+        if rules is not None:
+            self.sampling.rules = rules
+
+    def stop(self):
+        """Flush queued records and stop the listener thread"""
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def settings(self) -> Dict:
+        return {
+            "level": logging.getLevelName(logging.getLogger().level),
+            "format": self.log_format,
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "rules": {event: rule.settings() for event, rule in self.sampling.rules.items()},
+        }
+
+
+_pipeline: Optional[LoggingPipeline] = None
+
+
+def setup_logging() -> LoggingPipeline:
+    """Install the pipeline from LOG_* environment variables, once per process"""
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = LoggingPipeline(
+            level=os.getenv("LOG_LEVEL", "INFO"),
+            log_format=os.getenv("LOG_FORMAT", "json"),
+            queue_size=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+            rules=parse_rules(json.loads(os.getenv("LOG_SAMPLING", "{}"))),
+        )
+    return _pipeline
@@ -0,0 +1,122 @@
+"""Event-loop lag monitoring with stack capture on stalls.
+
+A task sleeps for ``interval`` in a loop and records how late it woke up in
+the ``mindmaze_event_loop_lag_seconds`` histogram. That delay is what
+every other callback on the loop waited too. Each wake-up also stamps a
+heartbeat.
+
+A watchdog thread checks the heartbeat several times per ``threshold``. If
+the loop has not ticked for longer than ``interval + threshold``, the loop
+thread is stuck in synchronous code right now. The watchdog grabs that
+thread's stack with ``sys._current_frames`` and logs it once per stall,
+at most every ``dump_interval`` seconds. Once the loop wakes, the stall
+is counted with its full duration.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, Optional
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG = REGISTRY.histogram(
+    "mindmaze_event_loop_lag_seconds", "How late the event loop ran a timer callback.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+).labels()
+LOOP_STALLS = REGISTRY.counter(
+    "mindmaze_event_loop_stalls_total", "Times the event loop lagged past the stall threshold."
+).labels()
+
+
+class _Watchdog(threading.Thread):
+    def __init__(self, monitor: "LoopMonitor", target_thread_id: int):
+        super().__init__(name="mindmaze-loop-watchdog", daemon=True)
+        self.monitor = monitor
+        self.target_thread_id = target_thread_id
+        self._stop_event = threading.Event()
+
+    def run(self):
+        monitor = self.monitor
+        reported_tick = None
+        last_dump = float("-inf")
+        while not self._stop_event.wait(monitor.threshold / 4):
+            tick = monitor.last_tick
+            now = time.monotonic()
+            blocked = now - tick - monitor.interval
+            if blocked < monitor.threshold or tick == reported_tick or now - last_dump < monitor.dump_interval:
+                continue
+            frame = sys._current_frames().get(self.target_thread_id)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame))
+            del frame
+            reported_tick, last_dump = tick, now
+            monitor.last_stall = {"blocked_seconds": round(blocked, 3), "at": time.time(), "stack": stack}
+            logger.warning(
+                "Event loop blocked for %.3fs so far; loop thread stack:\n%s", blocked, stack,
+                extra={"event": "loop_stall"}
+            )
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class LoopMonitor:
+    def __init__(self, interval: float = 0.1, threshold: float = 0.25, dump_interval: float = 10.0):
+        self.interval = interval
+        self.threshold = threshold  # 0 disables the watchdog; the histogram is always kept
+        self.dump_interval = dump_interval
+        self.last_tick = time.monotonic()
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.last_stall: Optional[Dict] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[_Watchdog] = None
+
+    def start(self) -> None:
+        """Start monitoring the running loop; must be called from its thread"""
+        if self._task is not None:
+            return
+        self.last_tick = time.monotonic()
+        self._task = asyncio.create_task(self._run())
+        if self.threshold > 0:
+            self._watchdog = _Watchdog(self, threading.get_ident())
+            self._watchdog.start()
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.stop()
+            self._watchdog = None
+
+    async def _run(self):
+        interval = self.interval
+        while True:
+            expected = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            self.last_tick = now
+            lag = max(0.0, now - expected)
+            LOOP_LAG.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if self.threshold > 0 and lag >= self.threshold:
+                self.stalls += 1
+                LOOP_STALLS.inc()
+                logger.warning("Event loop stalled for %.3fs", lag, extra={"event": "loop_stall"})
+
+    def stats(self) -> Dict:
+        return {
+            "interval": self.interval,
+            "threshold": self.threshold,
+            "max_lag_seconds": round(self.max_lag, 4),
+            "stalls": self.stalls,
+            "last_stall": self.last_stall,
+        }
@@ -1,23 +1,51 @@
-from fastapi import FastAPI, WebSocket, HTTPException, Depends, WebSocketDisconnect
+from fastapi import FastAPI, WebSocket, HTTPException, Depends, WebSocketDisconnect, Header, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, FileResponse, StreamingResponse
+from starlette.routing import BaseRoute, Router
 from motor.motor_asyncio import AsyncIOMotorClient
+from websockets.exceptions import ConnectionClosed
 from pydantic import BaseModel, Field
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple, Union
 import json
 import asyncio
-from datetime import datetime
+import gc
+import itertools
+from datetime import date, datetime
 import os
 from dotenv import load_dotenv
-from bson import ObjectId
 import logging
-import random
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+import secrets
+import sys
+import time
+
+from db_monitoring import command_listener, pool_listener, mongo_client_options, monitoring_snapshot
+from metrics import REGISTRY, CONTENT_TYPE, DEFAULT_DURATION_BUCKETS, HTTPMetricsMiddleware, resident_memory_bytes
+from profiling import Profiler, ProfilerBusyError, ProfilingMiddleware, PROFILE_MODES
+from memory import AllocationTracer, TracerError, measure
+from loop_monitor import LoopMonitor
+from encoding import MongoJSONResponse, encode_json
+from export import EXPORT_FORMATS, export_users, naive_utc
+from health import Readiness, ReadinessProbe, retry_with_backoff
+from catalog import CatalogImportError, PuzzleCatalog, iter_lines
+from cluster import ClusterClient
+from history import GameHistoryWriter, decode_cursor, encode_cursor
+from leaderboard import LiveLeaderboard
+from log_pipeline import parse_rules, setup_logging
+from generators import PuzzlePool
+from pubsub import PubSub
+from search import PuzzleSearchIndex, QueryError
+from sse import SnapshotStream
+from storage import (
+    DuplicateUserError, GameStore, InMemoryGameStore, InMemoryPuzzleStore, InMemoryUserStore, MongoGameStore,
+    MongoPuzzleStore, MongoUserStore, PuzzleStore, UserStore, fault_injector_from_env
+)
 
 load_dotenv()
 
+# Logging goes through a background queue listener; see log_pipeline
+log_pipeline = setup_logging()
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title="MindMaze API", version="1.0.0")
 
 # CORS - Updated to include Vite's default port
@@ -35,37 +63,101 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Database
-MONGODB_URL = os.getenv("MONGODB_URL")
-if not MONGODB_URL:
-    raise ValueError("MONGODB_URL environment variable is not set")
+# Route latency for every HTTP request, labelled by route template
+HTTP_REQUEST_LATENCY = REGISTRY.histogram(
+    "mindmaze_http_request_duration_seconds", "HTTP request latency by method and route.", ("method", "route")
+)
+app.add_middleware(HTTPMetricsMiddleware, histogram=HTTP_REQUEST_LATENCY)
+
+# On-demand profiler; idle unless started through the admin API
+profiler = Profiler(os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")))
+allocation_tracer = AllocationTracer()  # tracemalloc stays off until an admin starts it
+# Scheduling delay of the shared event loop; stalls past the threshold log the loop thread's stack
+loop_monitor = LoopMonitor(
+    interval=float(os.getenv("LOOP_LAG_INTERVAL", "0.1")),
+    threshold=float(os.getenv("LOOP_STALL_THRESHOLD", "0.25")),  # 0 disables the watchdog
+    dump_interval=float(os.getenv("LOOP_STALL_DUMP_INTERVAL", "10"))
+)
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
+# Admin endpoints require the X-Admin-Token header to match ADMIN_TOKEN
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+async def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API is disabled")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+# Database: STORAGE_BACKEND=mongo (default) or memory for local benchmarking
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo")
+MONGO_CLIENT_OPTIONS: Dict = {}
+client = None
+db = None
+
+if STORAGE_BACKEND == "mongo":
+    MONGODB_URL = os.getenv("MONGODB_URL")
+    if not MONGODB_URL:
+        raise ValueError("MONGODB_URL environment variable is not set")
+
+    # Pool size, timeouts and compression come from MONGODB_* environment variables
+    MONGO_CLIENT_OPTIONS = mongo_client_options()
+    client = AsyncIOMotorClient(
+        MONGODB_URL,
+        event_listeners=[command_listener, pool_listener],
+        **MONGO_CLIENT_OPTIONS
+    )
+    db = client.mindmaze
+    user_store: UserStore = MongoUserStore(client, db)
+    game_store: GameStore = MongoGameStore(db)
+    puzzle_store: PuzzleStore = MongoPuzzleStore(db)
+elif STORAGE_BACKEND == "memory":
+    # Latency, jitter and error rate come from MEMORY_STORE_* environment variables
+    storage_faults = fault_injector_from_env()
+    user_store = InMemoryUserStore(storage_faults)
+    game_store = InMemoryGameStore(storage_faults)
+    puzzle_store = InMemoryPuzzleStore(storage_faults)
+else:
+    raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+
+# Finished games are logged to the games collection by a background batch writer
+history_writer = GameHistoryWriter(
+    game_store,
+    max_queue=int(os.getenv("GAME_HISTORY_QUEUE_SIZE", "10000")),
+    batch_size=int(os.getenv("GAME_HISTORY_BATCH_SIZE", "500")),
+    flush_interval=float(os.getenv("GAME_HISTORY_FLUSH_INTERVAL", "1.0")),
+    policy=os.getenv("GAME_HISTORY_POLICY", "drop")
+)
+REGISTRY.gauge(
+    "mindmaze_game_history_queue_depth", "Game history records waiting to be written.", history_writer.queue.qsize
+)
 
-client = AsyncIOMotorClient(MONGODB_URL)
-db = client.mindmaze
+# Top-N pushed to WebSocket subscribers, at most one delta frame per interval
+leaderboard = LiveLeaderboard(
+    user_store,
+    size=int(os.getenv("LEADERBOARD_SIZE", "10")),
+    interval=float(os.getenv("LEADERBOARD_PUSH_INTERVAL", "1.0"))
+)
+REGISTRY.gauge(
+    "mindmaze_leaderboard_subscribers", "WebSocket clients subscribed to the leaderboard.",
+    lambda: len(leaderboard.subscribers)
+)
 
-# Helper function to serialize MongoDB documents
-def serialize_mongo_doc(doc):
-    """Convert MongoDB document to JSON serializable format"""
-    if doc is None:
-        return None
-    
-    if isinstance(doc, list):
-        return [serialize_mongo_doc(item) for item in doc]
-    
-    if isinstance(doc, dict):
-        serialized = {}
-        for key, value in doc.items():
-            if isinstance(value, ObjectId):
-                serialized[key] = str(value)
-            elif isinstance(value, dict):
-                serialized[key] = serialize_mongo_doc(value)
-            elif isinstance(value, list):
-                serialized[key] = [serialize_mongo_doc(item) for item in value]
-            else:
-                serialized[key] = value
-        return serialized
-    
-    return doc
+# Generated math puzzles, refilled in the background so game_start never waits on them
+puzzle_pool = PuzzlePool(size=int(os.getenv("GENERATED_PUZZLE_POOL_SIZE", "200")))
+REGISTRY.gauge("mindmaze_puzzle_pool_depth", "Generated puzzles ready to be played.", puzzle_pool.depth)
+
+# Users per cursor batch in admin exports
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "2000"))
+
+# Stats pushed over server-sent events: one collection per interval for all open tabs
+STATS_USER_COUNT_INTERVAL = float(os.getenv("STATS_USER_COUNT_INTERVAL", "30"))
+user_count_cache = {"total": None, "counted_at": float("-inf")}
+stats_stream = SnapshotStream(
+    lambda: collect_stats(STATS_USER_COUNT_INTERVAL),
+    max_rate=float(os.getenv("STATS_STREAM_MAX_RATE", "1.0"))
+)
+REGISTRY.gauge("mindmaze_stats_stream_clients", "Clients connected to the stats stream.", lambda: stats_stream.listeners)
 
 # Models
 class User(BaseModel):
@@ -75,12 +167,41 @@ class User(BaseModel):
     confirmPassword: str = Field(default="", exclude=True)  # Accept but ignore
     email: str = Field(default="", exclude=True)  # Accept but ignore
 
+# Response models: only the fields the client reads
+PUBLIC_USER_PROJECTION = {"_id": 0, "username": 1, "score": 1}
+
+class UserOut(BaseModel):
+    username: str
+    score: int = 0
+
+class AuthResponse(BaseModel):
+    message: str
+    user: UserOut
+
+class LeaderboardEntry(BaseModel):
+    username: str
+    score: int = 0
+
 class GameSession(BaseModel):
     players: List[str]
     category: str
-    current_puzzle: Dict[str, str]
+    current_puzzle: Optional[Dict[str, str]] = None  # Loaded by the actor if start_room had none cached
     answers: Dict[str, str] = {}
     winner: Optional[str] = None
+    puzzle_id: str = ""
+    scoring: str = "first_correct"
+    finishers: List[str] = []  # Ranked scoring: players in the order they answered correctly
+    wrong_attempts: Dict[str, int] = {}
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: float = Field(default_factory=time.monotonic)
+
+class ProfileRequest(BaseModel):
+    mode: str = "cprofile"
+    route: Optional[str] = None  # Route template, e.g. /api/leaderboard
+    ws_type: Optional[str] = None  # WebSocket message type, e.g. submit_answer
+    seconds: Optional[float] = Field(default=None, gt=0)
+    requests: Optional[int] = Field(default=None, gt=0)
+    interval_ms: float = Field(default=5.0, gt=0)
 
 class WebSocketMessage(BaseModel):
     type: str
@@ -89,9 +210,73 @@ class WebSocketMessage(BaseModel):
     category: Optional[str] = None
 
 # In-memory storage for active games
-active_games: Dict[str, GameSession] = {}
+active_games: Dict[str, "GameActor"] = {}
+player_games: Dict[str, str] = {}  # username -> id of the game they are playing
 connected_players: Dict[str, WebSocket] = {}
 waiting_players: Dict[str, Dict] = {}  # Store players waiting for matches by category
+game_counter = itertools.count(1)  # Unique game ids, also used in the game history
+GAME_TIMEOUT_SECONDS = float(os.getenv("GAME_TIMEOUT_SECONDS", "300"))  # 0 disables the timeout
+
+# Rooms: 2 players by default (a duel), up to MAX_ROOM_SIZE. A room that has not
+# filled within ROOM_FILL_TIMEOUT_SECONDS starts with whoever is there (at least 2).
+MIN_ROOM_SIZE = 2
+MAX_ROOM_SIZE = 50
+SCORING_MODES = ("first_correct", "ranked")
+ROOM_FILL_TIMEOUT_SECONDS = float(os.getenv("ROOM_FILL_TIMEOUT_SECONDS", "30"))
+
+class Lobby:
+    """Players waiting for one room; members is a dict so join and leave are O(1)"""
+
+    def __init__(self, category: str, room_size: int, scoring: str):
+        self.category = category
+        self.room_size = room_size
+        self.scoring = scoring
+        self.members: Dict[str, WebSocket] = {}
+        self.expired = False
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def key(self) -> Tuple[str, int, str]:
+        return (self.category, self.room_size, self.scoring)
+
+    @property
+    def ready(self) -> bool:
+        return len(self.members) >= self.room_size or (self.expired and len(self.members) >= MIN_ROOM_SIZE)
+
+lobbies: Dict[Tuple[str, int, str], Lobby] = {}  # One open lobby per (category, room_size, scoring)
+
+# Spectators subscribe to a game's topic; lagging viewers skip to the newest frames
+spectators = PubSub(queue_size=int(os.getenv("SPECTATOR_QUEUE_SIZE", "16")))
+
+# Game loop metrics
+WS_MESSAGE_TYPES = {
+    "find_match", "submit_answer", "cancel_search", "subscribe_leaderboard", "unsubscribe_leaderboard", "invalid_json"
+}
+WS_MESSAGE_LATENCY = REGISTRY.histogram(
+    "mindmaze_ws_message_duration_seconds", "Inbound WebSocket message handling time by type.", ("type",)
+)
+MATCHMAKING_WAIT = REGISTRY.histogram(
+    "mindmaze_matchmaking_wait_seconds", "Time a player waited in the queue before being matched.",
+    ("category",), DEFAULT_DURATION_BUCKETS
+)
+GAME_DURATION = REGISTRY.histogram(
+    "mindmaze_game_duration_seconds", "Time from game_start to game_end.", ("category",), DEFAULT_DURATION_BUCKETS
+)
+
+def waiting_players_by_category() -> Dict[str, int]:
+    depth: Dict[str, int] = {}
+    for info in list(waiting_players.values()):
+        depth[info["category"]] = depth.get(info["category"], 0) + 1
+    return depth
+
+REGISTRY.gauge("mindmaze_connected_players", "Players with an open WebSocket.", lambda: len(connected_players))
+REGISTRY.gauge("mindmaze_active_games", "Games currently in progress.", lambda: len(active_games))
+REGISTRY.gauge("mindmaze_waiting_players", "Players waiting for a match.", lambda: len(waiting_players))
+REGISTRY.gauge("mindmaze_spectators", "Open spectator connections.", spectators.subscriber_count)
+REGISTRY.gauge(
+    "mindmaze_matchmaking_queue_depth", "Players waiting for a match by category.",
+    waiting_players_by_category, ("category",)
+)
 
 # Category-specific puzzles
 CATEGORY_PUZZLES = {
@@ -1586,39 +1771,181 @@ CATEGORY_PUZZLES = {
 }
 
 
-# Test database connection on startup
-@app.on_event("startup")
-async def startup_event():
-    try:
-        # Test the connection
-        await client.admin.command('ping')
-        logger.info("✅ Connected to MongoDB Atlas successfully!")
-        
-        # Create indexes for better performance
+# Startup: accept connections immediately, bring dependencies up in the background
+readiness = Readiness(["db", "puzzle_catalog", "caches"])
+REGISTRY.gauge("mindmaze_ready", "1 when every component is ready.", lambda: int(readiness.ready))
+REGISTRY.gauge(
+    "mindmaze_cold_start_seconds", "Seconds from process start to ready (0 until ready).",
+    lambda: readiness.cold_start_seconds or 0
+)
+startup_tasks: List[asyncio.Task] = []
+
+# Cluster mode: set by cluster.py; game messages go to the coordinator process
+COORDINATOR_SOCKET = os.getenv("MINDMAZE_COORDINATOR")
+cluster_client: Optional[ClusterClient] = None
+if COORDINATOR_SOCKET:
+    readiness.components["coordinator"] = {"ready": False, "attempts": 0, "error": None, "ready_at": None}
+
+async def deliver_to_player(username: str, text: str):
+    websocket = connected_players.get(username)
+    if websocket is not None:
         try:
-            await db.users.create_index("username", unique=True)
-            logger.info("✅ Database indexes created")
-        except Exception as e:
-            logger.warning(f"Index creation warning: {e}")
-        
+            await websocket.send_text(text)
+        except (ConnectionClosed, WebSocketDisconnect) as e:
+            raise ConnectionError(str(e)) from e
+
+async def connect_coordinator():
+    global cluster_client
+    client = ClusterClient(COORDINATOR_SOCKET, deliver_to_player, on_lost=on_coordinator_lost)
+    await client.connect()
+    cluster_client = client
+    logger.info("✅ Connected to coordinator at %s", COORDINATOR_SOCKET)
+
+def on_coordinator_lost():
+    global cluster_client
+    cluster_client = None  # New sockets are turned away until the link is back
+    readiness.mark_lost("coordinator", ConnectionError("Lost connection to coordinator"))
+    startup_tasks.append(asyncio.create_task(reconnect_coordinator()))
+
+async def reconnect_coordinator():
+    # Their games went with the old link; 1012 tells clients to reconnect
+    for websocket in list(connected_players.values()):
+        try:
+            await websocket.close(code=1012)
+        except Exception:
+            pass  # Already closing
+    await retry_with_backoff("coordinator", readiness, connect_coordinator)
+
+# Puzzles are served from the database; CATEGORY_PUZZLES only seeds empty categories
+puzzle_catalog = PuzzleCatalog(
+    puzzle_store,
+    CATEGORY_PUZZLES,
+    cache_size=int(os.getenv("PUZZLE_CACHE_SIZE", "50000")),
+    poll_interval=float(os.getenv("PUZZLE_VERSION_POLL_SECONDS", "5")),
+    batch_size=int(os.getenv("PUZZLE_IMPORT_BATCH_SIZE", "500"))
+)
+REGISTRY.gauge("mindmaze_puzzle_cache_puzzles", "Puzzles held in the category cache.", lambda: puzzle_catalog.cached_puzzles)
+
+# Pre-encoded bodies for responses that only change with the puzzle catalog
+response_cache: Dict[str, bytes] = {}
+search_index = PuzzleSearchIndex()  # Filled in by on_catalog_change once the catalog loads
+search_index_lock = asyncio.Lock()
+
+async def connect_database():
+    await user_store.ping()
+    logger.info("✅ Connected to %s storage successfully!", STORAGE_BACKEND)
+    
+    # Create indexes for better performance
+    try:
+        await user_store.ensure_indexes()
+        await game_store.ensure_indexes()
+        await puzzle_store.ensure_indexes()
+        logger.info("✅ Database indexes created")
     except Exception as e:
-        logger.error(f"❌ Failed to connect to MongoDB Atlas: {e}")
-        raise
+        logger.warning("Index creation warning: %s", e)
+
+# After the first connect, the database is pinged so /health/ready follows outages
+db_probe = ReadinessProbe(
+    "db", readiness, user_store.ping, interval=float(os.getenv("DB_HEALTH_INTERVAL_SECONDS", "5"))
+)
+
+async def load_puzzle_catalog():
+    for category, puzzles in CATEGORY_PUZZLES.items():
+        if not puzzles:
+            raise ValueError(f"Category {category} has no puzzles")
+        for puzzle in puzzles:
+            if not puzzle.get("question") or not puzzle.get("answer"):
+                raise ValueError(f"Malformed puzzle in {category}: {puzzle}")
+    await puzzle_catalog.load()
+    puzzle_catalog.start()
+    # The first index is built by now and lives long; keep it out of future collections
+    gc.freeze()
+    logger.info(
+        "✅ Puzzle catalog loaded: %d categories, %d puzzles indexed",
+        len(puzzle_catalog.versions), len(search_index)
+    )
+
+async def on_catalog_change(categories: List[str]):
+    """Refresh what is derived from the catalog after new versions go live"""
+    global search_index
+    response_cache["categories"] = encode_json(build_categories_info())
+    async with search_index_lock:
+        changed = {}
+        for category in categories:
+            if category in puzzle_catalog:
+                # Read before get(), which loads this same version
+                version = puzzle_catalog.versions[category]["version"]
+                changed[category] = (version, await puzzle_catalog.get(category))
+            else:
+                changed[category] = None
+        search_index = await asyncio.to_thread(search_index.updated, changed)
+
+async def warm_caches():
+    response_cache["categories"] = encode_json(build_categories_info())
+    logger.info("✅ Response caches warmed")
+
+async def initialize():
+    await retry_with_backoff("puzzle_catalog", readiness, load_puzzle_catalog)
+    await retry_with_backoff("caches", readiness, warm_caches)
+
+def start_game_services():
+    """Background services owned by whichever process runs the game loop"""
+    history_writer.start()
+    leaderboard.start()
+    puzzle_pool.start()
+
+@app.on_event("startup")
+async def startup_event():
+    loop_monitor.start()
+    db_probe.start()
+    puzzle_catalog.on_change(on_catalog_change)
+    start_game_services()
+    stats_stream.start()
+    startup_tasks.append(asyncio.create_task(retry_with_backoff("db", readiness, connect_database)))
+    startup_tasks.append(asyncio.create_task(initialize()))
+    if COORDINATOR_SOCKET:
+        startup_tasks.append(asyncio.create_task(retry_with_backoff("coordinator", readiness, connect_coordinator)))
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    client.close()
-    logger.info("✅ MongoDB connection closed")
+    for task in startup_tasks:
+        task.cancel()
+    if cluster_client is not None:
+        cluster_client.close()
+    leaderboard.stop()
+    puzzle_pool.stop()
+    puzzle_catalog.stop()
+    stats_stream.stop()
+    db_probe.stop()
+    loop_monitor.stop()
+    await history_writer.stop()
+    user_store.close()
+    logger.info("✅ Storage connection closed")
 
 # Routes
 @app.get("/")
 async def root():
-    return {"message": "MindMaze API is running!", "status": "connected"}
+    if readiness.is_ready("db"):
+        status = "connected"
+    else:
+        status = "disconnected" if readiness.components["db"]["ready_at"] else "starting"
+    return {"message": "MindMaze API is running!", "status": status}
 
-@app.post("/api/register")
+@app.get("/health/live")
+async def health_live():
+    """The process is up and serving requests"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def health_ready():
+    """Readiness of the database, caches and puzzle catalog; 503 until all are ready"""
+    snapshot = readiness.snapshot()
+    return MongoJSONResponse(snapshot, status_code=200 if snapshot["ready"] else 503)
+
+@app.post("/api/register", response_model=AuthResponse)
 async def register(user: User):
     try:
-        existing_user = await db.users.find_one({"username": user.username})
+        existing_user = await user_store.find_user(user.username)
         if existing_user:
             raise HTTPException(status_code=400, detail="Username already exists")
         
@@ -1627,21 +1954,26 @@ async def register(user: User):
         user_dict.pop("confirmPassword", None)
         user_dict.pop("email", None)
         user_dict["created_at"] = datetime.utcnow()
-        await db.users.insert_one(user_dict)
-        return {"message": "User created successfully", "user": serialize_mongo_doc(user_dict)}
+        await user_store.insert_user(user_dict)
+        leaderboard.update(user_dict["username"], user_dict["score"])
+        user_count_cache["counted_at"] = float("-inf")
+        return MongoJSONResponse({
+            "message": "User created successfully",
+            "user": {"username": user_dict["username"], "score": user_dict["score"]}
+        })
     except HTTPException:
         raise
+    except DuplicateUserError:
+        raise HTTPException(status_code=400, detail="Username already exists")
     except Exception as e:
-        if "duplicate key" in str(e):
-            raise HTTPException(status_code=400, detail="Username already exists")
-        logger.error(f"Registration error: {e}")
+        logger.error("Registration error: %s", e)
         raise HTTPException(status_code=500, detail="Database error")
 
-@app.post("/api/signup")
+@app.post("/api/signup", response_model=AuthResponse)
 async def signup(user: User):
     # Reuse the register logic
     try:
-        existing_user = await db.users.find_one({"username": user.username})
+        existing_user = await user_store.find_user(user.username)
         if existing_user:
             raise HTTPException(status_code=400, detail="Username already exists")
         
@@ -1650,107 +1982,440 @@ async def signup(user: User):
         user_dict.pop("confirmPassword", None)
         user_dict.pop("email", None)
         user_dict["created_at"] = datetime.utcnow()
-        await db.users.insert_one(user_dict)
-        return {"message": "User created successfully", "user": serialize_mongo_doc(user_dict)}
+        await user_store.insert_user(user_dict)
+        leaderboard.update(user_dict["username"], user_dict["score"])
+        user_count_cache["counted_at"] = float("-inf")
+        return MongoJSONResponse({
+            "message": "User created successfully",
+            "user": {"username": user_dict["username"], "score": user_dict["score"]}
+        })
     except HTTPException:
         raise
+    except DuplicateUserError:
+        raise HTTPException(status_code=400, detail="Username already exists")
     except Exception as e:
-        if "duplicate key" in str(e):
-            raise HTTPException(status_code=400, detail="Username already exists")
-        logger.error(f"Signup error: {e}")
+        logger.error("Signup error: %s", e)
         raise HTTPException(status_code=500, detail="Database error")
 
-@app.post("/api/login")
+@app.post("/api/login", response_model=AuthResponse)
 async def login(user: User):
     try:
-        logger.info(f"Login attempt for user: {user.username}")
-        existing_user = await db.users.find_one({"username": user.username})
+        logger.info("Login attempt for user: %s", user.username, extra={"event": "login_attempt"})
+        existing_user = await user_store.find_user(user.username, PUBLIC_USER_PROJECTION)
         if not existing_user:
-            logger.warning(f"Login failed: user {user.username} not found")
+            logger.warning("Login failed: user %s not found", user.username, extra={"event": "login_failed"})
             raise HTTPException(status_code=400, detail="User not found")
         
         # Update last login
-        await db.users.update_one(
-            {"username": user.username},
-            {"$set": {"last_login": datetime.utcnow()}}
-        )
+        await user_store.touch_last_login(user.username, datetime.utcnow())
         
-        # Serialize the user document to handle ObjectId
-        serialized_user = serialize_mongo_doc(existing_user)
-        return {"message": "Login successful", "user": serialized_user}
+        return MongoJSONResponse({"message": "Login successful", "user": existing_user})
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Login error: {e}")
+        logger.error("Login error: %s", e)
         raise HTTPException(status_code=500, detail="Database error")
 
-@app.get("/api/leaderboard")
+@app.get("/api/leaderboard", response_model=List[LeaderboardEntry])
 async def get_leaderboard():
     try:
-        users = await db.users.find(
-            {}, 
-            {"_id": 0, "username": 1, "score": 1}
-        ).sort("score", -1).limit(10).to_list(10)
-        return users
+        users = await user_store.top_users(10)
+        return MongoJSONResponse(users)
+    except Exception as e:
+        logger.error("Leaderboard error: %s", e)
+        raise HTTPException(status_code=500, detail="Database error")
+
+# Fields returned per match; _id is only read to build the next cursor
+MATCH_HISTORY_PROJECTION = {
+    "_id": 1, "game_id": 1, "players": 1, "category": 1, "outcome": 1,
+    "winner": 1, "finished_at": 1, "duration_ms": 1
+}
+
+@app.get("/api/users/{username}/matches")
+async def get_user_matches(
+    username: str,
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[str] = None
+):
+    """A player's finished matches, newest first, with keyset pagination"""
+    before = None
+    if cursor:
+        try:
+            before = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        # Fetch one extra row to learn whether another page exists
+        games = await game_store.find_player_games(username, limit + 1, before, MATCH_HISTORY_PROJECTION)
     except Exception as e:
-        logger.error(f"Leaderboard error: {e}")
+        logger.error("Match history error: %s", e)
         raise HTTPException(status_code=500, detail="Database error")
+    has_more = len(games) > limit
+    games = games[:limit]
+    next_cursor = encode_cursor(games[-1]) if has_more else None
+    for game in games:
+        del game["_id"]
+    return MongoJSONResponse({"matches": games, "next_cursor": next_cursor})
 
 @app.get("/api/categories")
 async def get_categories():
     """Get all available categories with their question counts"""
+    if "categories" in response_cache:
+        return Response(response_cache["categories"], media_type="application/json")
+    return build_categories_info()
+
+def build_categories_info() -> Dict:
     categories_info = {}
-    for category, puzzles in CATEGORY_PUZZLES.items():
+    for category, count in puzzle_catalog.counts().items():
         categories_info[category] = {
             "name": category.replace("_", " ").title(),
-            "count": len(puzzles)
+            "count": count
         }
     return {"categories": categories_info}
 
+# Declared before /api/puzzles/{category} so "search" is not taken for a category
+@app.get("/api/puzzles/search")
+async def search_puzzles(
+    q: str = Query(..., min_length=1, max_length=200),
+    category: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100)
+):
+    """Puzzles matching every term of ``q``; end a term with * to match it as a prefix"""
+    if category is not None and category not in puzzle_catalog:
+        raise HTTPException(status_code=404, detail="Category not found")
+    try:
+        found = search_index.search(q, category=category, limit=limit)
+    except QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        results = await load_search_hits(found["results"])
+    except Exception as e:
+        logger.error("Puzzle load error: %s", e)
+        raise HTTPException(status_code=500, detail="Database error")
+    return {"query": q, "results": results, "truncated": found["truncated"]}
+
+async def load_search_hits(hits: List[Dict]) -> List[Dict]:
+    """Question and answer of each hit; the index only holds positions, so one read per category version"""
+    wanted: Dict[Tuple[str, int], List[int]] = {}
+    for hit in hits:
+        wanted.setdefault((hit["category"], hit["version"]), []).append(hit["index"])
+    loaded = dict(zip(wanted, await asyncio.gather(*(
+        puzzle_catalog.get_positions(category, version, positions)
+        for (category, version), positions in wanted.items()
+    ))))
+    results = []
+    for hit in hits:
+        puzzle = loaded[hit["category"], hit["version"]].get(hit["index"])
+        if puzzle is None:
+            continue  # Its version was deleted before the index caught up
+        results.append({
+            "category": hit["category"],
+            "index": hit["index"],
+            "question": puzzle["question"],
+            "answer": puzzle["answer"],
+            "score": hit["score"]
+        })
+    return results
+
 @app.get("/api/puzzles/{category}")
 async def get_puzzles_by_category(category: str):
     """Get puzzles for a specific category"""
-    if category not in CATEGORY_PUZZLES:
+    if category not in puzzle_catalog:
         raise HTTPException(status_code=404, detail="Category not found")
-    
-    return {"category": category, "puzzles": CATEGORY_PUZZLES[category]}
+    try:
+        puzzles = await puzzle_catalog.get(category)
+    except Exception as e:
+        logger.error("Puzzle load error: %s", e)
+        raise HTTPException(status_code=500, detail="Database error")
+    return {"category": category, "puzzles": puzzles}
 
 @app.get("/api/puzzles")
 async def get_puzzles():
-    """Get all puzzles (backward compatibility)"""
-    all_puzzles = []
-    for category, puzzles in CATEGORY_PUZZLES.items():
-        for puzzle in puzzles:
-            puzzle_with_category = puzzle.copy()
-            puzzle_with_category["category"] = category
-            all_puzzles.append(puzzle_with_category)
-    return {"puzzles": all_puzzles}
+    """Get all puzzles (backward compatibility), streamed one category at a time"""
+    return StreamingResponse(stream_all_puzzles(), media_type="application/json")
+
+async def stream_all_puzzles():
+    yield b'{"puzzles":['
+    separator = b""
+    for category, pointer in list(puzzle_catalog.versions.items()):
+        # Read around the cache so a full listing does not evict what games are using
+        puzzles = puzzle_catalog.cached(category) or await puzzle_store.load_category(category, pointer["version"])
+        if puzzles:
+            yield separator + b",".join(encode_json({**puzzle, "category": category}) for puzzle in puzzles)
+            separator = b","
+    yield b"]}"
+
+@app.post("/api/admin/puzzles/import", dependencies=[Depends(require_admin)])
+async def import_puzzles(request: Request, mode: str = Query("replace")):
+    """Stream NDJSON puzzles ({"category", "question", "answer"} per line) into new
+    category versions; ``replace`` swaps a category's content, ``append`` adds to it.
+    Nothing goes live unless the whole body is valid."""
+    try:
+        categories = await puzzle_catalog.import_lines(iter_lines(request.stream()), mode)
+    except CatalogImportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Puzzle import error: %s", e)
+        raise HTTPException(status_code=500, detail="Database error")
+    logger.info("Puzzles imported: %s", categories, extra={"event": "puzzles_imported"})
+    return {"categories": categories}
 
 @app.get("/api/stats")
 async def get_stats():
     try:
-        total_users = await db.users.count_documents({})
-        total_questions = sum(len(puzzles) for puzzles in CATEGORY_PUZZLES.values())
-        return {
-            "total_users": total_users,
-            "active_games": len(active_games),
-            "connected_players": len(connected_players),
-            "waiting_players": len(waiting_players),
-            "total_categories": len(CATEGORY_PUZZLES),
-            "total_questions": total_questions
-        }
+        return await collect_stats()
     except Exception as e:
-        logger.error(f"Stats error: {e}")
+        logger.error("Stats error: %s", e)
         raise HTTPException(status_code=500, detail="Database error")
 
+@app.get("/api/stats/stream")
+async def stream_stats():
+    """Server-sent events: the current stats, then a new snapshot whenever they change"""
+    if stats_stream.frame is None:
+        try:
+            await stats_stream.refresh()
+        except Exception as e:
+            logger.error("Stats error: %s", e)
+            raise HTTPException(status_code=500, detail="Database error")
+    return StreamingResponse(
+        stats_stream.events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def collect_stats(user_count_max_age: float = 0.0) -> Dict:
+    """Server stats; the user count may be reused for up to ``user_count_max_age`` seconds"""
+    now = time.monotonic()
+    if user_count_cache["total"] is None or now - user_count_cache["counted_at"] >= user_count_max_age:
+        user_count_cache["total"] = await user_store.count_users()
+        user_count_cache["counted_at"] = now
+    # In cluster mode game state lives in the coordinator
+    game_stats = cluster_client.stats if cluster_client is not None else {
+        "active_games": len(active_games),
+        "connected_players": len(connected_players),
+        "waiting_players": len(waiting_players),
+    }
+    return {
+        "total_users": user_count_cache["total"],
+        **game_stats,
+        "total_categories": len(puzzle_catalog.versions),
+        "total_questions": puzzle_catalog.total_puzzles()
+    }
+
+@app.get("/api/db/stats", dependencies=[Depends(require_admin)])
+async def get_db_stats():
+    """Connection pool configuration, checkout wait times and per-command latency"""
+    return {**monitoring_snapshot(MONGO_CLIENT_OPTIONS), "game_history": history_writer.stats()}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus text exposition of all registered metrics"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+# Admin: user exports
+@app.get("/api/admin/export/users", dependencies=[Depends(require_admin)])
+async def export_users_endpoint(
+    export_format: str = Query("csv", alias="format"),
+    compress: bool = Query(False, alias="gzip"),
+    created_from: Optional[Union[datetime, date]] = None,
+    created_to: Optional[Union[datetime, date]] = None,
+    last_login_from: Optional[Union[datetime, date]] = None,
+    last_login_to: Optional[Union[datetime, date]] = None
+):
+    """Stream users and scores as CSV or NDJSON, optionally gzipped. Date filters
+    are half-open ranges [from, to) on created_at and last_login."""
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    ranges = {
+        "created_at": (naive_utc(created_from), naive_utc(created_to)),
+        "last_login": (naive_utc(last_login_from), naive_utc(last_login_to)),
+    }
+    for field, (start, end) in ranges.items():
+        if start is not None and end is not None and start >= end:
+            raise HTTPException(status_code=400, detail=f"Empty {field} range")
+    filename = f"users-{datetime.utcnow():%Y%m%dT%H%M%S}.{export_format}" + (".gz" if compress else "")
+    return StreamingResponse(
+        export_users(user_store, export_format, ranges, compress, EXPORT_BATCH_SIZE),
+        media_type="application/gzip" if compress else EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"}
+    )
+
+# Admin: profiling
+@app.post("/api/admin/profile/start", dependencies=[Depends(require_admin)])
+async def start_profile(request: ProfileRequest):
+    """Profile a route or WebSocket message type for N seconds or N requests"""
+    if request.mode not in PROFILE_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(PROFILE_MODES)}")
+    route_pattern = None
+    if request.route:
+        route = next((r for r in app.routes if getattr(r, "path", None) == request.route), None)
+        if route is None:
+            raise HTTPException(status_code=404, detail="Route not found")
+        route_pattern = route.path_regex
+    try:
+        return profiler.start(
+            mode=request.mode,
+            route=request.route,
+            route_pattern=route_pattern,
+            ws_type=request.ws_type,
+            seconds=request.seconds,
+            max_requests=request.requests,
+            interval=request.interval_ms / 1000
+        )
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.post("/api/admin/profile/stop", dependencies=[Depends(require_admin)])
+async def stop_profile():
+    result = profiler.stop()
+    if result is None:
+        raise HTTPException(status_code=400, detail="No profiling session is running")
+    return result
+
+@app.get("/api/admin/profile", dependencies=[Depends(require_admin)])
+async def get_profile_status():
+    return {**profiler.status(), "files": profiler.list_files()}
+
+@app.get("/api/admin/profile/files/{name}", dependencies=[Depends(require_admin)])
+async def download_profile(name: str):
+    path = profiler.file_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=name, media_type="application/octet-stream")
+
+def memory_structures() -> Dict:
+    """The structures that grow with load, by name"""
+    return {
+        "connected_players": connected_players,
+        "active_games": active_games,
+        "player_games": player_games,
+        "waiting_players": waiting_players,
+        "lobbies": lobbies,
+        "puzzle_cache": puzzle_catalog.cache,
+        "generated_puzzles": puzzle_pool.queues,
+        "response_cache": response_cache,
+    }
+
+def measure_structures(structures: Dict, index: PuzzleSearchIndex, sample: int) -> Dict:
+    """``measure`` for each structure, run in a worker thread; the search index is sized exactly"""
+    # The app and its routes are reachable from every socket's scope; count sockets, not the app
+    measured = {
+        name: measure(structure, sample, opaque=(FastAPI, Router, BaseRoute))
+        for name, structure in structures.items()
+    }
+    # Never mutated, and too big to walk: its arrays are sized directly. It holds
+    # no puzzles, so loaded puzzles are counted under puzzle_cache and active_games
+    measured["search_index"] = {
+        "count": len(index), "bytes": index.memory_bytes(), "sampled": None, "truncated": False
+    }
+    return measured
+
+@app.get("/api/admin/loop", dependencies=[Depends(require_admin)])
+async def get_loop_stats():
+    """Worst event-loop lag so far, stall count and the stack captured at the last stall"""
+    return loop_monitor.stats()
+
+@app.get("/api/admin/memory", dependencies=[Depends(require_admin)])
+async def get_memory(sample: int = Query(200, ge=1, le=10000)):
+    """Element counts and approximate deep sizes of the live structures"""
+    # Off the loop: a big sample over deep structures takes a while
+    structures = await asyncio.to_thread(measure_structures, memory_structures(), search_index, sample)
+    return {
+        "rss_bytes": resident_memory_bytes(),
+        "structures": structures,
+        "gc": {"counts": gc.get_count(), "frozen": gc.get_freeze_count()},
+        "tracemalloc": allocation_tracer.status()
+    }
+
+class MemoryTraceRequest(BaseModel):
+    frames: int = Field(default=1, ge=1, le=64)
+
+@app.post("/api/admin/memory/trace/start", dependencies=[Depends(require_admin)])
+async def start_memory_trace(request: MemoryTraceRequest):
+    """Turn on tracemalloc and take the baseline snapshot"""
+    try:
+        return await asyncio.to_thread(allocation_tracer.start, request.frames)
+    except TracerError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.post("/api/admin/memory/trace/snapshot", dependencies=[Depends(require_admin)])
+async def take_memory_snapshot(
+    limit: int = Query(20, ge=1, le=500),
+    group_by: str = Query("lineno"),
+    compare_to: str = Query("start")
+):
+    """Top allocation sites by growth since the trace started, or since the previous snapshot"""
+    try:
+        return await asyncio.to_thread(allocation_tracer.snapshot, limit, group_by, compare_to)
+    except TracerError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/api/admin/memory/trace/stop", dependencies=[Depends(require_admin)])
+async def stop_memory_trace():
+    try:
+        return allocation_tracer.stop()
+    except TracerError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+class StorageFaults(BaseModel):
+    latency_ms: Optional[float] = Field(default=None, ge=0)
+    jitter_ms: Optional[float] = Field(default=None, ge=0)
+    error_rate: Optional[float] = Field(default=None, ge=0, le=1)
+
+# Admin: fault injection for the in-memory store
+@app.put("/api/admin/storage/faults", dependencies=[Depends(require_admin)])
+async def set_storage_faults(faults: StorageFaults):
+    """Tune injected latency, jitter and error rate at runtime"""
+    if not isinstance(user_store, InMemoryUserStore):
+        raise HTTPException(status_code=400, detail="Fault injection requires STORAGE_BACKEND=memory")
+    for name, value in faults.dict(exclude_none=True).items():
+        setattr(user_store.faults, name, value)
+    return user_store.faults.settings()
+
+class LogRule(BaseModel):
+    sample_rate: float = Field(default=1.0, ge=0, le=1)
+    rate_per_second: Optional[float] = Field(default=None, ge=0)
+    burst: Optional[float] = Field(default=None, ge=1)
+
+class LoggingSettings(BaseModel):
+    level: Optional[str] = None
+    rules: Optional[Dict[str, LogRule]] = None  # Replaces all rules when given
+
+# Admin: log level and per-event sampling
+@app.get("/api/admin/logging", dependencies=[Depends(require_admin)])
+async def get_logging_settings():
+    return log_pipeline.settings()
+
+@app.put("/api/admin/logging", dependencies=[Depends(require_admin)])
+async def set_logging_settings(settings: LoggingSettings):
+    """Change the root log level and event sampling rules at runtime"""
+    if settings.level is not None and not isinstance(logging.getLevelName(settings.level.upper()), int):
+        raise HTTPException(status_code=400, detail="Unknown log level")
+    rules = None
+    if settings.rules is not None:
+        rules = parse_rules({event: rule.dict(exclude_none=True) for event, rule in settings.rules.items()})
+    log_pipeline.configure(level=settings.level, rules=rules)
+    return log_pipeline.settings()
+
 # WebSocket for real-time game
 @app.websocket("/ws/{username}")
 async def websocket_endpoint(websocket: WebSocket, username: str):
     await websocket.accept()
+    if COORDINATOR_SOCKET and cluster_client is None:
+        # Cluster worker still connecting to the coordinator
+        await websocket.close(code=1013)
+        return
     connected_players[username] = websocket
-    logger.info(f"✅ WebSocket connected for user: {username}")
+    logger.info("✅ WebSocket connected for user: %s", username, extra={"event": "ws_connected"})
     
+    # Bind the client once so the loop and cleanup use the same coordinator link
+    coordinator = cluster_client
     try:
+        if coordinator is not None:
+            await coordinator.connect_player(username)
+        
         # Send welcome message
         await websocket.send_text(json.dumps({
             "type": "connected",
@@ -1760,197 +2425,602 @@ async def websocket_endpoint(websocket: WebSocket, username: str):
         
         while True:
             data = await websocket.receive_text()
-            try:
-                message = json.loads(data)
-                
-                if message["type"] == "find_match":
-                    category = message.get("category", "general_knowledge")
-                    await handle_matchmaking(username, websocket, category)
-                elif message["type"] == "submit_answer":
-                    await handle_answer(username, message.get("answer", ""), websocket)
-                elif message["type"] == "cancel_search":
-                    await handle_cancel_search(username, websocket)
-                else:
-                    await websocket.send_text(json.dumps({
-                        "type": "error",
-                        "message": "Unknown message type"
-                    }))
-                    
-            except json.JSONDecodeError:
-                await websocket.send_text(json.dumps({
-                    "type": "error",
-                    "message": "Invalid JSON format"
-                }))
+            if coordinator is not None:
+                await coordinator.forward(username, data)
+            else:
+                await handle_ws_text(username, websocket, data)
                 
     except WebSocketDisconnect:
-        logger.info(f"WebSocket disconnected for user: {username}")
+        logger.info("WebSocket disconnected for user: %s", username, extra={"event": "ws_disconnected"})
     except Exception as e:
-        logger.error(f"WebSocket error for {username}: {e}")
+        logger.error("WebSocket error for %s: %s", username, e)
     finally:
-        await cleanup_player(username)
+        if coordinator is None:
+            # A newer connection for the same user may have replaced this one
+            if connected_players.get(username) is websocket:
+                await cleanup_player(username)
+        elif connected_players.get(username) is websocket:
+            del connected_players[username]
+            try:
+                await coordinator.disconnect_player(username)
+            except ConnectionError:
+                pass
+
+@app.websocket("/ws/spectate/{game_id}")
+async def spectate_endpoint(websocket: WebSocket, game_id: str):
+    """Watch a live game: its state, then game_start, attempts and game_end frames"""
+    await websocket.accept()
+    actor = active_games.get(game_id)
+    if actor is None:
+        # In cluster mode games live in the coordinator, so workers cannot find them
+        message = "Spectating is not available in cluster mode" if COORDINATOR_SOCKET else "Game not found"
+        await websocket.send_text(json.dumps({"type": "error", "message": message}))
+        await websocket.close(code=1008)
+        return
+    
+    subscription = spectators.subscribe(game_id)
+    subscription.push(actor.frame(actor.snapshot()))
+    
+    async def watch_for_close():
+        # Spectators only listen; anything they send is ignored
+        try:
+            while True:
+                await websocket.receive_text()
+        except Exception:
+            subscription.close()
+    
+    receiver = asyncio.create_task(watch_for_close())
+    try:
+        while True:
+            frames = await subscription.next_frames()
+            if not frames:
+                break
+            for frame in frames:
+                await websocket.send_text(frame)
+        if not receiver.done():
+            await websocket.close()
+    except Exception as e:
+        logger.info("Spectator of %s disconnected: %s", game_id, e, extra={"event": "spectator_disconnected"})
+    finally:
+        receiver.cancel()
+        spectators.unsubscribe(subscription)
+
+async def handle_ws_text(username: str, websocket: WebSocket, data: str):
+    """Parse, dispatch and time one inbound WebSocket text frame"""
+    started = time.perf_counter()
+    message_type = "invalid_json"
+    try:
+        message = json.loads(data)
+        message_type = message["type"]
+        
+        if profiler.active and profiler.in_scope("ws", message_type):
+            with profiler.capture():
+                await dispatch_message(username, websocket, message_type, message)
+        else:
+            await dispatch_message(username, websocket, message_type, message)
+            
+    except json.JSONDecodeError:
+        await websocket.send_text(json.dumps({
+            "type": "error",
+            "message": "Invalid JSON format"
+        }))
+    
+    if not isinstance(message_type, str) or message_type not in WS_MESSAGE_TYPES:
+        message_type = "unknown"
+    WS_MESSAGE_LATENCY.labels(message_type).observe(time.perf_counter() - started)
+
+async def dispatch_message(username: str, websocket: WebSocket, message_type: str, message: Dict):
+    """Route an inbound WebSocket message to its handler"""
+    if message_type == "find_match":
+        category = message.get("category", "general_knowledge")
+        await handle_matchmaking(
+            username, websocket, category,
+            room_size=message.get("room_size", MIN_ROOM_SIZE),
+            scoring=message.get("scoring", "first_correct")
+        )
+    elif message_type == "submit_answer":
+        await handle_answer(username, message.get("answer", ""), websocket)
+    elif message_type == "cancel_search":
+        await handle_cancel_search(username, websocket)
+    elif message_type == "subscribe_leaderboard":
+        await leaderboard.subscribe(username, websocket)
+    elif message_type == "unsubscribe_leaderboard":
+        leaderboard.unsubscribe(username)
+    else:
+        await websocket.send_text(json.dumps({
+            "type": "error",
+            "message": "Unknown message type"
+        }))
 
 async def cleanup_player(username: str):
     """Clean up player data when they disconnect"""
     if username in connected_players:
         del connected_players[username]
     
-    if username in waiting_players:
-        del waiting_players[username]
+    leave_lobby(username)
+    leaderboard.unsubscribe(username)
         
-    # Remove player from any active games
-    for game_id, game in list(active_games.items()):
-        if username in game.players:
-            del active_games[game_id]
-            # Notify other players
-            for player in game.players:
-                if player != username and player in connected_players:
-                    try:
-                        await connected_players[player].send_text(json.dumps({
-                            "type": "opponent_disconnected",
-                            "message": "Your opponent disconnected"
-                        }))
-                    except Exception as e:
-                        logger.error(f"Error notifying player {player}: {e}")
+    # The game's actor ends it or lets the rest of the room carry on
+    actor = active_games.get(player_games.get(username))
+    if actor is not None:
+        actor.post(("disconnect", username))
 
 async def handle_cancel_search(username: str, websocket: WebSocket):
     """Handle when player cancels matchmaking"""
-    if username in waiting_players:
-        del waiting_players[username]
+    if leave_lobby(username):
         await websocket.send_text(json.dumps({
             "type": "search_cancelled",
             "message": "Matchmaking cancelled"
         }))
 
-async def handle_matchmaking(username: str, websocket: WebSocket, category: str):
-    """Handle matchmaking logic with category support"""
-    if category not in CATEGORY_PUZZLES:
+def join_lobby(username: str, websocket: WebSocket, category: str, room_size: int, scoring: str) -> Lobby:
+    key = (category, room_size, scoring)
+    lobby = lobbies.get(key)
+    if lobby is None:
+        lobby = lobbies[key] = Lobby(category, room_size, scoring)
+        if room_size > MIN_ROOM_SIZE and ROOM_FILL_TIMEOUT_SECONDS > 0:
+            lobby.timer = asyncio.get_running_loop().call_later(ROOM_FILL_TIMEOUT_SECONDS, expire_lobby, lobby)
+    lobby.members[username] = websocket
+    waiting_players[username] = {
+        "category": category,
+        "timestamp": datetime.utcnow(),
+        "queued_at": time.monotonic(),
+        "lobby": lobby
+    }
+    return lobby
+
+def leave_lobby(username: str) -> bool:
+    info = waiting_players.pop(username, None)
+    if info is None:
+        return False
+    lobby = info["lobby"]
+    lobby.members.pop(username, None)
+    if not lobby.members:
+        close_lobby(lobby)
+    return True
+
+def close_lobby(lobby: Lobby):
+    if lobby.timer is not None:
+        lobby.timer.cancel()
+    if lobbies.get(lobby.key) is lobby:
+        del lobbies[lobby.key]
+
+def expire_lobby(lobby: Lobby):
+    """Fill timeout: start now if there are enough players, otherwise on the next join"""
+    lobby.timer = None
+    lobby.expired = True
+    if lobby.ready:
+        start_room(lobby)
+
+def start_room(lobby: Lobby):
+    """Turn a lobby into a game; its actor announces game_start"""
+    close_lobby(lobby)
+    players = list(lobby.members)
+    game_id = f"game_{next(game_counter)}_{'_'.join(players[:2])}"
+    now = time.monotonic()
+    for player in players:
+        MATCHMAKING_WAIT.labels(lobby.category).observe(now - waiting_players.pop(player)["queued_at"])
+    
+    # Generated categories take a ready puzzle; others pick from the cached catalog.
+    # If the category was evicted meanwhile, the actor loads one before announcing.
+    puzzle, puzzle_id = puzzle_pool.take(lobby.category), ""
+    if puzzle is not None:
+        puzzle_id = f"{lobby.category}:generated:{puzzle['template']}"
+    else:
+        picked = puzzle_catalog.pick(lobby.category)
+        if picked is not None:
+            puzzle_id, puzzle = picked
+    
+    # Create game session, owned from here on by its actor
+    GameActor(game_id, GameSession(
+        players=players,
+        category=lobby.category,
+        current_puzzle=puzzle,
+        puzzle_id=puzzle_id,
+        scoring=lobby.scoring
+    )).start()
+    logger.info("Game started: %s with category %s", game_id, lobby.category, extra={"event": "game_started"})
+
+async def handle_matchmaking(username: str, websocket: WebSocket, category: str,
+                             room_size: int = MIN_ROOM_SIZE, scoring: str = "first_correct"):
+    """Handle matchmaking logic with category, room size and scoring support"""
+    if category not in puzzle_catalog:
         await websocket.send_text(json.dumps({
             "type": "error",
             "message": "Invalid category selected"
         }))
         return
     
-    # Look for existing waiting player in the same category
-    waiting_opponent = None
-    for waiting_username, waiting_info in waiting_players.items():
-        if (waiting_info["category"] == category and 
-            waiting_username != username and 
-            waiting_username in connected_players):
-            waiting_opponent = waiting_username
-            break
+    # Load the category now so start_room finds it cached
+    try:
+        await puzzle_catalog.get(category)
+    except Exception as e:
+        logger.error("Puzzle load error: %s", e)
+        await websocket.send_text(json.dumps({
+            "type": "error",
+            "message": "Could not load puzzles, please try again"
+        }))
+        return
     
-    if waiting_opponent:
-        # Match found! Create game
-        game_id = f"game_{len(active_games) + 1}_{username}_{waiting_opponent}"
-        
-        # Remove from waiting
-        del waiting_players[waiting_opponent]
-        if username in waiting_players:
-            del waiting_players[username]
-        
-        # Select random puzzle from category
-        puzzle = random.choice(CATEGORY_PUZZLES[category])
-        
-        # Create game session
-        active_games[game_id] = GameSession(
-            players=[username, waiting_opponent],
-            category=category,
-            current_puzzle=puzzle
-        )
-        
-        # Notify both players
-        for player in [username, waiting_opponent]:
-            if player in connected_players:
-                try:
-                    await connected_players[player].send_text(json.dumps({
-                        "type": "game_start",
-                        "game_id": game_id,
-                        "category": category,
-                        "puzzle": puzzle["question"],
-                        "opponent": waiting_opponent if player == username else username
-                    }))
-                except Exception as e:
-                    logger.error(f"Error starting game for {player}: {e}")
-        
-        logger.info(f"Game started: {game_id} with category {category}")
+    if not isinstance(room_size, int) or not MIN_ROOM_SIZE <= room_size <= MAX_ROOM_SIZE or scoring not in SCORING_MODES:
+        await websocket.send_text(json.dumps({
+            "type": "error",
+            "message": f"room_size must be {MIN_ROOM_SIZE}-{MAX_ROOM_SIZE} and scoring one of {', '.join(SCORING_MODES)}"
+        }))
+        return
+    
+    if username in player_games:
+        await websocket.send_text(json.dumps({
+            "type": "error",
+            "message": "You are already in a game"
+        }))
+        return
+    
+    # A new search replaces any earlier one
+    leave_lobby(username)
+    lobby = join_lobby(username, websocket, category, room_size, scoring)
+    
+    if lobby.ready:
+        start_room(lobby)
     else:
-        # No match found, add to waiting
-        waiting_players[username] = {
-            "category": category,
-            "timestamp": datetime.utcnow()
-        }
-        
         await websocket.send_text(json.dumps({
             "type": "waiting_for_opponent",
             "category": category,
+            "room_size": room_size,
+            "players_waiting": len(lobby.members),
             "message": f"Searching for opponent in {category.replace('_', ' ').title()}..."
         }))
         
-        logger.info(f"Player {username} waiting for match in category {category}")
+        logger.info("Player %s waiting for match in category %s", username, category, extra={"event": "match_waiting"})
 
 async def handle_answer(username: str, answer: str, websocket: WebSocket):
     """Handle answer submission"""
-    # Find user's game
-    user_game = None
-    game_id = None
-    
-    for gid, game in active_games.items():
-        if username in game.players:
-            user_game = game
-            game_id = gid
-            break
-    
-    if not user_game:
+    actor = active_games.get(player_games.get(username))
+    if actor is None:
         await websocket.send_text(json.dumps({
             "type": "error",
             "message": "No active game found"
         }))
         return
-    
-    # Check answer
-    correct_answer = user_game.current_puzzle["answer"]
-    
-    if answer.lower().strip() == correct_answer.lower():
-        user_game.winner = username
+    actor.post(("answer", username, answer, websocket))
+
+class GameActor:
+    """Owns the state of one live game.
+
+    Answers, disconnects and the timeout are posted to the mailbox and
+    handled one at a time by the game's own task. The outcome is settled
+    (and the game unregistered) before the first await, so a game ends
+    exactly once however its events race, without any locks.
+
+    Frames going to several players are encoded once and sent to all of
+    them concurrently.
+    """
+
+    def __init__(self, game_id: str, session: GameSession, timeout: Optional[float] = None):
+        self.game_id = game_id
+        self.session = session
+        self.timeout = GAME_TIMEOUT_SECONDS if timeout is None else timeout
+        self.mailbox: asyncio.Queue = asyncio.Queue()
+        self.outcome: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+        self.present: Dict[str, None] = dict.fromkeys(session.players)  # Players who have not left
+
+    def start(self):
+        active_games[self.game_id] = self
+        for player in self.session.players:
+            player_games[player] = self.game_id
+        self.task = asyncio.create_task(self.run())
+
+    def post(self, event: Tuple):
+        self.mailbox.put_nowait(event)
+
+    async def run(self):
+        timer = None
+        if self.timeout > 0:
+            timer = asyncio.get_running_loop().call_later(self.timeout, self.post, ("timeout",))
+        try:
+            if self.session.current_puzzle is None:
+                try:
+                    self.session.puzzle_id, self.session.current_puzzle = await puzzle_catalog.random_puzzle(
+                        self.session.category
+                    )
+                except Exception as e:
+                    logger.error("Could not load a puzzle for game %s: %s", self.game_id, e)
+                    self.outcome = "error"
+                    await self.broadcast(json.dumps({"type": "error", "message": "Could not load puzzles, please try again"}))
+                    return
+            await self.announce()
+            while self.outcome is None:
+                event = await self.mailbox.get()
+                try:
+                    await self.handle(event)
+                except Exception as e:
+                    logger.error("Error in game %s handling %s: %s", self.game_id, event[0], e)
+            # Answers that arrived while the game was ending
+            while not self.mailbox.empty():
+                event = self.mailbox.get_nowait()
+                if event[0] == "answer":
+                    await self.send(event[3], json.dumps({"type": "error", "message": "No active game found"}))
+        finally:
+            if timer is not None:
+                timer.cancel()
+            self.unregister()
+            spectators.close(self.game_id)
+
+    async def handle(self, event: Tuple):
+        kind = event[0]
+        if kind == "answer":
+            _, username, answer, websocket = event
+            if username in self.present:
+                await self.answer(username, answer, websocket)
+        elif kind == "disconnect":
+            await self.leave(event[1])
+        elif kind == "timeout":
+            await self.expire()
+
+    def settle(self, outcome: str, winner: Optional[str] = None, left: Optional[str] = None):
+        self.outcome = outcome
+        self.session.winner = winner
+        self.unregister()
+        if spectators.has_subscribers(self.game_id):
+            game = self.session
+            spectators.close(self.game_id, self.frame({
+                "type": "game_end",
+                "outcome": outcome,
+                "winner": winner,
+                "left": left,
+                "correct_answer": game.current_puzzle["answer"],
+                "wrong_attempts": game.wrong_attempts,
+                "standings": self.standings() if game.scoring == "ranked" else None
+            }))
+
+    def publish(self, payload: Dict):
+        """Send a frame to this game's spectators, encoding it only if someone is watching"""
+        if spectators.has_subscribers(self.game_id):
+            spectators.publish(self.game_id, self.frame(payload))
+
+    def snapshot(self) -> Dict:
+        """Current state, sent to a spectator when they start watching"""
+        game = self.session
+        return {
+            "type": "spectate_start",
+            "puzzle": game.current_puzzle["question"] if game.current_puzzle else None,
+            "players": game.players,
+            "present": list(self.present),
+            "wrong_attempts": game.wrong_attempts,
+            "finishers": game.finishers,
+            "elapsed_seconds": round(time.monotonic() - game.started_at, 3)
+        }
+
+    def unregister(self):
+        if active_games.get(self.game_id) is self:
+            del active_games[self.game_id]
+        for player in self.session.players:
+            if player_games.get(player) == self.game_id:
+                del player_games[player]
+
+    async def send(self, websocket, text: str):
+        try:
+            await websocket.send_text(text)
+        except Exception as e:
+            logger.error("Error sending to a player in game %s: %s", self.game_id, e)
+
+    async def fan_out(self, sends: List[Tuple[WebSocket, str]]):
+        """Send concurrently, so one slow socket does not hold up the rest of the room;
+        a duel's two frames are cheaper to send one after the other"""
+        if len(sends) <= 2:
+            for websocket, text in sends:
+                await self.send(websocket, text)
+        else:
+            await asyncio.gather(*(self.send(websocket, text) for websocket, text in sends))
+
+    def recipients(self, exclude: Optional[str] = None) -> List[WebSocket]:
+        sockets = []
+        for player in self.present:
+            websocket = connected_players.get(player)
+            if player != exclude and websocket is not None:
+                sockets.append(websocket)
+        return sockets
+
+    async def broadcast(self, text: str, exclude: Optional[str] = None):
+        """Send one encoded frame to every player still in the game"""
+        await self.fan_out([(websocket, text) for websocket in self.recipients(exclude)])
+
+    def frame(self, payload: Dict) -> str:
+        game = self.session
+        return json.dumps({
+            "game_id": self.game_id,
+            "category": game.category,
+            "scoring": game.scoring,
+            **payload
+        })
+
+    async def announce(self):
+        game = self.session
+        base = {"type": "game_start", "puzzle": game.current_puzzle["question"], "players": game.players}
+        self.publish(base)
+        if len(game.players) == 2:
+            # A duel names the opponent, as two-player clients expect
+            first, second = game.players
+            await self.fan_out([
+                (connected_players[player], self.frame({**base, "opponent": opponent}))
+                for player, opponent in ((first, second), (second, first)) if player in connected_players
+            ])
+        else:
+            await self.broadcast(self.frame({**base, "opponent": f"{len(game.players) - 1} players"}))
+
+    async def answer(self, username: str, answer: str, websocket: WebSocket):
+        game = self.session
+        correct_answer = game.current_puzzle["answer"]
+        
+        if username in game.finishers:
+            return
+        if answer.lower().strip() != correct_answer.lower():
+            game.wrong_attempts[username] = game.wrong_attempts.get(username, 0) + 1
+            self.publish({"type": "attempts", "username": username, "wrong_attempts": game.wrong_attempts})
+            await self.send(websocket, json.dumps({
+                "type": "wrong_answer",
+                "message": "Wrong answer! Try again.",
+                "hint": f"The answer should be {len(correct_answer)} characters long"
+            }))
+            return
+        
+        if game.scoring == "ranked":
+            await self.finish(username, websocket)
+            return
+        
+        self.settle("won", winner=username)
+        GAME_DURATION.labels(game.category).observe(time.monotonic() - game.started_at)
         
         # Calculate points based on category difficulty
-        points = get_points_for_category(user_game.category)
+        points = get_points_for_category(game.category)
         
         # Update score in database
         try:
-            await db.users.update_one(
-                {"username": username},
-                {"$inc": {"score": points}}
-            )
+            score = await user_store.increment_score(username, points)
+            if score is not None:
+                leaderboard.update(username, score)
         except Exception as e:
-            logger.error(f"Error updating score: {e}")
+            logger.error("Error updating score: %s", e)
         
-        # Notify both players
-        for player in user_game.players:
-            if player in connected_players:
-                is_winner = player == username
-                try:
-                    await connected_players[player].send_text(json.dumps({
-                        "type": "game_end",
-                        "winner": username,
-                        "correct_answer": correct_answer,
-                        "is_winner": is_winner,
-                        "points": points if is_winner else 0,
-                        "category": user_game.category,
-                        "message": f"You won! +{points} points" if is_winner else f"{username} won! (+{points} points)"
-                    }))
-                except Exception as e:
-                    logger.error(f"Error sending game end message to {player}: {e}")
+        # Notify every player: one frame for the winner, one shared by everyone else
+        result = {
+            "type": "game_end",
+            "winner": username,
+            "correct_answer": correct_answer,
+        }
+        others = self.frame({
+            **result, "is_winner": False, "points": 0, "message": f"{username} won! (+{points} points)"
+        })
+        await self.fan_out([(websocket, self.frame({
+            **result, "is_winner": True, "points": points, "message": f"You won! +{points} points"
+        }))] + [(other, others) for other in self.recipients(exclude=username)])
         
-        # Clean up game
-        del active_games[game_id]
-        logger.info(f"Game ended: {game_id}, winner: {username}")
-    else:
-        await websocket.send_text(json.dumps({
-            "type": "wrong_answer",
-            "message": "Wrong answer! Try again.",
-            "hint": f"The answer should be {len(correct_answer)} characters long"
+        await history_writer.record(game_history_record(self.game_id, game, "won"))
+        logger.info("Game ended: %s, winner: %s", self.game_id, username, extra={"event": "game_ended"})
+
+    async def finish(self, username: str, websocket: WebSocket):
+        """Ranked scoring: record the player's place; the round ends when everyone is done"""
+        game = self.session
+        rank = len(game.finishers)
+        game.finishers.append(username)
+        points = ranked_points(get_points_for_category(game.category), rank, len(game.players))
+        finished = self.frame({"type": "player_finished", "username": username, "rank": rank + 1})
+        spectators.publish(self.game_id, finished)  # Before settle() closes the topic with game_end
+        if not self.unfinished():
+            self.settle("won", winner=game.finishers[0])
+        
+        if points:
+            try:
+                score = await user_store.increment_score(username, points)
+                if score is not None:
+                    leaderboard.update(username, score)
+            except Exception as e:
+                logger.error("Error updating score: %s", e)
+        await self.fan_out([(websocket, self.frame({
+            "type": "finished", "rank": rank + 1, "points": points,
+            "message": f"Correct! You finished #{rank + 1} (+{points} points)"
+        }))] + [(other, finished) for other in self.recipients(exclude=username)])
+        if self.outcome is not None:
+            await self.end_ranked()
+
+    async def end_ranked(self):
+        game = self.session
+        GAME_DURATION.labels(game.category).observe(time.monotonic() - game.started_at)
+        winner = game.finishers[0] if game.finishers else None
+        await self.broadcast(self.frame({
+            "type": "game_end",
+            "winner": winner,
+            "correct_answer": game.current_puzzle["answer"],
+            "standings": self.standings(),
+            "message": f"Round over! {winner} finished first" if winner else "Round over! Nobody solved the puzzle."
+        }))
+        await history_writer.record(game_history_record(self.game_id, game, self.outcome))
+        logger.info("Game ended: %s, winner: %s", self.game_id, winner, extra={"event": "game_ended"})
+
+    def unfinished(self) -> int:
+        """Players still in the game who have not answered correctly"""
+        return sum(1 for player in self.present if player not in self.session.finishers)
+
+    def standings(self) -> List[Dict]:
+        game = self.session
+        points = get_points_for_category(game.category)
+        return [
+            {"username": player, "rank": rank + 1, "points": ranked_points(points, rank, len(game.players))}
+            for rank, player in enumerate(game.finishers)
+        ]
+
+    async def leave(self, username: str):
+        if username not in self.present:
+            return
+        del self.present[username]
+        game = self.session
+        remaining = len(self.present)
+        
+        if game.scoring == "ranked" and game.finishers and (not self.unfinished() or remaining < MIN_ROOM_SIZE):
+            # Everyone still here has finished, or too few are left to go on
+            self.settle("won", winner=game.finishers[0])
+            await self.end_ranked()
+        elif remaining < MIN_ROOM_SIZE:
+            self.settle("abandoned", left=username)
+            await history_writer.record(game_history_record(self.game_id, game, "abandoned", left=username))
+            # Notify other players
+            await self.broadcast(json.dumps({
+                "type": "opponent_disconnected",
+                "message": "Your opponent disconnected"
+            }))
+        else:
+            left = self.frame({"type": "player_left", "username": username, "players_remaining": remaining})
+            spectators.publish(self.game_id, left)
+            await self.broadcast(left)
+
+    async def expire(self):
+        game = self.session
+        if game.scoring == "ranked" and game.finishers:
+            self.settle("won", winner=game.finishers[0])
+            await self.end_ranked()
+            return
+        self.settle("timeout")
+        GAME_DURATION.labels(game.category).observe(time.monotonic() - game.started_at)
+        await self.broadcast(self.frame({
+            "type": "game_end",
+            "winner": None,
+            "correct_answer": game.current_puzzle["answer"],
+            "is_winner": False,
+            "points": 0,
+            "message": "Time's up! Nobody solved the puzzle."
         }))
+        await history_writer.record(game_history_record(self.game_id, game, "timeout"))
+        logger.info("Game timed out: %s", self.game_id, extra={"event": "game_timeout"})
+
+def ranked_points(points: int, rank: int, players: int) -> int:
+    """Full points for first place, falling linearly to zero for last"""
+    return round(points * (players - 1 - rank) / (players - 1))
+
+def game_history_record(game_id: str, game: GameSession, outcome: str, left: Optional[str] = None) -> Dict:
+    """Document stored in the games collection for a finished game"""
+    finished_at = datetime.utcnow()
+    return {
+        "game_id": game_id,
+        "players": list(game.players),
+        "category": game.category,
+        "puzzle_id": game.puzzle_id,
+        "outcome": outcome,
+        "scoring": game.scoring,
+        "winner": game.winner,
+        "left": left,
+        "started_at": game.created_at,
+        "finished_at": finished_at,
+        "duration_ms": round((time.monotonic() - game.started_at) * 1000),
+        "participants": [
+            {
+                "username": player,
+                "wrong_attempts": game.wrong_attempts.get(player, 0),
+                "rank": game.finishers.index(player) + 1 if player in game.finishers else None
+            }
+            for player in game.players
+        ],
+    }
 
 def get_points_for_category(category: str) -> int:
     """Return points based on category difficulty"""
@@ -1977,5 +3047,7 @@ def get_points_for_category(category: str) -> int:
     return difficulty_points.get(category, 10)
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Hand over to the launcher in a fresh interpreter, so workers and the coordinator
+    # import this module once, as "main", rather than again next to "__main__"
+    launcher_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "launcher.py")
+    os.execv(sys.executable, [sys.executable, launcher_path, *sys.argv[1:]])
\ No newline at end of file
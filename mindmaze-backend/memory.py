@@ -0,0 +1,176 @@
+"""Runtime memory introspection for the live game structures.
+
+``measure`` reports the element count and an approximate deep size of one
+structure. It walks a sample of the elements, following containers,
+instance ``__dict__`` and ``__slots__``, and extrapolates from the sample,
+so the cost does not grow with the structure. The sample is taken in one
+C-level step, so ``measure`` can run in a worker thread while the event
+loop keeps changing the structure. Objects shared across the
+process (the event loop, tasks, functions, classes, modules, enum members
+and anything in ``opaque``) are counted shallow and never entered. Memory
+shared between structures, such as the puzzle of a running game that is
+also in the catalog cache, is counted in each.
+
+``AllocationTracer`` turns ``tracemalloc`` on only while an admin asks for
+it. Each snapshot is compared with the one taken at start, or with the
+previous one, and the top allocation sites are returned. Tracing slows
+every allocation down, so it is off by default and ``stop`` turns it off
+again.
+"""
+import asyncio
+import enum
+import itertools
+import sys
+import threading
+import tracemalloc
+import types
+from collections import deque
+from collections.abc import Mapping
+from typing import Dict, List, Optional, Tuple
+
+GROUP_BY = ("lineno", "filename", "traceback")
+COMPARE_TO = ("start", "previous")
+
+# Never walked into: they reach the whole process
+SHARED_TYPES = (
+    type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType,
+    types.CodeType, types.FrameType, types.CoroutineType, types.GeneratorType,
+    asyncio.AbstractEventLoop, asyncio.Future, asyncio.Handle, asyncio.BaseTransport, threading.Thread, enum.Enum,
+)
+SEQUENCE_TYPES = (list, tuple, set, frozenset, deque)
+
+
+class TracerError(RuntimeError):
+    pass
+
+
+def deep_size(obj, seen: set, opaque: Tuple[type, ...] = (), max_objects: int = 10_000) -> Tuple[int, bool]:
+    """Bytes reachable from ``obj`` and not in ``seen``; True if ``max_objects`` cut it short"""
+    size = 0
+    visited = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+        visited += 1
+        if visited >= max_objects:
+            return size, True
+        if isinstance(current, (str, bytes, int, float, bool)) or isinstance(current, SHARED_TYPES + opaque):
+            continue
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, SEQUENCE_TYPES):
+            stack.extend(current)
+        instance_dict = getattr(current, "__dict__", None)
+        if isinstance(instance_dict, dict):
+            stack.append(instance_dict)
+        for cls in type(current).__mro__:
+            for slot in cls.__dict__.get("__slots__", ()):
+                if slot not in ("__dict__", "__weakref__") and hasattr(current, slot):
+                    stack.append(getattr(current, slot))
+    return size, False
+
+
+def measure(structure, sample: int = 200, opaque: Tuple[type, ...] = (), max_objects: int = 10_000) -> Dict:
+    """Element count and approximate deep size of ``structure``"""
+    seen = {id(structure)}
+    shallow = sys.getsizeof(structure)
+    try:
+        count = len(structure)
+    except TypeError:
+        count = None
+    if isinstance(structure, Mapping):
+        elements = list(itertools.islice(itertools.chain.from_iterable(structure.items()), sample * 2))
+        sampled = min(count, sample)
+    elif isinstance(structure, SEQUENCE_TYPES):
+        elements = list(itertools.islice(structure, sample))
+        sampled = min(count, sample)
+    else:
+        # Not a collection: walk it whole, up to max_objects
+        size, truncated = deep_size(structure, set(), opaque, max_objects)
+        return {"count": count, "bytes": size, "sampled": None, "truncated": truncated}
+
+    total, truncated = 0, False
+    for element in elements:
+        size, cut = deep_size(element, seen, opaque, max_objects)
+        total += size
+        truncated = truncated or cut
+    estimate = shallow + (total * count // sampled if sampled else 0)
+    return {"count": count, "bytes": estimate, "sampled": sampled, "truncated": truncated}
+
+
+class AllocationTracer:
+    def __init__(self):
+        self.frames = 0
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+        self.previous: Optional[tracemalloc.Snapshot] = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self.baseline is not None
+
+    def start(self, frames: int = 1) -> Dict:
+        with self._lock:
+            if self.active:
+                raise TracerError("Allocation tracing is already running")
+            if tracemalloc.is_tracing():
+                raise TracerError("tracemalloc was started outside the admin API")
+            tracemalloc.start(frames)
+            self.frames = frames
+            self.baseline = self.previous = self._take()
+            return self.status()
+
+    def stop(self) -> Dict:
+        with self._lock:
+            if not self.active:
+                raise TracerError("Allocation tracing is not running")
+            tracemalloc.stop()
+            self.baseline = self.previous = None
+            return self.status()
+
+    def snapshot(self, limit: int = 20, group_by: str = "lineno", compare_to: str = "start") -> Dict:
+        """Top allocation sites by growth since start or since the previous snapshot"""
+        if group_by not in GROUP_BY or compare_to not in COMPARE_TO:
+            raise ValueError(f"group_by must be one of {GROUP_BY} and compare_to one of {COMPARE_TO}")
+        with self._lock:
+            if not self.active:
+                raise TracerError("Allocation tracing is not running")
+            snapshot = self._take()
+            base = self.baseline if compare_to == "start" else self.previous
+            self.previous = snapshot
+        differences = snapshot.compare_to(base, group_by)
+        top: List[Dict] = []
+        for stat in differences[:limit]:
+            frames = [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]
+            top.append({
+                "site": frames[0] if group_by != "traceback" else frames,
+                "size_diff": stat.size_diff,
+                "size": stat.size,
+                "count_diff": stat.count_diff,
+                "count": stat.count,
+            })
+        return {**self.status(), "compare_to": compare_to, "group_by": group_by, "top": top}
+
+    def _take(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def status(self) -> Dict:
+        if not self.active:
+            return {"active": False}
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "active": True,
+            "frames": self.frames,
+            "traced_bytes": current,
+            "peak_traced_bytes": peak,
+            "overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+        }
@@ -0,0 +1,280 @@
+"""Lightweight in-process metrics with Prometheus text exposition.
+
+Observations are plain list/float updates with no locks, so they are cheap
+enough to leave on in production (well under a microsecond each). Under
+free threading a concurrent update may occasionally be lost, which is
+acceptable for latency monitoring.
+"""
+import os
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple, Union
+
+# Latency buckets in seconds (0.5 ms .. 10 s)
+DEFAULT_LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# Buckets for human-scale durations such as matchmaking waits and games (s)
+DEFAULT_DURATION_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+# Starlette appends the charset parameter for text/* responses
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+PROCESS_START_TIME = time.time()
+
+
+class Histogram:
+    """Fixed-bucket histogram; the last slot counts values above every bound."""
+
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def quantile(self, q: float) -> float:
+        """Approximate quantile, reported as the upper bound of its bucket"""
+        total = self.count
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        # Above the largest bound; report the bound rather than infinity
+        return self.buckets[-1]
+
+    def snapshot(self) -> Dict:
+        total = self.count
+        cumulative = 0
+        buckets = {}
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            cumulative += bucket_count
+            buckets[str(bound)] = cumulative
+        buckets["+Inf"] = total
+        return {
+            "count": total,
+            "sum": self.sum,
+            "avg": self.sum / total if total else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": buckets,
+        }
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: Union[int, float] = 1) -> None:
+        self.value += amount
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+class _Family:
+    """A named metric with zero or more labels; one child per label set"""
+
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children: Dict[Tuple, object] = {}
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self.children.setdefault(values, self._new_child())
+        return child
+
+    def header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+
+
+class HistogramFamily(_Family):
+    metric_type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return Histogram(self.buckets)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for values, histogram in list(self.children.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            cumulative += histogram.counts[-1]
+            labels = _format_labels(self.labelnames, values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(histogram.sum)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CounterFamily(_Family):
+    metric_type = "counter"
+
+    def _new_child(self):
+        return Counter()
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for values, counter in list(self.children.items()):
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}{labels} {_format_value(counter.value)}")
+        return lines
+
+
+class CallbackMetric:
+    """Gauge or counter whose value is read at scrape time.
+
+    ``callback`` returns a number, or a dict mapping label-value tuples to
+    numbers when ``labelnames`` is set. Nothing is recorded on the hot path.
+    """
+
+    def __init__(self, name: str, documentation: str, callback: Callable,
+                 labelnames: Iterable[str] = (), metric_type: str = "gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+        self.metric_type = metric_type
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+        value = self.callback()
+        if self.labelnames:
+            for values, sample in value.items():
+                if not isinstance(values, tuple):
+                    values = (values,)
+                labels = _format_labels(self.labelnames, values)
+                lines.append(f"{self.name}{labels} {_format_value(sample)}")
+        else:
+            lines.append(f"{self.name} {_format_value(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        return self.register(HistogramFamily(name, documentation, labelnames, buckets))
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(CounterFamily(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, callback, labelnames=()):
+        return self.register(CallbackMetric(name, documentation, callback, labelnames))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def resident_memory_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def _cpu_seconds() -> float:
+    times = os.times()
+    return times.user + times.system
+
+
+REGISTRY.register(CallbackMetric(
+    "process_cpu_seconds_total", "Total user and system CPU time spent in seconds.",
+    _cpu_seconds, metric_type="counter",
+))
+REGISTRY.gauge("process_resident_memory_bytes", "Resident memory size in bytes.", resident_memory_bytes)
+REGISTRY.gauge("process_start_time_seconds", "Start time of the process since unix epoch in seconds.",
+               lambda: PROCESS_START_TIME)
+
+
+class HTTPMetricsMiddleware:
+    """ASGI middleware recording HTTP latency by method and route template.
+
+    The route template (``/api/puzzles/{category}``) is used instead of the raw
+    path to keep label cardinality bounded; unmatched paths share one label.
+    """
+
+    def __init__(self, app, histogram: HistogramFamily):
+        self.app = app
+        self.histogram = histogram
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            self.histogram.labels(scope["method"], path).observe(time.perf_counter() - started)
@@ -0,0 +1,211 @@
+"""On-demand profiling for HTTP routes and WebSocket message handlers.
+
+A single profiling session can be active at a time. While no session is
+running the hot paths only read ``profiler.active``, so there is no
+measurable overhead when profiling is disabled.
+
+Two modes are supported:
+
+* ``cprofile`` - deterministic profiling with :mod:`cProfile`, written as a
+  ``.prof`` file readable by :mod:`pstats`, snakeviz, etc.
+* ``sampling`` - a background thread samples the event-loop thread's stack
+  and writes collapsed stacks (``.collapsed``) for flamegraph/speedscope.
+
+Because handlers run on a shared event loop, code from other tasks that runs
+while a scoped handler is suspended on ``await`` is captured as well.
+"""
+import asyncio
+import cProfile
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Pattern
+
+PROFILE_MODES = ("cprofile", "sampling")
+
+
+class ProfilerBusyError(RuntimeError):
+    pass
+
+
+class _Sampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval"""
+
+    def __init__(self, profiler: "Profiler", target_thread_id: int, interval: float):
+        super().__init__(name="mindmaze-profile-sampler", daemon=True)
+        self.profiler = profiler
+        self.target_thread_id = target_thread_id
+        self.interval = interval
+        self.stacks: Dict[str, int] = {}
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            if self.profiler.scoped and self.profiler.depth == 0:
+                continue
+            frame = sys._current_frames().get(self.target_thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            key = ";".join(reversed(names))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class Profiler:
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.active = False
+        self.depth = 0
+        self.scoped = False
+        self.session: Optional[Dict] = None
+        self.last_result: Optional[Dict] = None
+        self._route_pattern: Optional[Pattern] = None
+        self._ws_type: Optional[str] = None
+        self._cprofile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[_Sampler] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def start(self, mode: str = "cprofile", route: Optional[str] = None,
+              route_pattern: Optional[Pattern] = None, ws_type: Optional[str] = None,
+              seconds: Optional[float] = None, max_requests: Optional[int] = None,
+              interval: float = 0.005) -> Dict:
+        """Start a session; must be called from the event loop thread"""
+        if self.active:
+            raise ProfilerBusyError("A profiling session is already running")
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"mode must be one of {PROFILE_MODES}")
+
+        self._route_pattern = route_pattern
+        self._ws_type = ws_type
+        self.scoped = route_pattern is not None or ws_type is not None
+        self.depth = 0
+        self.session = {
+            "mode": mode,
+            "route": route,
+            "ws_type": ws_type,
+            "seconds": seconds,
+            "max_requests": max_requests,
+            "requests": 0,
+            "started_at": time.time(),
+        }
+
+        if mode == "cprofile":
+            self._cprofile = cProfile.Profile()
+            if not self.scoped:
+                self._cprofile.enable()
+        else:
+            self._sampler = _Sampler(self, threading.get_ident(), interval)
+            self._sampler.start()
+
+        if seconds:
+            self._timer = asyncio.get_running_loop().call_later(seconds, self.stop)
+        self.active = True
+        return self.status()
+
+    def stop(self) -> Optional[Dict]:
+        """Stop the running session and write its profile file"""
+        if not self.active:
+            return None
+        self.active = False
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        session = self.session
+        if session["mode"] == "cprofile":
+            profile, self._cprofile = self._cprofile, None
+            profile.disable()
+            filename = f"profile-{stamp}.prof"
+            profile.dump_stats(os.path.join(self.output_dir, filename))
+        else:
+            sampler, self._sampler = self._sampler, None
+            sampler.stop()
+            filename = f"profile-{stamp}.collapsed"
+            with open(os.path.join(self.output_dir, filename), "w") as out:
+                for stack, count in sorted(sampler.stacks.items(), key=lambda item: -item[1]):
+                    out.write(f"{stack} {count}\n")
+            session["samples"] = sampler.samples
+
+        session["stopped_at"] = time.time()
+        session["file"] = filename
+        self.last_result = session
+        self.session = None
+        self.depth = 0
+        return session
+
+    def in_scope(self, kind: str, target: str) -> bool:
+        if not self.scoped:
+            return True
+        if kind == "http":
+            return self._route_pattern is not None and self._route_pattern.match(target) is not None
+        return self._ws_type is not None and self._ws_type == target
+
+    @contextmanager
+    def capture(self):
+        """Profile the enclosed handler when the session is scoped"""
+        session = self.session
+        self.depth += 1
+        if self.depth == 1 and self._cprofile is not None and self.scoped:
+            self._cprofile.enable()
+        try:
+            yield
+        finally:
+            self.depth -= 1
+            if self.depth == 0 and self._cprofile is not None and self.scoped:
+                self._cprofile.disable()
+            if self.active and session is self.session:
+                session["requests"] += 1
+                if session["max_requests"] and session["requests"] >= session["max_requests"]:
+                    self.stop()
+
+    def status(self) -> Dict:
+        return {"active": self.active, "session": self.session, "last_result": self.last_result}
+
+    def list_files(self) -> List[Dict]:
+        if not os.path.isdir(self.output_dir):
+            return []
+        files = []
+        for name in sorted(os.listdir(self.output_dir), reverse=True):
+            path = os.path.join(self.output_dir, name)
+            if os.path.isfile(path):
+                files.append({"name": name, "size": os.path.getsize(path)})
+        return files
+
+    def file_path(self, name: str) -> Optional[str]:
+        """Resolve a downloadable profile file, refusing anything outside the directory"""
+        if not re.fullmatch(r"profile-[0-9T]+\.(prof|collapsed)", name):
+            return None
+        path = os.path.join(self.output_dir, name)
+        return path if os.path.isfile(path) else None
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requests matching the active session's route"""
+
+    def __init__(self, app, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        profiler = self.profiler
+        if not profiler.active or scope["type"] != "http" or not profiler.in_scope("http", scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        with profiler.capture():
+            await self.app(scope, receive, send)
@@ -0,0 +1,101 @@
+"""Topic-based pub/sub for fan-out to many WebSocket viewers.
+
+A publisher hands over an already encoded frame, so each event is serialized
+once however many subscribers a topic has. ``publish`` never awaits: it
+appends the shared frame to every subscriber's bounded queue and wakes it.
+When a subscriber falls behind, its queue drops the *oldest* frames, so a
+lagging viewer skips intermediate updates instead of buffering without
+limit. Frames should therefore carry state (e.g. current counts) rather than
+deltas, and the final frame of a topic is never the one dropped.
+"""
+import asyncio
+from collections import deque
+from typing import Dict, List, Optional, Union
+
+from metrics import REGISTRY
+
+Frame = Union[str, bytes]  # Sent as-is; bytes for streams written straight to the response
+
+FRAMES_PUBLISHED = REGISTRY.counter("mindmaze_pubsub_frames_published_total", "Frames published to a topic.")
+FRAMES_DROPPED = REGISTRY.counter(
+    "mindmaze_pubsub_frames_dropped_total", "Frames a lagging subscriber skipped because its queue was full."
+)
+
+
+class Subscription:
+    __slots__ = ("topic", "frames", "ready", "closed", "dropped")
+
+    def __init__(self, topic: str, maxsize: int):
+        self.topic = topic
+        self.frames: deque = deque(maxlen=maxsize)
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.dropped = 0
+
+    def push(self, frame: Frame) -> None:
+        if len(self.frames) == self.frames.maxlen:
+            self.dropped += 1
+            FRAMES_DROPPED.labels().inc()
+        self.frames.append(frame)
+        self.ready.set()
+
+    def close(self) -> None:
+        self.closed = True
+        self.ready.set()
+
+    async def next_frames(self) -> List[Frame]:
+        """Wait for and take every queued frame; an empty list once closed and drained"""
+        while not self.frames:
+            if self.closed:
+                return []
+            self.ready.clear()
+            await self.ready.wait()
+        frames = list(self.frames)
+        self.frames.clear()
+        return frames
+
+
+class PubSub:
+    def __init__(self, queue_size: int = 16):
+        self.queue_size = queue_size
+        self.topics: Dict[str, Dict[Subscription, None]] = {}
+
+    def subscribe(self, topic: str) -> Subscription:
+        subscription = Subscription(topic, self.queue_size)
+        self.topics.setdefault(topic, {})[subscription] = None
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self.topics.get(subscription.topic)
+        if subscribers is not None:
+            subscribers.pop(subscription, None)
+            if not subscribers:
+                del self.topics[subscription.topic]
+
+    def has_subscribers(self, topic: str) -> bool:
+        return topic in self.topics
+
+    def publish(self, topic: str, frame: Frame) -> int:
+        """Queue ``frame`` for every subscriber of ``topic``; returns how many"""
+        subscribers = self.topics.get(topic)
+        if not subscribers:
+            return 0
+        for subscription in subscribers:
+            subscription.push(frame)
+        FRAMES_PUBLISHED.labels().inc()
+        return len(subscribers)
+
+    def close(self, topic: str, frame: Optional[Frame] = None) -> None:
+        """Publish a last frame, then end every subscription to ``topic``"""
+        subscribers = self.topics.pop(topic, None)
+        if not subscribers:
+            return
+        for subscription in subscribers:
+            if frame is not None:
+                subscription.push(frame)
+            subscription.close()
+        if frame is not None:
+            FRAMES_PUBLISHED.labels().inc()
+
+    def subscriber_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self.topics.values())
@@ -0,0 +1,395 @@
+"""In-memory full-text search over the puzzle bank.
+
+The index is built once from the catalog and never mutated; a change builds
+a new one that re-indexes only the changed categories, and swaps it in. It
+keeps no puzzles, only their tokens: a hit is a category version and a
+position in it, and the caller loads the puzzle itself. Each category is indexed on its own: its puzzles
+get dense document ids, assigned shortest first, and every token of a
+question and answer maps to an ascending ``array('I')`` of document ids.
+Tokens of an answer also get a list of the puzzles with them in the answer,
+both kept by token id. A category filter just
+searches one category; idf comes from document frequencies over all of them.
+
+A query ANDs its terms. A term ending in ``*`` is a prefix, which is a
+contiguous range of a category's sorted vocabulary. A match scores, for each
+term, the idf of its best token in the puzzle, doubled in the answer and cut
+for a prefix expansion; the sum is divided by a length penalty, and shorter
+puzzles win ties.
+
+In each category the term with the fewest postings drives. Each of its
+tokens has an answer list and a full list, and within one list its weight is
+fixed, so the list bounds the score of what it holds: that weight plus the
+most every other term can add without the answer boost, over the length
+penalty. A match that has another term in its answer is reached through
+that term's answer list instead, bounded with every boost. Lists are walked
+best bound first: other token terms are checked by bisecting their list
+forward, skipping ahead to their next document on a miss, and prefix terms
+against the puzzle's token ids. Matches go into a heap bounded by ``limit``.
+Ids grow with length, so a list is left once its bound at the current
+document cannot beat the weakest kept result. The top ``limit`` is exact,
+unless ``scan_budget`` documents were visited, and then the results are
+reported as truncated.
+"""
+import heapq
+import itertools
+import math
+import re
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+TOKEN_PATTERN = re.compile(r"\w+")
+ANSWER_BOOST = 2.0
+PREFIX_WEIGHT = 0.7
+LENGTH_PENALTY = 0.05  # Per token
+MIN_PREFIX_LENGTH = 2
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.casefold())
+
+
+class QueryError(ValueError):
+    pass
+
+
+class _Term:
+    """One query term within a category: its posting lists, vocabulary id range and token weights"""
+    __slots__ = ("text", "prefix", "postings", "size", "cursor", "id_range", "weights")
+
+    def __init__(self, text: str, postings: List[array], id_range: Tuple[int, int], weights: List[float],
+                 prefix: bool = False):
+        self.text = text
+        self.prefix = prefix
+        self.postings = postings
+        self.size = sum(len(p) for p in postings)
+        self.cursor = 0
+        self.id_range = id_range
+        self.weights = weights  # Per token id in id_range, before the answer boost
+
+
+class _CategoryIndex:
+    """The puzzles of one category version, with document ids assigned shortest first"""
+
+    def __init__(self, category: str, puzzles: Sequence[Mapping], version: int = 0):
+        self.category = category
+        self.version = version
+        self.positions = array("I")  # doc id -> position of the puzzle in its category
+        self.postings: Dict[str, array] = {}
+        self.vocabulary: List[str] = []  # Sorted, so a prefix is a range of token ids
+        self.token_ids: Dict[str, int] = {}
+        # By token id: its posting list, the documents with it in the answer (or None) and,
+        # cumulated, how many those are
+        self.token_postings: List[array] = []
+        self.answer_postings: List[Optional[array]] = []
+        self.has_answers = bytearray()
+        self.answer_counts = array("I", [0])
+        # Token ids of every document, concatenated: answer tokens, then question-only ones
+        self.doc_tokens = array("I")
+        self.doc_offsets = array("I", [0])  # doc id -> start of its ids in doc_tokens
+        self.answer_ends = array("I")  # doc id -> end of its answer tokens in doc_tokens
+
+        entries = []
+        for position, puzzle in enumerate(puzzles):
+            answer = dict.fromkeys(tokenize(puzzle["answer"]))
+            question = [token for token in dict.fromkeys(tokenize(puzzle["question"])) if token not in answer]
+            entries.append((len(answer) + len(question), position, list(answer), question))
+        entries.sort(key=lambda entry: entry[:2])
+        self.vocabulary = sorted({token for entry in entries for tokens in entry[2:] for token in tokens})
+        token_ids = self.token_ids = {token: i for i, token in enumerate(self.vocabulary)}
+
+        postings: Dict[str, List[int]] = {}
+        answer_postings: Dict[str, List[int]] = {}
+        for doc, (_, position, answer, question) in enumerate(entries):
+            self.positions.append(position)
+            for token in answer + question:
+                postings.setdefault(token, []).append(doc)
+            for token in answer:
+                answer_postings.setdefault(token, []).append(doc)
+            self.doc_tokens.extend(token_ids[token] for token in answer)
+            self.answer_ends.append(len(self.doc_tokens))
+            self.doc_tokens.extend(token_ids[token] for token in question)
+            self.doc_offsets.append(len(self.doc_tokens))
+        # Documents are visited in id order, so every list is already ascending
+        self.postings = {key: array("I", docs) for key, docs in postings.items()}
+        self.token_postings = [self.postings[token] for token in self.vocabulary]
+        for token in self.vocabulary:
+            answers = array("I", answer_postings[token]) if token in answer_postings else None
+            self.answer_postings.append(answers)
+            self.has_answers.append(answers is not None)
+            self.answer_counts.append(self.answer_counts[-1] + (len(answers) if answers else 0))
+        self.least_penalty = self.length_penalty(0) if entries else 1.0
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def memory_bytes(self) -> int:
+        """Bytes of the posting lists, vocabulary and per-document arrays; an array's size includes its buffer"""
+        arrays = itertools.chain(
+            self.postings.values(), filter(None, self.answer_postings),
+            (self.positions, self.answer_counts, self.doc_tokens, self.doc_offsets, self.answer_ends),
+        )
+        containers = (self.postings, self.token_ids, self.vocabulary, self.token_postings, self.answer_postings,
+                      self.has_answers)
+        return (sum(map(sys.getsizeof, arrays)) + sum(map(sys.getsizeof, containers))
+                + sum(map(sys.getsizeof, self.vocabulary)))
+
+    def document_frequencies(self) -> Iterator[Tuple[str, int]]:
+        return ((token, len(self.postings[token])) for token in self.vocabulary)
+
+    def term(self, text: str, prefix: bool, idfs: Mapping[str, float]) -> _Term:
+        if prefix:
+            start = bisect_left(self.vocabulary, text)
+            end = bisect_right(self.vocabulary, text + "\U0010ffff", start)
+        else:
+            start = self.token_ids.get(text, 0)
+            end = start + 1 if text in self.token_ids else start
+        weights = list(map(idfs.__getitem__, self.vocabulary[start:end]))
+        if prefix:
+            weights = [weight * PREFIX_WEIGHT for weight in weights]
+            if start < end and self.vocabulary[start] == text:
+                weights[0] = idfs[text]  # The prefix itself sorts first in its range
+        return _Term(text, self.token_postings[start:end], (start, end), weights, prefix)
+
+    def weighted_lists(self, term: _Term, answers_only: bool = False) -> Iterator[Tuple[float, array, bool]]:
+        """Each posting list of the term's tokens, with the most a match in it gets from the term
+
+        The third item tells an answer list from a full one.
+        """
+        low, high = term.id_range
+        for weight, posting, answers in zip(term.weights, self.token_postings[low:high], self.answer_postings[low:high]):
+            if answers is not None:
+                yield ANSWER_BOOST * weight, answers, True
+            if not answers_only:
+                yield weight, posting, False
+
+    def max_weights(self, term: _Term) -> Tuple[float, float]:
+        """The most the term adds to a match from the question, and from the answer"""
+        low, high = term.id_range
+        plain = max(term.weights, default=0.0)
+        answered = max(itertools.compress(term.weights, self.has_answers[low:high]), default=None)
+        return plain, max(plain, ANSWER_BOOST * answered) if answered is not None else plain
+
+    def answer_postings_count(self, term: _Term) -> int:
+        return self.answer_counts[term.id_range[1]] - self.answer_counts[term.id_range[0]]
+
+    def has_term(self, term: _Term, doc: int) -> bool:
+        """Whether ``doc`` has a token in the term's id range"""
+        start, end = term.id_range
+        for token in self.doc_tokens[self.doc_offsets[doc]:self.doc_offsets[doc + 1]]:
+            if start <= token < end:
+                return True
+        return False
+
+    def length(self, doc: int) -> int:
+        return self.doc_offsets[doc + 1] - self.doc_offsets[doc]
+
+    def length_penalty(self, doc: int) -> float:
+        return 1 + LENGTH_PENALTY * self.length(doc)
+
+    def score(self, doc: int, terms: List[_Term]) -> float:
+        start, answer_end, end = self.doc_offsets[doc], self.answer_ends[doc], self.doc_offsets[doc + 1]
+        tokens = self.doc_tokens[start:end]
+        answer_count = answer_end - start
+        score = 0.0
+        for term in terms:
+            low, high = term.id_range
+            if not term.prefix:
+                i = tokens.index(low)  # A match contains every exact term
+                score += term.weights[0] * (ANSWER_BOOST if i < answer_count else 1.0)
+                continue
+            best = 0.0
+            for i, token in enumerate(tokens):
+                if low <= token < high:
+                    best = max(best, term.weights[token - low] * (ANSWER_BOOST if i < answer_count else 1.0))
+            score += best
+        return score / self.length_penalty(doc)
+
+
+class PuzzleSearchIndex:
+    def __init__(self, scan_budget: int = 50000):
+        self.scan_budget = scan_budget
+        self.categories: Dict[str, _CategoryIndex] = {}
+        self.document_frequency: Dict[str, int] = {}  # Over every category
+        self.idfs: Dict[str, float] = {}
+        self.size = 0
+
+    @classmethod
+    def build(cls, catalog: Mapping[str, Sequence[Mapping]], **options) -> "PuzzleSearchIndex":
+        index = cls(**options)
+        for category, puzzles in catalog.items():
+            index._add(_CategoryIndex(category, puzzles))
+        index.idfs = {token: index.idf(count) for token, count in index.document_frequency.items()}
+        return index
+
+    def updated(self, changed: Mapping[str, Optional[Tuple[int, Sequence[Mapping]]]]) -> "PuzzleSearchIndex":
+        """A new index with ``changed`` categories re-indexed from their ``(version, puzzles)``,
+        or dropped where they map to None
+
+        Other categories are shared with this index, which stays valid; only
+        the document frequencies and idfs are recomputed.
+        """
+        index = type(self)(scan_budget=self.scan_budget)
+        for category, category_index in self.categories.items():
+            if category not in changed:
+                index._add(category_index)
+        for category, entry in changed.items():
+            if entry is not None:
+                version, puzzles = entry
+                index._add(_CategoryIndex(category, puzzles, version))
+        index.idfs = {token: index.idf(count) for token, count in index.document_frequency.items()}
+        return index
+
+    def _add(self, category_index: _CategoryIndex) -> None:
+        self.categories[category_index.category] = category_index
+        self.size += len(category_index)
+        for token, count in category_index.document_frequencies():
+            self.document_frequency[token] = self.document_frequency.get(token, 0) + count
+
+    def __len__(self) -> int:
+        return self.size
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the index, which keeps no puzzles of its own"""
+        size = sys.getsizeof(self.categories) + sys.getsizeof(self.document_frequency) + sys.getsizeof(self.idfs)
+        for category_index in self.categories.values():
+            size += category_index.memory_bytes()
+        return size
+
+    def idf(self, document_frequency: int) -> float:
+        return math.log(1 + self.size / max(document_frequency, 1))
+
+    def _parse(self, query: str) -> List[Tuple[str, bool]]:
+        """The query's distinct (token, is_prefix) terms"""
+        terms = []
+        for raw in query.split():
+            tokens = tokenize(raw)
+            terms.extend((token, False) for token in tokens)
+            if raw.endswith("*") and tokens:
+                token = tokens[-1]
+                if len(token) < MIN_PREFIX_LENGTH:
+                    raise QueryError(f"Prefix terms need at least {MIN_PREFIX_LENGTH} characters")
+                terms[-1] = (token, True)
+        if not terms:
+            raise QueryError("Query has no searchable terms")
+        return list(dict.fromkeys(terms))
+
+    def search(self, query: str, category: Optional[str] = None, limit: int = 20) -> Dict:
+        """Top ``limit`` puzzles matching every term of ``query``, as category, version and position"""
+        parsed = self._parse(query)
+        if category is None:
+            searched = sorted(self.categories.items())
+        else:
+            searched = [(category, self.categories[category])] if category in self.categories else []
+        # Ties go to the shorter puzzle, then by category and document id: (length, rank, doc)
+        lists = []
+        for rank, (_, category_index) in enumerate(searched):
+            terms = [category_index.term(text, prefix, self.idfs) for text, prefix in parsed]
+            if all(term.size for term in terms):
+                lists.extend(self._bounded_lists(rank, category_index, terms))
+        lists.sort(key=lambda entry: entry[0], reverse=True)
+
+        top: List[Tuple] = []  # (score, -length, -rank, -doc): the root is the weakest kept result
+        walk = {"scanned": 0, "truncated": False, "scored": set()}
+        shortest = min((category_index.least_penalty for _, category_index in searched), default=1.0)
+        for best_possible, rank, category_index, posting, exact, prefixes, terms in lists:
+            if walk["truncated"]:
+                break
+            if len(top) == limit:
+                if best_possible / shortest < top[0][0]:
+                    break  # Lists are in bound order, so no later one can get in either
+                if best_possible / category_index.least_penalty < top[0][0]:
+                    continue  # Not even this list's first document can get in
+            self._walk(rank, category_index, posting, best_possible, exact, prefixes, terms, limit, top, walk)
+
+        results = []
+        for score, _, negative_rank, negative_doc in sorted(top, reverse=True):
+            category_name, category_index = searched[-negative_rank]
+            results.append({
+                "category": category_name,
+                "version": category_index.version,
+                "index": category_index.positions[-negative_doc],
+                "score": round(score, 4)
+            })
+        return {"results": results, "truncated": walk["truncated"]}
+
+    @staticmethod
+    def _bounded_lists(rank: int, category_index: _CategoryIndex, terms: List[_Term]) -> List[Tuple]:
+        """The lists to walk in one category, each with the best score a match in it can have
+
+        A match with no term in its answer is in the driver's list of its best
+        token, where no term is boosted. Any other match is in an answer list
+        of the first of its answered terms in ``order``, where only later terms
+        can be boosted. Terms with the most answer postings go last.
+        """
+        driver = min(terms, key=lambda term: term.size)
+        plain, boosted = zip(*(category_index.max_weights(term) for term in terms))
+        order = sorted(range(len(terms)), key=lambda k: category_index.answer_postings_count(terms[k]))
+        lists = []
+        for k, owner in enumerate(terms):
+            later = set(order[order.index(k) + 1:])
+            # Rarest first: a miss skips to that term's next document
+            exact = sorted((term for term in terms if term is not owner and not term.prefix), key=lambda term: term.size)
+            prefixes = [term for term in terms if term is not owner and term.prefix]
+            for weight, posting, answers in category_index.weighted_lists(owner, answers_only=owner is not driver):
+                if answers:
+                    # Another token of a prefix term may still score more from the question
+                    own = max(weight, plain[k])
+                    caps = [boosted[j] if j in later else plain[j] for j in range(len(terms))]
+                else:
+                    own, caps = weight, plain
+                # Summed in the order score() sums, so a match never rounds above it
+                best_possible = 0.0
+                for j, cap in enumerate(caps):
+                    best_possible += own if j == k else cap
+                lists.append((best_possible, rank, category_index, posting, exact, prefixes, terms))
+        return lists
+
+    def _walk(self, rank: int, category_index: _CategoryIndex, posting: array, best_possible: float,
+              exact: List[_Term], prefixes: List[_Term], terms: List[_Term], limit: int, top: List[Tuple],
+              walk: Dict) -> None:
+        """Score the matches in ``posting`` into ``top`` until its bound cannot get in
+
+        ``exact`` and ``prefixes`` are the terms other than the list's own.
+        """
+        for term in exact:
+            term.cursor = 0
+        offsets = category_index.doc_offsets
+        scored = walk["scored"]
+        scanned = walk["scanned"]
+        j, end = 0, len(posting)
+        while j < end:
+            doc = posting[j]
+            length = offsets[doc + 1] - offsets[doc]
+            if len(top) == limit:
+                bound = best_possible / (1 + LENGTH_PENALTY * length)
+                weakest = top[0]
+                if bound < weakest[0] or bound == weakest[0] and (length, rank, doc) > (
+                        -weakest[1], -weakest[2], -weakest[3]):
+                    break  # Later documents are no shorter, and lose ties
+            scanned += 1
+            if scanned > self.scan_budget:
+                walk["truncated"] = True
+                break
+            for term in exact:
+                other = term.postings[0]
+                i = term.cursor = bisect_left(other, doc, term.cursor)
+                if i == len(other):
+                    j = end  # Nothing past here can match every term
+                    break
+                if other[i] != doc:
+                    j = bisect_left(posting, other[i], j + 1)  # Skip to this term's next document
+                    break
+            else:
+                j += 1
+                key = (rank, doc)
+                if key in scored or not all(category_index.has_term(term, doc) for term in prefixes):
+                    continue
+                scored.add(key)  # It can sit in several of the lists
+                entry = (category_index.score(doc, terms), -length, -rank, -doc)
+                if len(top) < limit:
+                    heapq.heappush(top, entry)
+                elif entry > top[0]:
+                    heapq.heapreplace(top, entry)
+        walk["scanned"] = scanned
@@ -0,0 +1,98 @@
+"""Server-sent events for snapshots shared by every open client.
+
+``SnapshotStream`` polls a ``collect`` coroutine at most ``max_rate`` times
+per second, and only while someone is listening. It publishes an SSE
+``data:`` frame only when the snapshot differs from the last one. Each
+frame is encoded to bytes once. Every client has a one-frame queue, so a
+slow client just gets the newest snapshot when it catches up. The work
+done per interval is the same however many tabs are open.
+"""
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from pubsub import PubSub
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = 15.0
+TOPIC = "snapshots"
+
+
+def format_event(data: str, event: Optional[str] = None) -> bytes:
+    lines = [f"event: {event}"] if event else []
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+class SnapshotStream:
+    def __init__(self, collect: Callable[[], Awaitable[Dict]], max_rate: float = 1.0,
+                 heartbeat: float = HEARTBEAT_SECONDS):
+        if max_rate <= 0:
+            raise ValueError("max_rate must be positive")
+        self.collect = collect
+        self.min_interval = 1.0 / max_rate
+        self.heartbeat = heartbeat
+        self.pubsub = PubSub(queue_size=1)
+        self.frame: Optional[bytes] = None
+        self.published = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def listeners(self) -> int:
+        return self.pubsub.subscriber_count()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def refresh(self) -> bool:
+        """Collect a snapshot and publish it if it changed"""
+        frame = format_event(json.dumps(await self.collect(), sort_keys=True, separators=(",", ":")))
+        if frame == self.frame:
+            return False
+        self.frame = frame
+        self.published += 1
+        self.pubsub.publish(TOPIC, frame)
+        return True
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.min_interval)
+            if not self.pubsub.has_subscribers(TOPIC):
+                continue
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Snapshot stream refresh failed: %s", e)
+
+    async def events(self) -> AsyncIterator[bytes]:
+        """Body of a text/event-stream response: the current snapshot, then each change"""
+        subscription = self.pubsub.subscribe(TOPIC)
+        try:
+            if self.frame is None:
+                await self.refresh()
+            # self.frame is the newest snapshot, so anything queued so far is
+            # already in it; later ones queue up while the client reads it
+            subscription.frames.clear()
+            if self.frame is not None:
+                yield self.frame
+            while True:
+                try:
+                    frames = await asyncio.wait_for(subscription.next_frames(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield b": keep-alive\n\n"
+                    continue
+                for frame in frames:
+                    yield frame
+        finally:
+            self.pubsub.unsubscribe(subscription)
@@ -0,0 +1,496 @@
+"""Persistence layer for MindMaze.
+
+The app talks to a ``UserStore`` rather than to Motor directly. Two
+implementations are provided:
+
+* ``MongoUserStore`` - the production backend on a Motor collection.
+* ``InMemoryUserStore`` - a process-local backend for local benchmarking and
+  testing, with configurable injected latency, jitter and error rate so tail
+  latency behaviour can be reproduced deterministically on one machine.
+
+Finished matches go to a ``GameStore`` (the ``games`` collection) with the
+same pair of implementations.
+
+Puzzles live in a ``PuzzleStore``. The ``puzzles`` collection holds one
+document per puzzle, tagged with its category, version and position, and
+``puzzle_versions`` points each category at its live version. Content is
+written under a new version, which stays invisible until
+``publish_version`` moves the pointer in one single-document update.
+
+Select the backend with ``STORAGE_BACKEND=mongo|memory``.
+"""
+import asyncio
+import bisect
+import heapq
+import os
+import random
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+
+class StorageError(Exception):
+    """Raised by a store when an operation fails"""
+
+
+class DuplicateUserError(StorageError):
+    """Raised when inserting a username that already exists"""
+
+
+class DuplicatePuzzleError(StorageError):
+    """Raised when a (category, version, position) slot is already taken"""
+
+
+def apply_projection(doc: Dict, projection: Optional[Dict]) -> Dict:
+    """Apply a MongoDB-style include/exclude projection to a plain dict"""
+    if not projection:
+        return dict(doc)
+    included = [field for field, flag in projection.items() if flag and field != "_id"]
+    if included:
+        result = {field: doc[field] for field in included if field in doc}
+        if projection.get("_id", 1) and "_id" in doc:
+            result["_id"] = doc["_id"]
+        return result
+    return {field: value for field, value in doc.items() if projection.get(field, 1)}
+
+
+DateRange = Tuple[Optional[datetime], Optional[datetime]]
+
+
+class UserStore(ABC):
+    """Operations the app performs on the ``users`` collection"""
+
+    @abstractmethod
+    async def ping(self) -> None:
+        ...
+
+    @abstractmethod
+    async def ensure_indexes(self) -> None:
+        ...
+
+    @abstractmethod
+    async def find_user(self, username: str, projection: Optional[Dict] = None) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    async def insert_user(self, user: Dict) -> None:
+        """Insert ``user``, setting its ``_id``; raises DuplicateUserError"""
+
+    @abstractmethod
+    async def touch_last_login(self, username: str, when: datetime) -> None:
+        ...
+
+    @abstractmethod
+    async def increment_score(self, username: str, points: int) -> Optional[int]:
+        """Add ``points`` and return the new score, or None if there is no such user"""
+
+    @abstractmethod
+    async def top_users(self, limit: int) -> List[Dict]:
+        """Highest scores first, as ``{"username", "score"}`` dicts"""
+
+    @abstractmethod
+    async def count_users(self) -> int:
+        ...
+
+    @abstractmethod
+    def iter_users(self, projection: Dict, ranges: Optional[Dict[str, DateRange]] = None,
+                   batch_size: int = 1000) -> AsyncIterator[Dict]:
+        """Every user matching ``ranges`` (field -> [start, end) datetimes, either end
+        optional), fetched ``batch_size`` at a time so memory stays flat"""
+
+    def close(self) -> None:
+        pass
+
+
+def range_query(ranges: Optional[Dict[str, DateRange]]) -> Dict:
+    query = {}
+    for field, (start, end) in (ranges or {}).items():
+        bounds = {}
+        if start is not None:
+            bounds["$gte"] = start
+        if end is not None:
+            bounds["$lt"] = end
+        if bounds:
+            query[field] = bounds
+    return query
+
+
+def in_ranges(doc: Dict, ranges: Optional[Dict[str, DateRange]]) -> bool:
+    for field, (start, end) in (ranges or {}).items():
+        if start is None and end is None:
+            continue
+        value = doc.get(field)
+        if value is None or (start is not None and value < start) or (end is not None and value >= end):
+            return False
+    return True
+
+
+class MongoUserStore(UserStore):
+    def __init__(self, client, database):
+        self.client = client
+        self.collection = database.users
+
+    async def ping(self):
+        await self.client.admin.command("ping")
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("username", unique=True)
+
+    async def find_user(self, username, projection=None):
+        return await self.collection.find_one({"username": username}, projection)
+
+    async def insert_user(self, user):
+        try:
+            await self.collection.insert_one(user)
+        except DuplicateKeyError:
+            raise DuplicateUserError("Username already exists")
+
+    async def touch_last_login(self, username, when):
+        await self.collection.update_one({"username": username}, {"$set": {"last_login": when}})
+
+    async def increment_score(self, username, points):
+        user = await self.collection.find_one_and_update(
+            {"username": username},
+            {"$inc": {"score": points}},
+            projection={"_id": 0, "score": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        return user["score"] if user is not None else None
+
+    async def top_users(self, limit):
+        return await self.collection.find(
+            {},
+            {"_id": 0, "username": 1, "score": 1}
+        ).sort("score", -1).limit(limit).to_list(limit)
+
+    async def count_users(self):
+        return await self.collection.count_documents({})
+
+    async def iter_users(self, projection, ranges=None, batch_size=1000):
+        # Natural order: sorting would make the server buffer or walk an index for nothing
+        cursor = self.collection.find(range_query(ranges), projection, batch_size=batch_size)
+        try:
+            async for user in cursor:
+                yield user
+        finally:
+            await cursor.close()
+
+    def close(self):
+        self.client.close()
+
+
+class GameStore(ABC):
+    """Match results, one document per finished game"""
+
+    @abstractmethod
+    async def ensure_indexes(self) -> None:
+        ...
+
+    @abstractmethod
+    async def insert_many(self, games: List[Dict]) -> None:
+        ...
+
+    @abstractmethod
+    async def find_player_games(self, username: str, limit: int,
+                                before: Optional[Tuple[datetime, ObjectId]] = None,
+                                projection: Optional[Dict] = None) -> List[Dict]:
+        """Newest first, ordered by (finished_at, _id) and starting strictly
+        after the ``before`` key, so pages are stable while games are added"""
+
+
+class MongoGameStore(GameStore):
+    def __init__(self, database):
+        self.collection = database.games
+
+    async def ensure_indexes(self):
+        # Serves find_player_games: equality on players, then the keyset sort
+        await self.collection.create_index(
+            [("players", 1), ("finished_at", -1), ("_id", -1)], name="players_finished_at"
+        )
+
+    async def find_player_games(self, username, limit, before=None, projection=None):
+        query: Dict = {"players": username}
+        if before is not None:
+            finished_at, game_id = before
+            query["$or"] = [
+                {"finished_at": {"$lt": finished_at}},
+                {"finished_at": finished_at, "_id": {"$lt": game_id}},
+            ]
+        cursor = self.collection.find(query, projection).sort([("finished_at", -1), ("_id", -1)])
+        return await cursor.limit(limit).to_list(limit)
+
+    async def insert_many(self, games):
+        # Unordered so one bad document does not stop the rest of the batch
+        await self.collection.insert_many(games, ordered=False)
+
+
+class PuzzleStore(ABC):
+    """Versioned puzzle content, one document per puzzle"""
+
+    @abstractmethod
+    async def ensure_indexes(self) -> None:
+        ...
+
+    @abstractmethod
+    async def get_versions(self) -> Dict[str, Dict]:
+        """category -> {"version", "count"} of the live content"""
+
+    @abstractmethod
+    async def load_category(self, category: str, version: int) -> List[Dict]:
+        """Question and answer of every puzzle in a version, in position order"""
+
+    @abstractmethod
+    async def load_positions(self, category: str, version: int, positions: Sequence[int]) -> Dict[int, Dict]:
+        """Question and answer of the puzzles at ``positions``, by position; missing ones are left out"""
+
+    @abstractmethod
+    async def insert_puzzles(self, puzzles: List[Dict]) -> None:
+        ...
+
+    @abstractmethod
+    async def publish_version(self, category: str, version: int, count: int) -> bool:
+        """Make ``version`` live unless a newer one already is; returns whether it did"""
+
+    @abstractmethod
+    async def delete_versions(self, category: str, before: Optional[int] = None,
+                              version: Optional[int] = None) -> None:
+        """Delete one version, or every version older than ``before``"""
+
+
+class MongoPuzzleStore(PuzzleStore):
+    def __init__(self, database):
+        self.puzzles = database.puzzles
+        self.versions = database.puzzle_versions
+
+    async def ensure_indexes(self):
+        # Serves load_category and keeps positions unique within a version
+        await self.puzzles.create_index(
+            [("category", 1), ("version", 1), ("position", 1)], unique=True, name="category_version_position"
+        )
+
+    async def get_versions(self):
+        return {
+            doc["_id"]: {"version": doc["version"], "count": doc["count"]}
+            async for doc in self.versions.find({}, {"version": 1, "count": 1})
+        }
+
+    async def load_category(self, category, version):
+        cursor = self.puzzles.find(
+            {"category": category, "version": version}, {"_id": 0, "question": 1, "answer": 1}
+        ).sort("position", 1)
+        return await cursor.to_list(None)
+
+    async def load_positions(self, category, version, positions):
+        cursor = self.puzzles.find(
+            {"category": category, "version": version, "position": {"$in": list(positions)}},
+            {"_id": 0, "position": 1, "question": 1, "answer": 1}
+        )
+        return {doc.pop("position"): doc async for doc in cursor}
+
+    async def insert_puzzles(self, puzzles):
+        try:
+            await self.puzzles.insert_many(puzzles, ordered=False)
+        except BulkWriteError as e:
+            if any(error.get("code") == 11000 for error in e.details.get("writeErrors", [])):
+                raise DuplicatePuzzleError("Puzzle slot already exists") from e
+            raise
+
+    async def publish_version(self, category, version, count):
+        try:
+            # The filter only matches an older pointer; a newer one makes the upsert collide on _id
+            await self.versions.update_one(
+                {"_id": category, "version": {"$lt": version}},
+                {"$set": {"version": version, "count": count, "updated_at": datetime.utcnow()}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def delete_versions(self, category, before=None, version=None):
+        query: Dict = {"category": category}
+        query["version"] = version if version is not None else {"$lt": before}
+        await self.puzzles.delete_many(query)
+
+
+class FaultInjector:
+    """Injected latency (base + uniform jitter) and random failures"""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 error_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+
+    async def __call__(self, operation: str) -> None:
+        delay = self.latency_ms
+        if self.jitter_ms:
+            delay += self.rng.uniform(0, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            raise StorageError(f"Injected failure in {operation}")
+
+    def settings(self) -> Dict:
+        return {"latency_ms": self.latency_ms, "jitter_ms": self.jitter_ms, "error_rate": self.error_rate}
+
+
+class InMemoryUserStore(UserStore):
+    def __init__(self, faults: Optional[FaultInjector] = None):
+        self.faults = faults or FaultInjector()
+        self.users: Dict[str, Dict] = {}
+
+    async def ping(self):
+        await self.faults("ping")
+
+    async def ensure_indexes(self):
+        # The dict keyed by username is the unique index
+        pass
+
+    async def find_user(self, username, projection=None):
+        await self.faults("find_user")
+        user = self.users.get(username)
+        return apply_projection(user, projection) if user is not None else None
+
+    async def insert_user(self, user):
+        await self.faults("insert_user")
+        if user["username"] in self.users:
+            raise DuplicateUserError("Username already exists")
+        user.setdefault("_id", ObjectId())
+        self.users[user["username"]] = dict(user)
+
+    async def touch_last_login(self, username, when):
+        await self.faults("touch_last_login")
+        if username in self.users:
+            self.users[username]["last_login"] = when
+
+    async def increment_score(self, username, points):
+        await self.faults("increment_score")
+        if username in self.users:
+            user = self.users[username]
+            user["score"] = user.get("score", 0) + points
+            return user["score"]
+        return None
+
+    async def top_users(self, limit):
+        await self.faults("top_users")
+        top = heapq.nlargest(limit, self.users.values(), key=lambda user: user.get("score", 0))
+        return [{"username": user["username"], "score": user.get("score", 0)} for user in top]
+
+    async def count_users(self):
+        await self.faults("count_users")
+        return len(self.users)
+
+    async def iter_users(self, projection, ranges=None, batch_size=1000):
+        usernames = list(self.users)
+        for start in range(0, len(usernames), batch_size):
+            await self.faults("iter_users")
+            for username in usernames[start:start + batch_size]:
+                user = self.users.get(username)
+                if user is not None and in_ranges(user, ranges):
+                    yield apply_projection(user, projection)
+
+
+class InMemoryGameStore(GameStore):
+    def __init__(self, faults: Optional[FaultInjector] = None):
+        self.faults = faults or FaultInjector()
+        self.games: List[Dict] = []
+        # Per-player (finished_at, _id) keys in ascending order, mirroring the Mongo index
+        self.player_index: Dict[str, List[Tuple[datetime, ObjectId]]] = {}
+        self.by_id: Dict[ObjectId, Dict] = {}
+
+    async def ensure_indexes(self):
+        pass
+
+    async def insert_many(self, games):
+        await self.faults("insert_games")
+        for game in games:
+            game.setdefault("_id", ObjectId())
+            stored = dict(game)
+            self.games.append(stored)
+            self.by_id[stored["_id"]] = stored
+            key = (stored["finished_at"], stored["_id"])
+            for player in stored["players"]:
+                keys = self.player_index.setdefault(player, [])
+                if not keys or keys[-1] < key:
+                    keys.append(key)
+                else:
+                    bisect.insort(keys, key)
+
+    async def find_player_games(self, username, limit, before=None, projection=None):
+        await self.faults("find_player_games")
+        keys = self.player_index.get(username, [])
+        end = bisect.bisect_left(keys, before) if before is not None else len(keys)
+        page = keys[max(0, end - limit):end]
+        return [apply_projection(self.by_id[game_id], projection) for _, game_id in reversed(page)]
+
+
+class InMemoryPuzzleStore(PuzzleStore):
+    def __init__(self, faults: Optional[FaultInjector] = None):
+        self.faults = faults or FaultInjector()
+        self.puzzles: Dict[Tuple[str, int], Dict[int, Dict]] = {}  # (category, version) -> position -> puzzle
+        self.versions: Dict[str, Dict] = {}
+
+    async def ensure_indexes(self):
+        pass
+
+    async def get_versions(self):
+        await self.faults("get_versions")
+        return {category: dict(pointer) for category, pointer in self.versions.items()}
+
+    async def load_category(self, category, version):
+        await self.faults("load_category")
+        slots = self.puzzles.get((category, version), {})
+        return [
+            {"question": slots[position]["question"], "answer": slots[position]["answer"]}
+            for position in sorted(slots)
+        ]
+
+    async def load_positions(self, category, version, positions):
+        await self.faults("load_positions")
+        slots = self.puzzles.get((category, version), {})
+        return {
+            position: {"question": slots[position]["question"], "answer": slots[position]["answer"]}
+            for position in positions if position in slots
+        }
+
+    async def insert_puzzles(self, puzzles):
+        await self.faults("insert_puzzles")
+        duplicate = False
+        for puzzle in puzzles:
+            slots = self.puzzles.setdefault((puzzle["category"], puzzle["version"]), {})
+            if puzzle["position"] in slots:
+                duplicate = True
+                continue
+            slots[puzzle["position"]] = dict(puzzle)
+        if duplicate:
+            raise DuplicatePuzzleError("Puzzle slot already exists")
+
+    async def publish_version(self, category, version, count):
+        await self.faults("publish_version")
+        current = self.versions.get(category)
+        if current is not None and current["version"] >= version:
+            return False
+        self.versions[category] = {"version": version, "count": count}
+        return True
+
+    async def delete_versions(self, category, before=None, version=None):
+        await self.faults("delete_versions")
+        for key in [key for key in self.puzzles if key[0] == category]:
+            if (key[1] == version) if version is not None else (key[1] < before):
+                del self.puzzles[key]
+
+
+def fault_injector_from_env() -> FaultInjector:
+    seed = os.getenv("MEMORY_STORE_SEED")
+    return FaultInjector(
+        latency_ms=float(os.getenv("MEMORY_STORE_LATENCY_MS", "0")),
+        jitter_ms=float(os.getenv("MEMORY_STORE_JITTER_MS", "0")),
+        error_rate=float(os.getenv("MEMORY_STORE_ERROR_RATE", "0")),
+        seed=int(seed) if seed else None,
+    )
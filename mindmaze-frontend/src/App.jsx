@@ -94,6 +94,8 @@ function App() {
     websocket.onopen = () => {
       console.log('WebSocket connected');
       setConnectionStatus('Connected');
+      // Live leaderboard: a full snapshot now, then only changed rows
+      websocket.send(JSON.stringify({ type: 'subscribe_leaderboard' }));
     };
     
     websocket.onmessage = (event) => {
@@ -127,9 +129,17 @@ function App() {
           setCurrentPuzzle('');
           setOpponent('');
           setAnswer('');
-          loadLeaderboard();
-          loadStats();
         }, 3000);
+      } else if (data.type === 'leaderboard') {
+        setLeaderboard(data.rows);
+      } else if (data.type === 'leaderboard_delta') {
+        setLeaderboard(prev => {
+          const next = prev.slice(0, data.size);
+          data.rows.forEach(row => {
+            next[row.rank - 1] = row;
+          });
+          return next;
+        });
       } else if (data.type === 'wrong_answer') {
         setMessage(data.message);
         setTimeout(() => setMessage(''), 2000);
@@ -216,16 +226,16 @@ function App() {
     }
   };
 
-  const loadStats = async () => {
-    try {
-      const response = await fetch('http://localhost:8000/api/stats');
-      if (response.ok) {
-        const data = await response.json();
-        setStats(data);
-      }
-    } catch (error) {
-      console.error('Stats error:', error);
-    }
+  const subscribeStats = () => {
+    // The server pushes a snapshot whenever the stats change; EventSource reconnects on its own
+    const source = new EventSource('http://localhost:8000/api/stats/stream');
+    source.onmessage = (event) => {
+      setStats(JSON.parse(event.data));
+    };
+    source.onerror = () => {
+      console.error('Stats stream error, reconnecting');
+    };
+    return source;
   };
 
   const logout = () => {
@@ -273,14 +283,10 @@ function App() {
 
   useEffect(() => {
     loadLeaderboard();
-    loadStats();
-    
-    const interval = setInterval(() => {
-      loadStats();
-    }, 30000);
+    const statsSource = subscribeStats();
     
     return () => {
-      clearInterval(interval);
+      statsSource.close();
       if (ws) {
         ws.close();
       }